@@ -0,0 +1,81 @@
+"""
+Measure the load and dump throughput of every registered codec, along with the standard library
+(and pure-Python YAML) implementations that they replace, on generated guild data.
+
+Run from the repository root with: `python -m benchmarks.bench_codecs`
+"""
+
+import argparse
+import io
+import json
+import time
+from typing import IO, Any, Callable, List, Tuple
+
+from benchmarks.data import guild_data
+from commanderbot_lib.database.codecs import registered_codecs
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+Loader = Callable[[IO], Any]
+Dumper = Callable[[Any, IO], None]
+
+
+def baselines() -> List[Tuple[str, Loader, Dumper]]:
+    implementations: List[Tuple[str, Loader, Dumper]] = [
+        (
+            "json (json.load/json.dump)",
+            json.load,
+            lambda d, f: json.dump(d, f, indent=2),
+        )
+    ]
+    if yaml is not None:
+        implementations.append(
+            ("yaml (safe_load/safe_dump)", yaml.safe_load, yaml.safe_dump)
+        )
+    return implementations
+
+
+def bench(name: str, load: Loader, dump: Dumper, data: dict):
+    file = io.TextIOWrapper(io.BytesIO(), encoding="utf-8")
+    started_at = time.perf_counter()
+    dump(data, file)
+    file.flush()
+    dump_time = time.perf_counter() - started_at
+    size = len(file.buffer.getvalue()) / 1e6
+    file.seek(0)
+    started_at = time.perf_counter()
+    loaded = load(file)
+    load_time = time.perf_counter() - started_at
+    # Formats like JSON turn every key into a string, so compare against that.
+    if loaded != json.loads(json.dumps(data)):
+        raise ValueError(f"{name} did not load back what it dumped")
+    print(
+        f"{name:32} {size:6.1f} MB"
+        f"  load {load_time * 1000:7.0f} ms ({size / load_time:6.1f} MB/s)"
+        f"  dump {dump_time * 1000:7.0f} ms ({size / dump_time:6.1f} MB/s)"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=(__doc__ or "").split("\n\n")[0])
+    parser.add_argument("--guilds", type=int, default=200)
+    parser.add_argument("--entries", type=int, default=150)
+    parser.add_argument(
+        "--no-baselines",
+        action="store_true",
+        help="Skip the implementations that codecs replace, which may be slow.",
+    )
+    args = parser.parse_args()
+    data = guild_data(guilds=args.guilds, entries=args.entries)
+    for codec in registered_codecs():
+        bench(f"{codec.name} ({codec.implementation})", codec.load, codec.dump, data)
+    if not args.no_baselines:
+        for name, load, dump in baselines():
+            bench(name, load, dump, data)
+
+
+if __name__ == "__main__":
+    main()
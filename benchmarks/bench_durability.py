@@ -0,0 +1,67 @@
+"""
+Measure how long a full write of a file database takes at each level of `Durability`, for a few
+sizes of file.
+
+Run from the repository root with: `python -m benchmarks.bench_durability`
+"""
+
+import argparse
+import json
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.data import guild_data
+from commanderbot_lib.database import file_io
+from commanderbot_lib.database.codecs import get_codec
+from commanderbot_lib.database.file_io import Durability
+
+
+def bench_serialize(data: dict, writes: int) -> float:
+    """ Return the mean time of serializing the data without writing it, in seconds. """
+    dump = get_codec("json").dump
+    started_at = time.perf_counter()
+    for _ in range(writes):
+        file_io.serialize_data(data, dump)
+    return (time.perf_counter() - started_at) / writes
+
+
+def bench_writes(path: Path, data: dict, durability: Durability, writes: int) -> float:
+    """ Return the mean time of a write, in seconds. """
+    dump = get_codec("json").dump
+    started_at = time.perf_counter()
+    for _ in range(writes):
+        file_io.write_serialized(path, data, dump, durability)
+    return (time.perf_counter() - started_at) / writes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=(__doc__ or "").split("\n\n")[0])
+    parser.add_argument(
+        "--guilds",
+        type=int,
+        nargs="+",
+        default=[20, 200, 1000],
+        help="The number of guilds in each file, of 150 entries each.",
+    )
+    parser.add_argument("--writes", type=int, default=10)
+    parser.add_argument(
+        "--dir",
+        help="Where to write the files, which should be on the disk being measured.",
+    )
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory(dir=args.dir) as directory:
+        path = Path(directory) / "db.json"
+        for guilds in args.guilds:
+            data = guild_data(guilds=guilds)
+            size = len(json.dumps(data, indent=2)) / 1e6
+            print(f"{guilds} guilds ({size:.1f} MB):")
+            mean = bench_serialize(data, args.writes)
+            print(f"  {'serialize':>9}: {mean * 1000:8.1f} ms, without writing")
+            for durability in Durability:
+                mean = bench_writes(path, data, durability, args.writes)
+                print(f"  {durability.value:>9}: {mean * 1000:8.1f} ms per write")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Compare the memory that a store's cache takes up, and how long it takes to build and serialize,
+when its entries are kept as plain `dict` and when they're kept as records.
+
+Run from the repository root with: `python -m benchmarks.bench_records`
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import logging
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import List, Type
+
+from benchmarks.data import guild_data
+from benchmarks.stores import make_store
+from commanderbot_lib.store.entry_table import ANY_KEY
+from commanderbot_lib.store.records import Record, RecordSchema
+from commanderbot_lib.store.simple_dict_store import SimpleDictStore
+
+
+class Entry(Record):
+    owner: int
+    tags: List[str]
+    text: str = ""
+    score: float = 0.0
+    enabled: bool = False
+
+
+class DictStore(SimpleDictStore):
+    pass
+
+
+class RecordStore(SimpleDictStore):
+    records = (RecordSchema(entries=(ANY_KEY, "entries", ANY_KEY), record_type=Entry),)
+
+
+async def bench_store(store_type: Type[SimpleDictStore], path: Path):
+    started_at = time.perf_counter()
+    store = await make_store(store_type, str(path))
+    build_time = time.perf_counter() - started_at
+    # Build the store again while tracing, which is much slower, to measure its memory.
+    del store
+    gc.collect()
+    tracemalloc.start()
+    store = await make_store(store_type, str(path))
+    gc.collect()
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    started_at = time.perf_counter()
+    await store.serialize()
+    serialize_time = time.perf_counter() - started_at
+    print(
+        f"{store_type.__name__:>12}: {retained / 1e6:7.1f} MB retained"
+        f"  build {build_time:6.2f}s  serialize {serialize_time:6.2f}s"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=(__doc__ or "").split("\n\n")[0])
+    parser.add_argument("--guilds", type=int, default=500)
+    parser.add_argument("--entries", type=int, default=200)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / "db.json"
+        path.write_text(json.dumps(guild_data(args.guilds, args.entries)))
+        for store_type in (DictStore, RecordStore):
+            asyncio.run(bench_store(store_type, path))
+
+
+if __name__ == "__main__":
+    main()
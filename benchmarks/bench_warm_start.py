@@ -0,0 +1,71 @@
+"""
+Compare how long a store takes to start cold, by parsing the database file and building its cache
+and indexes, with how long it takes to start warm, from a snapshot of the built cache.
+
+Run from the repository root with: `python -m benchmarks.bench_warm_start`
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import tempfile
+from pathlib import Path
+
+from benchmarks.data import guild_data
+from benchmarks.stores import make_store
+from commanderbot_lib.store.entry_table import ANY_KEY
+from commanderbot_lib.store.secondary_index import SecondaryIndex
+from commanderbot_lib.store.simple_dict_store import SimpleDictStore
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+
+class IndexedStore(SimpleDictStore):
+    indexes = (
+        SecondaryIndex("owner", entries=(ANY_KEY, "entries", ANY_KEY), field="owner"),
+    )
+
+
+def _startup_time(store: SimpleDictStore) -> float:
+    assert store.startup_time is not None
+    return store.startup_time
+
+
+async def bench_startup(path: Path, warm_start_dir: Path, starts: int):
+    IndexedStore.warm_start_dir = str(warm_start_dir)
+    cold = await make_store(IndexedStore, str(path))
+    warm = [await make_store(IndexedStore, str(path)) for _ in range(starts)]
+    assert not cold.warm_started and all(store.warm_started for store in warm)
+    cold_time = _startup_time(cold)
+    best = min(_startup_time(store) for store in warm)
+    print(
+        f"{path.suffix[1:]:>5}: cold {cold_time * 1000:8.1f} ms"
+        f"  warm {best * 1000:8.1f} ms  ({cold_time / best:.1f}x)"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=(__doc__ or "").split("\n\n")[0])
+    parser.add_argument("--guilds", type=int, default=200)
+    parser.add_argument("--entries", type=int, default=150)
+    parser.add_argument("--starts", type=int, default=5)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+    data = guild_data(args.guilds, args.entries)
+    with tempfile.TemporaryDirectory() as directory:
+        directory = Path(directory)
+        files = [directory / "db.json"]
+        files[0].write_text(json.dumps(data))
+        if yaml is not None:
+            files.append(directory / "db.yaml")
+            files[1].write_text(yaml.safe_dump(data))
+        for path in files:
+            asyncio.run(bench_startup(path, directory / path.suffix, args.starts))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+import random
+import string
+
+
+def guild_data(guilds: int = 200, entries: int = 150, seed: int = 1) -> dict:
+    """
+    Generate data shaped like that of a typical cog: a number of guilds, each with some settings
+    and a mapping of entries with a few fields of different types.
+    """
+    rng = random.Random(seed)
+
+    def text(length: int) -> str:
+        return "".join(rng.choice(string.ascii_letters) for _ in range(length))
+
+    def snowflake() -> int:
+        return rng.randrange(10 ** 17, 10 ** 18)
+
+    return {
+        str(snowflake()): {
+            "settings": {"prefix": "!", "channel": snowflake()},
+            "entries": {
+                text(8): {
+                    "owner": snowflake(),
+                    "tags": [text(5) for _ in range(3)],
+                    "text": text(60),
+                    "score": rng.random(),
+                    "enabled": rng.random() < 0.5,
+                }
+                for _ in range(entries)
+            },
+        }
+        for _ in range(guilds)
+    }
@@ -0,0 +1,29 @@
+from typing import Type, TypeVar, cast
+
+from discord.ext.commands import Bot, Cog
+
+from commanderbot_lib.options.abc.options_with_database import OptionsWithDatabase
+from commanderbot_lib.store.abc.cached_store import CachedStore
+
+StoreType = TypeVar("StoreType", bound=CachedStore)
+
+
+class BenchmarkCog(Cog, name="benchmarks"):
+    pass
+
+
+class BenchmarkOptions(OptionsWithDatabase):
+    def __init__(self, database: str):
+        self._database = database
+
+    @property
+    def database(self) -> str:
+        return self._database
+
+
+async def make_store(store_type: Type[StoreType], database: str) -> StoreType:
+    """ Create and initialize a store of the given type, using the given database. """
+    # Stores only pass the bot along, so benchmarks go without one.
+    store = store_type(cast(Bot, None), BenchmarkCog(), BenchmarkOptions(database))
+    await store.async_init()
+    return store
@@ -0,0 +1,79 @@
+"""
+Have several processes write to the same file database at once, each under its own top-level key,
+and check that none of their changes are lost. Without locking, the last writer wins.
+
+Run from the repository root with: `python -m benchmarks.stress_locking`
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import tempfile
+import time
+from multiprocessing import Process
+from pathlib import Path
+
+from benchmarks.stores import make_store
+from commanderbot_lib.database import file_locking
+from commanderbot_lib.store.simple_dict_store import SimpleDictStore
+
+
+class UnlockedStore(SimpleDictStore):
+    database_locking = False
+
+
+class LockedStore(SimpleDictStore):
+    database_locking = True
+
+
+def worker(path: str, process: int, keys: int, locking: bool):
+    logging.disable(logging.WARNING)
+
+    async def main():
+        store = await make_store(LockedStore if locking else UnlockedStore, path)
+        for key in range(keys):
+            store.set((f"process-{process}", str(key)), key)
+            await store.dirty((f"process-{process}", str(key)))
+
+    asyncio.run(main())
+
+
+def stress(path: Path, processes: int, keys: int, locking: bool) -> int:
+    """ Return the number of keys that made it into the file. """
+    path.write_text("{}")
+    started_at = time.perf_counter()
+    workers = [
+        Process(target=worker, args=(str(path), process, keys, locking))
+        for process in range(processes)
+    ]
+    for process in workers:
+        process.start()
+    for process in workers:
+        process.join()
+    duration = time.perf_counter() - started_at
+    written = sum(len(values) for values in json.loads(path.read_text()).values())
+    print(
+        f"locking={locking}: {written}/{processes * keys} keys in the file"
+        f" after {duration:.1f}s ({processes * keys / duration:.0f} writes/s)"
+    )
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description=(__doc__ or "").split("\n\n")[0])
+    parser.add_argument("--processes", type=int, default=8)
+    parser.add_argument("--keys", type=int, default=100)
+    args = parser.parse_args()
+    if not file_locking.locking_supported():
+        raise SystemExit("File locking is not supported on this platform")
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / "db.json"
+        stress(path, args.processes, args.keys, locking=False)
+        written = stress(path, args.processes, args.keys, locking=True)
+    if written != args.processes * args.keys:
+        raise SystemExit("Changes were lost despite locking")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,8 +4,13 @@ from typing import Optional, Type
 
 from discord.ext.commands import Bot, Cog
 
+from commanderbot_lib.init_scheduler import InitScheduler
+
 
 class CommanderBotBase(ABC, Bot):
+    # Initializes the state of every cog concurrently, which each `CogState` adds itself to.
+    init_scheduler: InitScheduler
+
     @property
     @abstractmethod
     def started_at(self) -> datetime:
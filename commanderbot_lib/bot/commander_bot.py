@@ -15,7 +15,16 @@ from discord.ext.commands.errors import (
 )
 
 from commanderbot_lib.bot.abc.commander_bot_base import CommanderBotBase
+from commanderbot_lib.database.redis_pool import close_redis_pools
+from commanderbot_lib.database.sqlite_dict_database import close_sqlite_databases
+from commanderbot_lib.event_loop_monitor import EventLoopMonitor
+from commanderbot_lib.http_session import close_http_session
+from commanderbot_lib.init_scheduler import InitScheduler
 from commanderbot_lib.logging import get_logger
+from commanderbot_lib.store.abc.cached_store import (
+    flush_pending_writes,
+    save_warm_start_snapshots,
+)
 
 
 @dataclass
@@ -47,6 +56,13 @@ class CommanderBot(CommanderBotBase):
         # Remember when we started and the last time we connected.
         self._started_at: datetime = datetime.utcnow()
         self._connected_since: Optional[datetime] = None
+        # Keep track of how long the event loop gets blocked for.
+        self.event_loop_monitor: EventLoopMonitor = EventLoopMonitor()
+        # The state of each cog adds itself to this while loading, to be initialized concurrently.
+        self.init_scheduler: InitScheduler = InitScheduler(
+            concurrency=config.get("init_concurrency", 8),
+            timeout=config.get("init_timeout"),
+        )
         # Configure extensions.
         self.configured_extensions: Dict[str, ConfiguredExtension] = None
         if extensions_data:
@@ -105,10 +121,29 @@ class CommanderBot(CommanderBotBase):
         if configured_extension:
             return configured_extension.options
 
+    # @overrides Bot
+    async def start(self, *args, **kwargs):
+        # Initialize everything before connecting, so that it's ready for the first events.
+        report = await self.init_scheduler.run()
+        self.log.info(report.format())
+        await super().start(*args, **kwargs)
+
+    # @overrides Bot
+    async def close(self):
+        self.event_loop_monitor.stop()
+        await super().close()
+        # Some stores may need the shared connections to write their changes.
+        await flush_pending_writes()
+        await save_warm_start_snapshots()
+        await close_http_session()
+        await close_redis_pools()
+        await close_sqlite_databases()
+
     # @overrides Bot
     async def on_connect(self):
         self.log.warning("Connected to Discord.")
         self._connected_since = datetime.utcnow()
+        self.event_loop_monitor.start()
 
     # @overrides Bot
     async def on_disconnect(self):
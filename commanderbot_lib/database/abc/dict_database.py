@@ -1,6 +1,8 @@
 from abc import abstractmethod
+from typing import Hashable, Iterable, List
 
 from commanderbot_lib.database.abc.cog_database import CogDatabase
+from commanderbot_lib.database.changes import Change
 
 
 class DictDatabase(CogDatabase):
@@ -26,3 +28,53 @@ class DictDatabase(CogDatabase):
         - committing a database transaction; or
         - sending a POST request over HTTP.
         """
+
+    async def read_key(self, key: Hashable) -> dict:
+        """
+        Read and return any data for the given top-level key that wasn't already returned by
+        `read()`, such as by loading the file that contains it. The returned data may contain
+        other keys as well, such as when several keys share a file.
+
+        The default implementation assumes that `read()` returned everything.
+        """
+        return {}
+
+    @property
+    def supports_key_reads(self) -> bool:
+        """ Whether the database can read individual top-level keys on demand with `read_keys`. """
+        return False
+
+    async def read_keys(self, keys: Iterable[Hashable]) -> dict:
+        """
+        Read and return the current data for only the given top-level keys, regardless of what has
+        been read before. Keys without any data are left out.
+
+        This is only used if `supports_key_reads` is true.
+        """
+        raise NotImplementedError()
+
+    def deferred_keys(self) -> List[Hashable]:
+        """
+        Return the top-level keys that `read()` is known to have held back, to be read with
+        `read_key()` later on. Keys whose existence isn't known up front aren't included.
+
+        The default implementation assumes that `read()` returned everything.
+        """
+        return []
+
+    @property
+    def supports_changes(self) -> bool:
+        """ Whether the database can persist individual changes with `write_changes`. """
+        return False
+
+    async def write_changes(self, changes: List[Change]):
+        """
+        Persist only the given changes, instead of the entire set of data, such as by:
+        - appending them to a journal; or
+        - rewriting only the affected files; or
+        - updating only the affected rows.
+
+        This is only used if `supports_changes` is true. The values of changes may be shared with
+        live data, so they must be serialized (or copied) before yielding to the event loop.
+        """
+        raise NotImplementedError()
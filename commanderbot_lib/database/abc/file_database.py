@@ -1,22 +1,61 @@
+import asyncio
 from abc import abstractmethod
-from datetime import datetime
+from concurrent.futures import Executor
+from dataclasses import dataclass
 from os import PathLike
 from pathlib import Path
-from shutil import copyfile
-from typing import IO
+from typing import IO, Iterable, List, Optional
 
 from discord.ext.commands import Bot, Cog
 
+from commanderbot_lib.database import backups, file_io, file_locking
 from commanderbot_lib.database.abc.dict_database import DictDatabase
+from commanderbot_lib.database.backups import Backup, BackupPolicy
+from commanderbot_lib.database.changes import Change
+from commanderbot_lib.database.file_io import Durability, FileState
+from commanderbot_lib.executors import run_in_executor
 from commanderbot_lib.utils import fix_path
 
-BACKUP_TIMESTAMP_FORMAT = "%Y-%m-%d-%H-%M-%S-%f"
+
+@dataclass
+class FileDatabaseStats:
+    """
+    Counts of what a file database has done with its file.
+
+    Attributes
+    -----------
+    writes: :class:`int`
+        The number of times the file was written.
+    skipped_writes: :class:`int`
+        The number of writes that were skipped because the file already had the same contents.
+    reloads: :class:`int`
+        The number of times the file was read again after it changed on disk.
+    """
+
+    writes: int = 0
+    skipped_writes: int = 0
+    reloads: int = 0
 
 
 class FileDatabase(DictDatabase):
     """
     A `CogDatabase` that is used to manage a simple database in the form of a file on disk.
 
+    All file I/O, including parsing and serialization, is done inside of an executor so that large
+    files don't block the event loop. Writes are atomic: the new data is written to a temporary file
+    which then replaces the original.
+
+    Writes are skipped if the data serializes to exactly what is already in the file, and the file
+    hasn't changed since this database last read or wrote it. Changes made by anything else, such
+    as an operator editing the file by hand, can be picked up with `read_if_changed()`.
+
+    With `locking` enabled, several processes can share the same file: reads and writes hold an
+    advisory lock on a sidecar file (see `file_locking`), which also counts how many times the file
+    has been written. Individual changes are supported, and are applied to the latest contents of
+    the file so that changes written by other processes are kept. Full writes still replace the
+    file entirely, and log a warning if that overwrites changes made elsewhere. Only available on
+    Unix-like systems.
+
     Attributes
     -----------
     bot: :class:`Bot`
@@ -27,26 +66,91 @@ class FileDatabase(DictDatabase):
         The path to the file on the local filesystem.
     persistent: :class:`bool`
         Whether changes should be written back to the file on disk.
+    executor: :class:`Optional[Executor]`
+        The executor to do file I/O in. Defaults to the shared thread executor.
+    durability: :class:`Durability`
+        How hard to try to make sure that writes have reached the disk.
+    backups: :class:`Optional[BackupPolicy]`
+        How to create and keep backups of the file. Defaults to `BackupPolicy()`.
+    locking: :class:`bool`
+        Whether to lock the file, so that it can be shared by several processes.
     """
 
-    def __init__(self, bot: Bot, cog: Cog, path: PathLike, persistent: bool = True):
+    def __init__(
+        self,
+        bot: Bot,
+        cog: Cog,
+        path: PathLike,
+        persistent: bool = True,
+        executor: Optional[Executor] = None,
+        durability: Durability = Durability.FILE,
+        backups: Optional[BackupPolicy] = None,
+        locking: bool = False,
+    ):
         super().__init__(bot, cog)
+        if locking and not file_locking.locking_supported():
+            raise ValueError("File locking is not supported on this platform")
         self._path: Path = fix_path(path)
         self._persistent: bool = persistent
+        self._executor: Optional[Executor] = executor
+        self._durability: Durability = durability
+        self.backup_policy: BackupPolicy = backups or BackupPolicy()
+        self.stats: FileDatabaseStats = FileDatabaseStats()
+        # The state of the file as of the last time that we read or wrote it.
+        self._file_state: Optional[FileState] = None
+        # Held while replacing the file, so that our own writes aren't mistaken for outside changes.
+        self._file_lock: asyncio.Lock = asyncio.Lock()
+        self._lock_path: Optional[Path] = (
+            file_locking.lock_path_for(self._path) if locking else None
+        )
+        # The generation of the file as of the last time that we read or wrote it, when locking.
+        self._generation: Optional[int] = None
 
     @abstractmethod
-    async def load(self, file: IO) -> dict:
-        """ Load and return data from the given file, such as with `json.load`. """
+    def load(self, file: IO) -> dict:
+        """
+        Load and return data from the given file, such as with `json.load`.
+
+        This is called from inside of the executor, so it must not touch the event loop. Implement
+        it as a `staticmethod` so that it can also be sent to a process executor.
+        """
 
     @abstractmethod
-    async def dump(self, data: dict, file: IO):
-        """ Dump the given data to the given file, such as with `json.dump`. """
+    def dump(self, data: dict, file: IO):
+        """
+        Dump the given data to the given file, such as with `json.dump`.
+
+        This is called from inside of the executor, so it must not touch the event loop. Implement
+        it as a `staticmethod` so that it can also be sent to a process executor.
+        """
 
     # @implements DictDatabase
     @property
     def persistent(self) -> bool:
         return self._persistent
 
+    @property
+    def locking(self) -> bool:
+        return self._lock_path is not None
+
+    @property
+    def file_state(self) -> Optional[FileState]:
+        """ The state of the file as this database last read or wrote it, if ever. """
+        return self._file_state
+
+    @property
+    def supports_warm_start(self) -> bool:
+        """
+        Whether the data depends on nothing but the contents of the file, so that anything built
+        from it can be reused for as long as the file doesn't change. See `read_state()`.
+        """
+        return not self.locking
+
+    # @overrides DictDatabase
+    @property
+    def supports_changes(self) -> bool:
+        return self.locking
+
     # @implements DictDatabase
     async def read(self) -> dict:
         """ Default implementation that simply reads the entire file as data. """
@@ -57,23 +161,191 @@ class FileDatabase(DictDatabase):
         """ Default implementation that simply writes the entire file as data. """
         await self._write_file(data)
 
-    async def backup(self):
-        """ Default implementation that simply copies the existing database file. """
-        timestamp = datetime.utcnow().strftime(BACKUP_TIMESTAMP_FORMAT)
-        source_path = self._path
-        backup_path = self._path.with_suffix(f".backup.{timestamp}{self._path.suffix}")
+    # @overrides DictDatabase
+    async def write_changes(self, changes: Iterable[Change]):
+        """
+        Apply the given changes to the latest contents of the file, while holding the lock. Only
+        supported with `locking` enabled.
+        """
+        if not self.locking:
+            raise NotImplementedError()
+        self._log.info(f"Saving changes to database file: {self._path}")
+        # Take the snapshot here, on the event loop, so that the values can't change underneath us.
+        snapshot = file_io.snapshot_data(list(changes))
+        async with self._file_lock:
+            file_state, generation, stale = await run_in_executor(
+                self._executor,
+                file_locking.apply_locked_changes,
+                self._path,
+                self._lock_path,
+                snapshot,
+                self.load,
+                self.dump,
+                self._durability,
+                self._generation,
+            )
+            self.stats.writes += 1
+            # If someone else wrote the file in the meantime, then it now contains changes that
+            # we haven't read yet, which `read_if_changed()` will pick up.
+            if not stale:
+                self._file_state = file_state
+                self._generation = generation
+
+    async def read_state(self) -> Optional[FileState]:
+        """
+        Return the current state of the file, including a hash of its contents, without parsing
+        it; or `None` if there is no file. The state is kept as if the file had been read, so this
+        should only be used if the data is already known, such as from a warm-start snapshot.
+        """
+        self._log.info(f"Hashing database file: {self._path}")
+        async with self._file_lock:
+            self._file_state = await run_in_executor(
+                self._executor, file_io.read_file_state, self._path
+            )
+            return self._file_state
+
+    async def read_if_changed(self) -> Optional[dict]:
+        """
+        Read the file again if it has been replaced or modified since this database last read or
+        wrote it, or if another process has written it when locking. Return the new data, or `None`
+        if the file hasn't changed (or has gone missing).
+
+        If the new file can't be read, then it isn't tried again until it changes again.
+        """
+        async with self._file_lock:
+            if self.locking:
+                identity, generation = await run_in_executor(
+                    self._executor,
+                    file_locking.locked_identity,
+                    self._path,
+                    self._lock_path,
+                )
+            else:
+                identity = await run_in_executor(
+                    self._executor, file_io.path_identity, self._path
+                )
+                generation = self._generation
+            last_identity = self._file_state.identity if self._file_state else None
+            if (identity is None) or (
+                (identity == last_identity) and (generation == self._generation)
+            ):
+                return None
+        if generation != self._generation:
+            self._log.info(
+                f"Database file was written by another process: {self._path}"
+            )
+        else:
+            self._log.warning(f"Database file changed on disk: {self._path}")
+        try:
+            data = await self.read()
+        except:
+            self._file_state = FileState(identity, None)
+            self._generation = generation
+            raise
+        self.stats.reloads += 1
+        return data
+
+    async def backup(self) -> Backup:
+        """
+        Back up the existing database file next to it, according to the backup policy, and delete
+        any old backups that the policy no longer wants to keep.
+
+        If the file hasn't changed since the last backup, then no new backup is created and the last
+        one is returned instead.
+        """
+        self._log.warning(f'Backing up database file "{self._path}"')
+        backup = await run_in_executor(
+            self._executor,
+            backups.create_backup,
+            self._path,
+            self.backup_policy,
+            self._durability,
+        )
+        self._log.warning(f'Database file backed up to "{backup.path}"')
+        return backup
+
+    async def list_backups(self) -> List[Backup]:
+        """ Return the existing backups of the database file, oldest first. """
+        return await run_in_executor(self._executor, backups.list_backups, self._path)
+
+    async def restore(self, backup: Optional[Backup] = None):
+        """
+        Replace the database file with the given backup, or the most recent one by default. The
+        current file is backed up first, so that the restore itself can be undone.
+
+        This only replaces the file; anything that has already read the database (such as the
+        cache of a store) has to read it again to see the restored data, such as with
+        `read_if_changed()`.
+        """
+        if backup is None:
+            existing_backups = await self.list_backups()
+            if not existing_backups:
+                raise FileNotFoundError(f"There are no backups of {self._path}")
+            backup = existing_backups[-1]
+        if self._path.exists():
+            await self.backup()
         self._log.warning(
-            f'Backing up database from "{source_path}" to "{backup_path}>"'
+            f'Restoring database file "{self._path}" from backup "{backup.path}"'
+        )
+        await run_in_executor(
+            self._executor,
+            backups.restore_backup,
+            self._path,
+            backup,
+            self._durability,
         )
-        # TODO Use async file I/O. #enhance #async-files
-        copyfile(source_path, backup_path)
 
     async def _read_file(self) -> dict:
         self._log.info(f"Loading database from file: {self._path}")
-        with open(self._path, encoding="utf-8") as file:
-            return await self.load(file)
+        if self.locking:
+            data, self._file_state, self._generation = await run_in_executor(
+                self._executor,
+                file_locking.read_locked_file,
+                self._path,
+                self._lock_path,
+                self.load,
+            )
+        else:
+            data, self._file_state = await run_in_executor(
+                self._executor, file_io.read_file_with_state, self._path, self.load
+            )
+        return data
 
     async def _write_file(self, data: dict):
         self._log.info(f"Saving database to file: {self._path}")
-        with open(self._path, "w+", encoding="utf-8") as file:
-            await self.dump(data, file)
+        # Take the snapshot here, on the event loop, so that the data can't change underneath us.
+        snapshot = file_io.snapshot_data(data)
+        async with self._file_lock:
+            if self.locking:
+                last_generation = self._generation
+                file_state, self._generation, stale = await run_in_executor(
+                    self._executor,
+                    file_locking.write_locked_file,
+                    self._path,
+                    self._lock_path,
+                    snapshot,
+                    self.dump,
+                    self._durability,
+                    self._file_state,
+                    last_generation,
+                )
+                if stale and (last_generation is not None):
+                    self._log.warning(
+                        f"Overwrote changes made to the database file by another process: {self._path}"
+                    )
+            else:
+                file_state = await run_in_executor(
+                    self._executor,
+                    file_io.write_file,
+                    self._path,
+                    snapshot,
+                    self.dump,
+                    self._durability,
+                    self._file_state,
+                )
+            if file_state is None:
+                self._log.info(f"Database file is already up-to-date: {self._path}")
+                self.stats.skipped_writes += 1
+            else:
+                self._file_state = file_state
+                self.stats.writes += 1
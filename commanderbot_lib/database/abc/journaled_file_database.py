@@ -0,0 +1,254 @@
+import asyncio
+import json
+from concurrent.futures import Executor
+from dataclasses import dataclass
+from os import PathLike
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+from discord.ext.commands import Bot, Cog
+
+from commanderbot_lib.database import file_io
+from commanderbot_lib.database.abc.file_database import FileDatabase
+from commanderbot_lib.database.backups import Backup, BackupPolicy
+from commanderbot_lib.database.changes import Change, serialize_change
+from commanderbot_lib.database.file_io import Durability
+from commanderbot_lib.executors import run_in_executor
+
+
+@dataclass
+class JournalOptions:
+    """
+    Options for when to compact a journal into a fresh base file.
+
+    Attributes
+    -----------
+    max_size: :class:`Optional[int]`
+        Compact once the journal has grown past this many bytes.
+    max_age: :class:`Optional[float]`
+        Compact this many seconds after the first change that hasn't been compacted yet.
+    """
+
+    max_size: Optional[int] = 1024 * 1024
+    max_age: Optional[float] = 300.0
+
+
+class JournaledFileDatabase(FileDatabase):
+    """
+    A `FileDatabase` that can persist small changes by appending them to a journal, instead of
+    rewriting the entire file every time. The journal is replayed over the base file upon reading,
+    and is periodically compacted into a fresh base file in the background.
+
+    Journals are made up of numbered segments that live next to the base file, each containing one
+    JSON-serialized change per line. Compaction starts a new segment and then folds the older ones
+    into the base file; since changes are idempotent, a crash part-way through compaction is safe.
+
+    Note that journal records are always JSON, so values should be JSON-serializable even if the
+    base file uses another format. If the base file's format only has string keys (see
+    `string_keys`), then so do the key paths of journal records as they're replayed.
+
+    If appending to the journal fails, the segment is cut back to where it was and appends move on
+    to a new segment, so that a torn record is never followed by others.
+
+    Attributes
+    -----------
+    bot: :class:`Bot`
+        The parent discord.py bot instance.
+    cog: :class:`Cog`
+        The parent discord.py cog instance.
+    path: :class:`PathLike`
+        The path to the base file on the local filesystem.
+    persistent: :class:`bool`
+        Whether changes should be written back to the file on disk.
+    executor: :class:`Optional[Executor]`
+        The executor to do file I/O in. Defaults to the shared thread executor.
+    durability: :class:`Durability`
+        How hard to try to make sure that writes have reached the disk.
+    backups: :class:`Optional[BackupPolicy]`
+        How to create and keep backups of the file. Defaults to `BackupPolicy()`.
+    journal: :class:`Optional[JournalOptions]`
+        When to compact the journal. Defaults to `JournalOptions()`.
+    """
+
+    def __init__(
+        self,
+        bot: Bot,
+        cog: Cog,
+        path: PathLike,
+        persistent: bool = True,
+        executor: Optional[Executor] = None,
+        durability: Durability = Durability.FILE,
+        backups: Optional[BackupPolicy] = None,
+        journal: Optional[JournalOptions] = None,
+    ):
+        super().__init__(
+            bot,
+            cog,
+            path=path,
+            persistent=persistent,
+            executor=executor,
+            durability=durability,
+            backups=backups,
+        )
+        self.journal_options: JournalOptions = journal or JournalOptions()
+        self._segment: int = 1
+        self._journal_size: int = 0
+        # Appends must happen one at a time, in order.
+        self._append_lock: asyncio.Lock = asyncio.Lock()
+        # Compactions and full writes both replace the base file, so they can't overlap.
+        self._compaction_lock: asyncio.Lock = asyncio.Lock()
+        self._compaction_task: Optional[asyncio.Task] = None
+        self._compaction_timer: Optional[asyncio.TimerHandle] = None
+
+    # @overrides DictDatabase
+    @property
+    def supports_changes(self) -> bool:
+        return True
+
+    # @overrides FileDatabase
+    @property
+    def supports_warm_start(self) -> bool:
+        # The data depends on the journal as well as the base file.
+        return False
+
+    @property
+    def string_keys(self) -> bool:
+        """ Whether every key read from the base file is a string, as with JSON. """
+        return False
+
+    @property
+    def journal_size(self) -> int:
+        """ The number of bytes appended to the journal since it was last compacted. """
+        return self._journal_size
+
+    # @overrides FileDatabase
+    async def read(self) -> dict:
+        async with self._compaction_lock:
+            journal_paths = self._find_journal_paths()
+            self._log.info(
+                f"Loading database from file with {len(journal_paths)} journal segment(s): {self._path}"
+            )
+            data, self._file_state = await run_in_executor(
+                self._executor,
+                file_io.read_journaled_file,
+                self._path,
+                journal_paths,
+                self.load,
+                self.string_keys,
+            )
+            # Always append to a fresh segment, in case the last one ends in a torn record.
+            self._segment = (
+                self._segment_number(journal_paths[-1]) + 1 if journal_paths else 1
+            )
+            self._journal_size = sum(path.stat().st_size for path in journal_paths)
+        if journal_paths:
+            self._schedule_compaction()
+        return data
+
+    # @overrides FileDatabase
+    async def write(self, data: dict):
+        """ Write a full snapshot of the data, which makes the entire journal obsolete. """
+        async with self._compaction_lock, self._append_lock:
+            self._cancel_compaction_timer()
+            journal_paths = self._find_journal_paths()
+            await self._write_file(data)
+            await run_in_executor(self._executor, file_io.delete_files, journal_paths)
+            self._segment += 1
+            self._journal_size = 0
+
+    # @overrides DictDatabase
+    async def write_changes(self, changes: Iterable[Change]):
+        """ Persist the given changes by appending them to the journal. """
+        # Serialize here, on the event loop, so that the values can't change underneath us.
+        raw = "".join(
+            json.dumps(serialize_change(change), separators=(",", ":")) + "\n"
+            for change in changes
+        )
+        if not raw:
+            return
+        async with self._append_lock:
+            try:
+                await run_in_executor(
+                    self._executor,
+                    file_io.append_journal,
+                    self._journal_path(self._segment),
+                    raw,
+                    self._durability,
+                )
+            except:
+                # The segment may still end in a torn record, if it couldn't be cut back.
+                self._segment += 1
+                raise
+            self._journal_size += len(raw)
+        self._schedule_compaction()
+
+    # @overrides FileDatabase
+    async def backup(self) -> Backup:
+        """ Compact the journal first, so that the backup contains all of the data. """
+        await self.compact()
+        return await super().backup()
+
+    async def compact(self):
+        """ Fold the journal into a fresh base file. """
+        async with self._compaction_lock:
+            self._cancel_compaction_timer()
+            # Start a new segment so that appends can continue while we compact the old ones.
+            async with self._append_lock:
+                journal_paths = self._find_journal_paths()
+                self._segment += 1
+                self._journal_size = 0
+            if not journal_paths:
+                return
+            self._log.info(
+                f"Compacting {len(journal_paths)} journal segment(s) into: {self._path}"
+            )
+            async with self._file_lock:
+                self._file_state = await run_in_executor(
+                    self._executor,
+                    file_io.compact_journal,
+                    self._path,
+                    journal_paths,
+                    self.load,
+                    self.dump,
+                    self._durability,
+                    self.string_keys,
+                )
+
+    def _schedule_compaction(self):
+        options = self.journal_options
+        if (options.max_size is not None) and (self._journal_size >= options.max_size):
+            self._start_compaction()
+        elif (options.max_age is not None) and (self._compaction_timer is None):
+            loop = asyncio.get_running_loop()
+            self._compaction_timer = loop.call_later(
+                options.max_age, self._start_compaction
+            )
+
+    def _start_compaction(self):
+        self._cancel_compaction_timer()
+        if self._compaction_task and not self._compaction_task.done():
+            return
+        self._compaction_task = asyncio.get_running_loop().create_task(
+            self._run_compaction()
+        )
+
+    async def _run_compaction(self):
+        try:
+            await self.compact()
+        except:
+            self._log.exception(f"Failed to compact journal for: {self._path}")
+
+    def _cancel_compaction_timer(self):
+        if self._compaction_timer is not None:
+            self._compaction_timer.cancel()
+            self._compaction_timer = None
+
+    def _journal_path(self, segment: int) -> Path:
+        return self._path.with_name(f"{self._path.stem}.journal.{segment}.jsonl")
+
+    def _segment_number(self, journal_path: Path) -> int:
+        return int(journal_path.suffixes[-2][1:])
+
+    def _find_journal_paths(self) -> List[Path]:
+        journal_paths = self._path.parent.glob(f"{self._path.stem}.journal.*.jsonl")
+        return sorted(journal_paths, key=self._segment_number)
@@ -1,19 +1,71 @@
-import urllib.request
+import asyncio
+import json
 from abc import abstractmethod
+from concurrent.futures import Executor
+from os import PathLike
+from pathlib import Path
+from typing import Optional
 
+import aiohttp
 from discord.ext.commands import Bot, Cog
 
+from commanderbot_lib.database import file_io
 from commanderbot_lib.database.abc.dict_database import DictDatabase
+from commanderbot_lib.database.file_io import Durability
+from commanderbot_lib.executors import run_in_executor
+from commanderbot_lib.http_session import DEFAULT_TIMEOUT, get_http_session
+from commanderbot_lib.utils import fix_path
 
 
 class ReadOnlyRemoteFileDatabase(DictDatabase):
-    def __init__(self, bot: Bot, cog: Cog, address: str):
+    """
+    A `DictDatabase` that downloads its data from a remote file, over HTTP(S).
+
+    Requests share a single HTTP session (and therefore connection pool) across all cogs, and accept
+    compressed responses. If a cache path is given, the last successful download is kept on disk
+    along with its `ETag` and `Last-Modified` headers; these are sent with the next request so that
+    an unchanged file doesn't have to be downloaded again. The cached copy is also used if the
+    remote host can't be reached.
+
+    Attributes
+    -----------
+    bot: :class:`Bot`
+        The parent discord.py bot instance.
+    cog: :class:`Cog`
+        The parent discord.py cog instance.
+    address: :class:`str`
+        The URL of the remote file.
+    cache_path: :class:`Optional[PathLike]`
+        Where to keep a copy of the remote file on the local filesystem, if anywhere.
+    timeout: :class:`float`
+        How long to wait for the entire request, in seconds.
+    executor: :class:`Optional[Executor]`
+        The executor to parse data and do file I/O in. Defaults to the shared thread executor.
+    """
+
+    def __init__(
+        self,
+        bot: Bot,
+        cog: Cog,
+        address: str,
+        cache_path: Optional[PathLike] = None,
+        timeout: float = DEFAULT_TIMEOUT,
+        executor: Optional[Executor] = None,
+    ):
         super().__init__(bot, cog)
         self._address: str = address
+        self._cache_path: Optional[Path] = fix_path(cache_path) if cache_path else None
+        self._timeout: float = timeout
+        self._executor: Optional[Executor] = executor
 
     @abstractmethod
-    async def parse(self, raw: str) -> dict:
-        """ Parse and return data from the given string, such as with `json.loads`. """
+    def parse(self, raw: str) -> dict:
+        """
+        Parse and return data from the given string, such as with `json.loads`.
+
+        This is called from inside of the executor, so it must not touch the event loop. Implement
+        it as a `staticmethod` so that it can also be sent to a process executor.
+        """
 
     # @implements DictDatabase
     @property
@@ -22,11 +74,80 @@ class ReadOnlyRemoteFileDatabase(DictDatabase):
 
     # @implements DictDatabase
     async def read(self) -> dict:
-        self._log.info(f"Downloading database from remote file: {self._address}")
-        response = urllib.request.urlopen(self._address)
-        raw = response.read().decode("utf8")
-        return await self.parse(raw)
+        raw = await self._fetch()
+        return await run_in_executor(self._executor, self.parse, raw)
 
     # @implements DictDatabase
     async def write(self, data: dict):
         pass
+
+    async def _fetch(self) -> str:
+        cache_path = self._cache_path
+        # The copy from the last successful download, if there is one.
+        cached = cache_path if (cache_path and cache_path.exists()) else None
+        cache_meta = await self._read_cache_meta(cached) if cached else {}
+        headers = {}
+        if etag := cache_meta.get("etag"):
+            headers["If-None-Match"] = etag
+        if last_modified := cache_meta.get("last_modified"):
+            headers["If-Modified-Since"] = last_modified
+        self._log.info(f"Downloading database from remote file: {self._address}")
+        try:
+            session = get_http_session()
+            async with session.get(
+                self._address,
+                headers=headers,
+                timeout=aiohttp.ClientTimeout(total=self._timeout),
+            ) as response:
+                if cached and (response.status == 304):
+                    self._log.info("Remote file has not changed; using cached copy")
+                    return await self._read_cache(cached)
+                response.raise_for_status()
+                raw = await response.text(encoding="utf-8")
+                cache_meta = {
+                    "etag": response.headers.get("ETag"),
+                    "last_modified": response.headers.get("Last-Modified"),
+                }
+        except (aiohttp.ClientError, asyncio.TimeoutError) as ex:
+            if not cached:
+                raise
+            self._log.warning(
+                f"Failed to download remote file ({ex!r}); using cached copy instead"
+            )
+            return await self._read_cache(cached)
+        if cache_path is not None:
+            await self._write_cache(cache_path, raw, cache_meta)
+        return raw
+
+    @staticmethod
+    def _cache_meta_path(cache_path: Path) -> Path:
+        return cache_path.with_name(f"{cache_path.name}.meta.json")
+
+    async def _read_cache_meta(self, cache_path: Path) -> dict:
+        meta_path = self._cache_meta_path(cache_path)
+        if not meta_path.exists():
+            return {}
+        try:
+            raw = await run_in_executor(self._executor, file_io.read_text, meta_path)
+            return json.loads(raw)
+        except (OSError, ValueError):
+            self._log.exception(
+                f"Ignoring unreadable cache metadata for: {self._address}"
+            )
+            return {}
+
+    async def _read_cache(self, cache_path: Path) -> str:
+        return await run_in_executor(self._executor, file_io.read_text, cache_path)
+
+    async def _write_cache(self, cache_path: Path, raw: str, cache_meta: dict):
+        # Write the file before its metadata, so that the metadata never describes a newer file.
+        await run_in_executor(
+            self._executor, file_io.write_text, cache_path, raw, Durability.NONE
+        )
+        await run_in_executor(
+            self._executor,
+            file_io.write_text,
+            self._cache_meta_path(cache_path),
+            json.dumps(cache_meta),
+            Durability.NONE,
+        )
@@ -0,0 +1,228 @@
+import asyncio
+import hashlib
+import zlib
+from abc import abstractmethod
+from collections import defaultdict
+from concurrent.futures import Executor
+from os import PathLike
+from pathlib import Path
+from typing import IO, Dict, Hashable, Iterable, List, Optional, Set
+from urllib.parse import quote
+
+from discord.ext.commands import Bot, Cog
+
+from commanderbot_lib.database import file_io
+from commanderbot_lib.database.abc.dict_database import DictDatabase
+from commanderbot_lib.database.changes import Change
+from commanderbot_lib.database.file_io import Durability
+from commanderbot_lib.executors import run_in_executor
+from commanderbot_lib.utils import fix_path
+
+SHARD_PLACEHOLDER = "{shard}"
+
+
+class ShardedFileDatabase(DictDatabase):
+    """
+    A `DictDatabase` that splits its top-level keys (usually guild IDs) across several files, so
+    that changes to one key only rewrite the file containing it.
+
+    Each shard is a file containing a subset of the top-level keys. By default every key gets its
+    own shard, named after the key; if a number of buckets is given, keys are instead hashed into
+    that many shards.
+
+    In lazy mode, `read()` returns nothing up front and shards are instead loaded one at a time,
+    as their keys are requested with `read_key()`.
+
+    Attributes
+    -----------
+    bot: :class:`Bot`
+        The parent discord.py bot instance.
+    cog: :class:`Cog`
+        The parent discord.py cog instance.
+    path: :class:`PathLike`
+        The path to each shard on the local filesystem, where the file name contains a `{shard}`
+        placeholder for the name of the shard. For example: `data/my-cog/{shard}.json`
+    persistent: :class:`bool`
+        Whether changes should be written back to the files on disk.
+    executor: :class:`Optional[Executor]`
+        The executor to do file I/O in. Defaults to the shared thread executor.
+    durability: :class:`Durability`
+        How hard to try to make sure that writes have reached the disk.
+    buckets: :class:`Optional[int]`
+        The number of shards to hash keys into, or `None` to give each key its own shard.
+    lazy: :class:`bool`
+        Whether to load shards only as their keys are requested.
+    """
+
+    def __init__(
+        self,
+        bot: Bot,
+        cog: Cog,
+        path: PathLike,
+        persistent: bool = True,
+        executor: Optional[Executor] = None,
+        durability: Durability = Durability.FILE,
+        buckets: Optional[int] = None,
+        lazy: bool = True,
+    ):
+        super().__init__(bot, cog)
+        self._path: Path = fix_path(path)
+        if SHARD_PLACEHOLDER not in self._path.name:
+            raise ValueError(
+                f"Sharded file database path must contain {SHARD_PLACEHOLDER} in the file name: {path}"
+            )
+        self._persistent: bool = persistent
+        self._executor: Optional[Executor] = executor
+        self._durability: Durability = durability
+        self.buckets: Optional[int] = buckets
+        self.lazy: bool = lazy
+        # The shards whose data has been handed out by `read()` or `read_key()`.
+        self._loaded_shards: Set[str] = set()
+        # A hash of what was last written to each shard, to skip rewriting unchanged shards.
+        self._shard_hashes: Dict[str, bytes] = {}
+        self._lock: asyncio.Lock = asyncio.Lock()
+
+    @abstractmethod
+    def load(self, file: IO) -> dict:
+        """ See `FileDatabase.load`. """
+
+    @abstractmethod
+    def dump(self, data: dict, file: IO):
+        """ See `FileDatabase.dump`. """
+
+    # @implements DictDatabase
+    @property
+    def persistent(self) -> bool:
+        return self._persistent
+
+    # @overrides DictDatabase
+    @property
+    def supports_changes(self) -> bool:
+        return True
+
+    def shard_name(self, key: Hashable) -> str:
+        """ Return the name of the shard that contains the given top-level key. """
+        if self.buckets:
+            return str(zlib.crc32(str(key).encode("utf-8")) % self.buckets)
+        return quote(str(key), safe="")
+
+    def shard_path(self, shard: str) -> Path:
+        return self._path.with_name(self._path.name.replace(SHARD_PLACEHOLDER, shard))
+
+    # @implements DictDatabase
+    async def read(self) -> dict:
+        if self.lazy:
+            self._log.info(f"Shards will be loaded lazily from: {self._path}")
+            return {}
+        shard_paths = list(
+            self._path.parent.glob(self._path.name.replace(SHARD_PLACEHOLDER, "*"))
+        )
+        self._log.info(f"Loading database from {len(shard_paths)} shards: {self._path}")
+        data = await run_in_executor(
+            self._executor, file_io.read_shards, shard_paths, self.load
+        )
+        self._loaded_shards.update(self.shard_name(key) for key in data)
+        return data
+
+    # @overrides DictDatabase
+    async def read_key(self, key: Hashable) -> dict:
+        shard = self.shard_name(key)
+        async with self._lock:
+            if shard in self._loaded_shards:
+                return {}
+            shard_path = self.shard_path(shard)
+            self._log.info(f"Loading shard: {shard_path}")
+            data = await run_in_executor(
+                self._executor, file_io.read_shard, shard_path, self.load
+            )
+            self._loaded_shards.add(shard)
+            return data
+
+    # @overrides DictDatabase
+    @property
+    def supports_key_reads(self) -> bool:
+        return True
+
+    # @overrides DictDatabase
+    async def read_keys(self, keys: Iterable[Hashable]) -> dict:
+        """ Read the shards containing the given keys, and keep only those keys. """
+        keys_by_shard: Dict[str, List[Hashable]] = defaultdict(list)
+        for key in keys:
+            keys_by_shard[self.shard_name(key)].append(key)
+        shard_paths = [self.shard_path(shard) for shard in keys_by_shard]
+        # Don't read shards while they're being written.
+        async with self._lock:
+            data = await run_in_executor(
+                self._executor, file_io.read_shards, shard_paths, self.load
+            )
+        return {
+            key: data[key]
+            for shard_keys in keys_by_shard.values()
+            for key in shard_keys
+            if key in data
+        }
+
+    # @implements DictDatabase
+    async def write(self, data: dict):
+        """
+        Write every shard that has keys in `data` or that has been loaded before, skipping any
+        whose contents haven't changed since they were last written.
+
+        Shards that haven't been loaded are merged with the data on disk rather than replaced, so
+        that keys which were never loaded aren't lost.
+        """
+        data_by_shard: Dict[str, dict] = defaultdict(dict)
+        for key, value in data.items():
+            data_by_shard[self.shard_name(key)][key] = value
+        for shard in self._loaded_shards:
+            data_by_shard.setdefault(shard, {})
+        # Take the snapshots here, on the event loop, so that the data can't change underneath us.
+        snapshots = {
+            shard: file_io.snapshot_data(shard_data)
+            for shard, shard_data in data_by_shard.items()
+        }
+        async with self._lock:
+            for shard, snapshot in snapshots.items():
+                snapshot_hash = hashlib.blake2b(snapshot, digest_size=16).digest()
+                if self._shard_hashes.get(shard) == snapshot_hash:
+                    continue
+                merge = shard not in self._loaded_shards
+                self._log.info(f"Saving shard: {self.shard_path(shard)}")
+                await run_in_executor(
+                    self._executor,
+                    file_io.write_shard,
+                    self.shard_path(shard),
+                    snapshot,
+                    merge,
+                    self.load,
+                    self.dump,
+                    self._durability,
+                )
+                if merge:
+                    self._shard_hashes.pop(shard, None)
+                else:
+                    self._shard_hashes[shard] = snapshot_hash
+
+    # @overrides DictDatabase
+    async def write_changes(self, changes: List[Change]):
+        """ Apply the changes to only those shards that contain the changed keys. """
+        changes_by_shard: Dict[str, List[Change]] = defaultdict(list)
+        for change in changes:
+            changes_by_shard[self.shard_name(change.path[0])].append(change)
+        # Take the snapshots here, on the event loop, so that the values can't change underneath us.
+        snapshots = {
+            self.shard_path(shard): file_io.snapshot_data(shard_changes)
+            for shard, shard_changes in changes_by_shard.items()
+        }
+        async with self._lock:
+            self._log.info(f"Saving changes to {len(snapshots)} shard(s): {self._path}")
+            await run_in_executor(
+                self._executor,
+                file_io.apply_shard_changes,
+                snapshots,
+                self.load,
+                self.dump,
+                self._durability,
+            )
+            for shard in changes_by_shard:
+                self._shard_hashes.pop(shard, None)
@@ -1,36 +1,24 @@
+from concurrent.futures import Executor
 from os import PathLike
-from typing import Callable, Iterable
+from typing import Any, Dict, Hashable, List, Optional, Tuple
 
 from discord.ext.commands import Bot, Cog
 
 from commanderbot_lib.database.abc.file_database import FileDatabase
+from commanderbot_lib.database.backups import BackupPolicy
+from commanderbot_lib.database.file_io import Durability
+from commanderbot_lib.database.mixins.versioned_database_mixin import (
+    BackwardsMigrationError,
+    DataMigration,
+    DataMigrationCollector,
+    FailedMigrationError,
+    RecordMigration,
+    RecordMigrationCollector,
+    VersionedDatabaseMixin,
+)
 
-DataMigration = Callable[["VersionedFileDatabase", dict], None]
-DataMigrationCollector = Callable[
-    ["VersionedFileDatabase", int, int], Iterable[DataMigration]
-]
 
-
-class BackwardsMigrationError(Exception):
-    def __init__(self, expected_version: int, actual_version: int):
-        super().__init__(
-            f"Cannot migrate data backwards from unrecognized future version {actual_version} down"
-            f" to expected version {expected_version}."
-        )
-        self.expected_version: int = expected_version
-        self.actual_version: int = actual_version
-
-
-class FailedMigrationError(Exception):
-    def __init__(self, expected_version: int, actual_version: int):
-        super().__init__(
-            f"Failed to migrate data from version {actual_version} to expected version {expected_version}."
-        )
-        self.expected_version: int = expected_version
-        self.actual_version: int = actual_version
-
-
-class VersionedFileDatabase(FileDatabase):
+class VersionedFileDatabase(FileDatabase, VersionedDatabaseMixin):
     """
     A `FileDatabase` that maintains a versioned set of data. Data is upgraded from one format to
     another automatically when necessary, through the use of pre-programmed migrations.
@@ -51,6 +39,20 @@ class VersionedFileDatabase(FileDatabase):
         transform it in some way.
     persistent: :class:`bool`
         Whether changes should be written back to the file on disk.
+    executor: :class:`Optional[Executor]`
+        The executor to do file I/O in. Defaults to the shared thread executor.
+    durability: :class:`Durability`
+        How hard to try to make sure that writes have reached the disk.
+    backups: :class:`Optional[BackupPolicy]`
+        How to create and keep backups of the file. Defaults to `BackupPolicy()`.
+    migrate_record: :class:`Optional[RecordMigrationCollector]`
+        Like `migrate`, but yields migrations for individual top-level records (usually guilds),
+        in the form of `RecordMigration`. If given, outdated records are migrated lazily as they
+        are read with `read_key()`, instead of all at once upon reading. The version of each
+        record that hasn't been migrated yet is kept in the file, under `record_versions`.
+    locking: :class:`bool`
+        Whether to lock the file, so that it can be shared by several processes. Since the data is
+        wrapped in the file, only full writes are supported.
     """
 
     def __init__(
@@ -61,57 +63,159 @@ class VersionedFileDatabase(FileDatabase):
         version: int,
         migrate: DataMigrationCollector,
         persistent: bool = True,
+        executor: Optional[Executor] = None,
+        durability: Durability = Durability.FILE,
+        backups: Optional[BackupPolicy] = None,
+        migrate_record: Optional[RecordMigrationCollector] = None,
+        locking: bool = False,
     ):
-        super().__init__(bot, cog, path=path, persistent=persistent)
+        super().__init__(
+            bot,
+            cog,
+            path=path,
+            persistent=persistent,
+            executor=executor,
+            durability=durability,
+            backups=backups,
+            locking=locking,
+        )
         assert isinstance(version, int)
         self.version: int = version
         self._migrate: DataMigrationCollector = migrate
+        self._migrate_record: Optional[RecordMigrationCollector] = migrate_record
+        # Records that haven't been migrated and handed out yet, along with their versions.
+        self._deferred_records: Dict[Hashable, Tuple[int, Any]] = {}
+
+    # @overrides FileDatabase
+    @property
+    def supports_changes(self) -> bool:
+        return False
+
+    # @overrides FileDatabase
+    @property
+    def supports_warm_start(self) -> bool:
+        # Reading may migrate the data, and defer records, which a warm start would skip.
+        return False
 
     # @overrides FileDatabase
     async def read(self) -> dict:
+        _, data = await self.migrate()
+        return data
+
+    async def migrate(
+        self, dry_run: bool = False, unversioned: bool = True
+    ) -> Tuple[Optional[int], dict]:
+        """
+        Read the data and migrate it to the expected version, if necessary. Migrated data is
+        immediately written back to file after backing up the old file, unless this is a dry run.
+        Unversioned data is left alone, rather than wrapped in the expected version, unless
+        `unversioned` is true.
+
+        Return the version of the data in the file (or `None` if it was unversioned) along with the
+        migrated data.
+        """
         # Use the usual read method, but extract and adjust the inner data.
         wrapper_data = await self._read_file()
-        actual_version = wrapper_data.get("version", None)
+        file_version = wrapper_data.get("version", None)
         actual_data = wrapper_data.get("data", {})
+        if (file_version is None) and not unversioned:
+            return None, wrapper_data
         # If no version is defined, assume the entire file is data of the expected version. This is
         # for the convenience of migrating from unversioned data.
-        if actual_version is None:
+        if file_version is None:
             self._log.warning(
                 f"Data is unversioned! Assuming expected version: {self.version}"
             )
-            actual_version = self.version
             actual_data = wrapper_data
-            # Create a backup of the old data just in case.
-            await self.backup()
-            # Immediately write the version back to file.
-            await self.write(actual_data)
+        # Defer the migration of individual records, if there are any to migrate.
+        elif self._should_defer(wrapper_data):
+            data = self._defer_records(wrapper_data)
+            if self._deferred_records and not dry_run:
+                # Create a backup of the old data just in case.
+                await self.backup()
+            return file_version, data
         # Attempt to migrate the data from one version to another, if necessary.
-        elif actual_version < self.version:
-            self._log.warning(
-                f"Migrating data from version {actual_version} to {self.version}..."
-            )
-            # Collect and apply migrations, in order.
-            try:
-                migrations = list(self._migrate(self, actual_version, self.version))
-                if migrations:
-                    self._log.warning(f"Applying {len(migrations)} data migrations...")
-                    for migration in migrations:
-                        self._log.warning(f"[->] {migration.__name__}")
-                        await migration(self, actual_data)
-            except Exception as ex:
-                raise FailedMigrationError(self.version, actual_version) from ex
+        elif file_version < self.version:
+            await self._apply_migrations(actual_data, file_version)
+        # If the actual version is from the future, throw an error.
+        elif file_version > self.version:
+            raise BackwardsMigrationError(self.version, file_version)
+        # Otherwise the data is already up-to-date, and there's nothing to write back.
+        else:
+            return file_version, actual_data
+        if not dry_run:
             # Create a backup of the old data just in case.
             await self.backup()
-            # Immediately write the migrated data back to file.
+            # Immediately write the versioned (and possibly migrated) data back to file.
             await self.write(actual_data)
-            self._log.warning(f"Data migration complete!")
-        # If the actual version is from the future, throw an error.
-        elif actual_version > self.version:
-            raise BackwardsMigrationError(self.version, actual_version)
+            if file_version is not None:
+                self._log.warning(f"Data migration complete!")
         # Return the migrated data, which may or may not be any different from the original.
-        return actual_data
+        return file_version, actual_data
+
+    # @overrides DictDatabase
+    async def read_key(self, key: Hashable) -> dict:
+        """ Migrate and return the given record, if its migration was deferred. """
+        deferred = self._deferred_records.pop(key, None)
+        if deferred is None:
+            return {}
+        record_version, record = deferred
+        try:
+            record = await self._apply_record_migrations(key, record, record_version)
+        except:
+            self._deferred_records[key] = deferred
+            raise
+        return {key: record}
+
+    # @overrides DictDatabase
+    def deferred_keys(self) -> List[Hashable]:
+        return list(self._deferred_records)
 
     # @overrides FileDatabase
     async def write(self, data: dict):
         wrapper_data = {"version": self.version, "data": data}
+        # Keep any records that haven't been migrated yet, along with their versions.
+        if self._deferred_records:
+            merged_data = dict(data)
+            record_versions = {}
+            for key, (record_version, record) in self._deferred_records.items():
+                if key not in merged_data:
+                    merged_data[key] = record
+                    record_versions[key] = record_version
+            wrapper_data = {
+                "version": self.version,
+                "data": merged_data,
+                "record_versions": record_versions,
+            }
         await self._write_file(wrapper_data)
+
+    def _should_defer(self, wrapper_data: dict) -> bool:
+        if wrapper_data.get("record_versions"):
+            if self._migrate_record is None:
+                raise ValueError(
+                    f"Database has records with pending migrations, but no record migrations were given: {self._path}"
+                )
+            return True
+        return (self._migrate_record is not None) and (
+            wrapper_data["version"] < self.version
+        )
+
+    def _defer_records(self, wrapper_data: dict) -> dict:
+        """ Return the records that are up-to-date, and defer the migration of the rest. """
+        file_version = wrapper_data["version"]
+        record_versions = wrapper_data.get("record_versions", {})
+        ready_data = {}
+        self._deferred_records = {}
+        for key, record in wrapper_data.get("data", {}).items():
+            record_version = record_versions.get(key, file_version)
+            if record_version == self.version:
+                ready_data[key] = record
+            elif record_version < self.version:
+                self._deferred_records[key] = (record_version, record)
+            else:
+                raise BackwardsMigrationError(self.version, record_version)
+        if self._deferred_records:
+            self._log.warning(
+                f"Deferring the migration of {len(self._deferred_records)} record(s) to version {self.version}"
+            )
+        return ready_data
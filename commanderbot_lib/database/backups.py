@@ -0,0 +1,181 @@
+# NOTE Like those in `file_io`, these functions do blocking file I/O and are meant to be run inside
+# of an executor.
+
+import gzip
+import re
+import shutil
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import IO, List, Optional
+
+from commanderbot_lib.database import file_io
+from commanderbot_lib.database.codecs import binary_file
+from commanderbot_lib.database.file_io import Durability
+
+BACKUP_TIMESTAMP_FORMAT = "%Y-%m-%d-%H-%M-%S-%f"
+
+COMPRESSED_SUFFIX = ".gz"
+
+
+@dataclass
+class BackupPolicy:
+    """
+    How to create backups of a database file, and how long to keep them around for.
+
+    By default, every backup is kept. The most recent backup is always kept, regardless of the
+    retention settings, as are backups created before content hashes were added to their names.
+
+    Attributes
+    -----------
+    keep_count: :class:`Optional[int]`
+        Keep at most this many backups, deleting the oldest ones first.
+    keep_for: :class:`Optional[float]`
+        Delete backups that are older than this many seconds.
+    compress: :class:`bool`
+        Whether to compress backups with gzip.
+    deduplicate: :class:`bool`
+        Whether to skip creating a backup if the file hasn't changed since the last one.
+    """
+
+    keep_count: Optional[int] = None
+    keep_for: Optional[float] = None
+    compress: bool = True
+    deduplicate: bool = True
+
+
+@dataclass(frozen=True)
+class Backup:
+    """
+    A backup of a database file.
+
+    Attributes
+    -----------
+    path: :class:`Path`
+        The path to the backup file itself.
+    timestamp: :class:`datetime`
+        When the backup was created, in UTC.
+    content_hash: :class:`Optional[str]`
+        A hash of the backed-up contents, if known. Older backups don't have one.
+    """
+
+    path: Path
+    timestamp: datetime
+    content_hash: Optional[str]
+
+    @property
+    def compressed(self) -> bool:
+        return self.path.name.endswith(COMPRESSED_SUFFIX)
+
+
+def backup_name_pattern(path: Path) -> re.Pattern:
+    """
+    Return a pattern that matches the names of backups of the file at `path`, such as
+    `data.backup.2021-01-08-12-00-00-000000.0123456789abcdef.json.gz` for `data.json`.
+
+    Backups created before content hashes and compression are matched as well.
+    """
+    return re.compile(
+        re.escape(f"{path.stem}.backup.")
+        + r"(?P<timestamp>\d{4}(?:-\d+){6})"
+        + r"(?:\.(?P<content_hash>[0-9a-f]{16}))?"
+        + re.escape(path.suffix)
+        + f"(?:{re.escape(COMPRESSED_SUFFIX)})?$"
+    )
+
+
+def list_backups(path: Path) -> List[Backup]:
+    """ Return the existing backups of the file at `path`, oldest first. """
+    pattern = backup_name_pattern(path)
+    backups = []
+    for backup_path in path.parent.glob(f"{path.stem}.backup.*"):
+        if match := pattern.match(backup_path.name):
+            timestamp = datetime.strptime(
+                match.group("timestamp"), BACKUP_TIMESTAMP_FORMAT
+            )
+            backups.append(Backup(backup_path, timestamp, match.group("content_hash")))
+    return sorted(backups, key=lambda backup: backup.timestamp)
+
+
+def hash_file(path: Path) -> str:
+    with open(path, "rb") as file:
+        return file_io.hash_stream(file)
+
+
+def create_backup(
+    path: Path,
+    policy: BackupPolicy,
+    durability: Durability,
+    source: Optional[Path] = None,
+) -> Backup:
+    """
+    Back up the file at `path` (or `source`, if given, which should be a copy of it) according to
+    the policy, and delete any backups that the policy no longer wants to keep.
+
+    Return the new backup, or the most recent existing backup if the file hasn't changed since.
+    """
+    source = source or path
+    content_hash = hash_file(source)
+    backups = list_backups(path)
+    if policy.deduplicate and backups and (backups[-1].content_hash == content_hash):
+        backup = backups[-1]
+    else:
+        timestamp = datetime.utcnow()
+        name = f"{path.stem}.backup.{timestamp.strftime(BACKUP_TIMESTAMP_FORMAT)}.{content_hash}{path.suffix}"
+        if policy.compress:
+            name += COMPRESSED_SUFFIX
+        backup = Backup(path.with_name(name), timestamp, content_hash)
+        dump = _dump_compressed if policy.compress else _dump_uncompressed
+        file_io.write_data(backup.path, source, dump, durability)
+    prune_backups(path, policy)
+    return backup
+
+
+def prune_backups(path: Path, policy: BackupPolicy) -> List[Backup]:
+    """
+    Delete the backups of the file at `path` that the policy no longer wants to keep.
+
+    Backups without a content hash are never deleted, since they were created by older versions
+    that kept every backup; they may be the only copies of the data from before a migration.
+    """
+    now = datetime.utcnow()
+    expired = []
+    managed = [backup for backup in list_backups(path) if backup.content_hash]
+    # Go from newest to oldest, always keeping the newest.
+    for i, backup in enumerate(reversed(managed)):
+        if i == 0:
+            continue
+        too_many = (policy.keep_count is not None) and (i >= policy.keep_count)
+        too_old = (policy.keep_for is not None) and (
+            (now - backup.timestamp).total_seconds() > policy.keep_for
+        )
+        if too_many or too_old:
+            expired.append(backup)
+    file_io.delete_files([backup.path for backup in expired])
+    return expired
+
+
+def restore_backup(path: Path, backup: Backup, durability: Durability):
+    """ Atomically replace the file at `path` with the contents of the backup. """
+    file_io.write_data(path, backup, _dump_restored, durability)
+
+
+def _dump_compressed(source: Path, file: IO):
+    with open(source, "rb") as source_file:
+        # Leave the modification time and the name of the temporary file out of the header, so
+        # that identical files compress the same.
+        with gzip.GzipFile(
+            filename="", fileobj=binary_file(file), mode="wb", compresslevel=6, mtime=0
+        ) as gzip_file:
+            shutil.copyfileobj(source_file, gzip_file)
+
+
+def _dump_uncompressed(source: Path, file: IO):
+    with open(source, "rb") as source_file:
+        shutil.copyfileobj(source_file, binary_file(file))
+
+
+def _dump_restored(backup: Backup, file: IO):
+    opener = gzip.open if backup.compressed else open
+    with opener(backup.path, "rb") as backup_file:
+        shutil.copyfileobj(backup_file, binary_file(file))
@@ -0,0 +1,92 @@
+from dataclasses import dataclass
+from typing import Any, Hashable, Iterable, List, Mapping, MutableMapping, Tuple, Union
+
+# A sequence of keys leading from the root of the data to a nested value.
+KeyPath = Tuple[Hashable, ...]
+
+
+@dataclass(frozen=True)
+class SetChange:
+    """ Set the value at `path`, creating any missing parents along the way. """
+
+    path: KeyPath
+    value: Any
+
+
+@dataclass(frozen=True)
+class DeleteChange:
+    """ Delete the value at `path`, if there is one. """
+
+    path: KeyPath
+
+
+Change = Union[SetChange, DeleteChange]
+
+
+def apply_change(data: dict, change: Change):
+    """
+    Apply a single change to `data` in-place.
+
+    Changes are idempotent: applying the same change twice has the same effect as applying it once.
+    """
+    if not change.path:
+        raise ValueError("Cannot apply a change to an empty key path")
+    *parent_path, key = change.path
+    parent = data
+    if isinstance(change, SetChange):
+        for part in parent_path:
+            parent = parent.setdefault(part, {})
+        parent[key] = change.value
+    elif isinstance(change, DeleteChange):
+        for part in parent_path:
+            parent = parent.get(part)
+            if not isinstance(parent, MutableMapping):
+                return
+        parent.pop(key, None)
+    else:
+        raise ValueError(f"Unknown change: {change}")
+
+
+def lookup_path(data: dict, path: KeyPath) -> Any:
+    """ Return the value at `path`, raising a `KeyError` if there isn't one. """
+    value = data
+    for part in path:
+        if not isinstance(value, Mapping):
+            raise KeyError(path)
+        value = value[part]
+    return value
+
+
+def collapse_paths(paths: Iterable[KeyPath]) -> List[KeyPath]:
+    """ Return the given paths without duplicates or paths nested within any of the others. """
+    collapsed: List[KeyPath] = []
+    kept = set()
+    for path in sorted(set(paths), key=len):
+        if not any(path[:i] in kept for i in range(1, len(path))):
+            kept.add(path)
+            collapsed.append(path)
+    return collapsed
+
+
+def apply_changes(data: dict, changes: Iterable[Change]):
+    """ Apply each change to `data` in-place, in order. """
+    for change in changes:
+        apply_change(data, change)
+
+
+def serialize_change(change: Change) -> dict:
+    """ Convert a change into a JSON-serializable form. """
+    if isinstance(change, SetChange):
+        return {"set": list(change.path), "value": change.value}
+    if isinstance(change, DeleteChange):
+        return {"delete": list(change.path)}
+    raise ValueError(f"Unknown change: {change}")
+
+
+def deserialize_change(data: dict) -> Change:
+    """ Convert the serialized form of a change back into a change. """
+    if "set" in data:
+        return SetChange(path=tuple(data["set"]), value=data["value"])
+    if "delete" in data:
+        return DeleteChange(path=tuple(data["delete"]))
+    raise ValueError(f"Invalid change: {data}")
@@ -0,0 +1,74 @@
+from typing import IO, Callable, Union, cast
+
+from discord.ext.commands import Bot, Cog
+
+from commanderbot_lib.database import file_io
+from commanderbot_lib.database.abc.file_database import FileDatabase
+from commanderbot_lib.database.codecs import Codec
+from commanderbot_lib.database.lazy_mapping import LazyMapping
+from commanderbot_lib.executors import run_in_executor
+
+
+class CodecFileDatabase(FileDatabase):
+    """
+    A `FileDatabase` that reads and writes its file with any registered `Codec`.
+
+    Accepts the same arguments as `FileDatabase`, plus the `Codec` to use and whether to load the
+    file lazily.
+
+    In lazy mode, which requires a codec with an index (such as JSON), the file is memory-mapped
+    and `read()` returns a `LazyMapping` that only decodes each top-level value once it is first
+    accessed. The file is still indexed inside of the executor, but values are decoded on the
+    event loop as they are accessed.
+    """
+
+    def __init__(self, bot: Bot, cog: Cog, codec: Codec, lazy: bool = False, **kwargs):
+        super().__init__(bot, cog, **kwargs)
+        if lazy and (codec.index is None):
+            raise ValueError(f"The {codec.name} codec does not support lazy loading")
+        if lazy and kwargs.get("locking"):
+            raise ValueError("Lazy loading cannot be combined with locking")
+        self.codec: Codec = codec
+        self.lazy: bool = lazy
+
+    # NOTE These return the codec's functions instead of wrapping them in methods, so that they
+    # can be sent to a process executor without the database itself. See `FileDatabase`.
+
+    # @implements FileDatabase
+    @property
+    def load(self) -> Callable[[IO], dict]:
+        return self.codec.load
+
+    # @implements FileDatabase
+    @property
+    def dump(self) -> Callable[[dict, IO], None]:
+        return self.codec.dump
+
+    # @overrides FileDatabase
+    @property
+    def supports_warm_start(self) -> bool:
+        # Lazily-loaded data is backed by the memory-mapped file itself.
+        return super().supports_warm_start and not self.lazy
+
+    # @overrides FileDatabase
+    async def read(self) -> dict:
+        if self.lazy and self._path.exists() and self._path.stat().st_size:
+            # A `LazyMapping` stands in for the dict, since the data is only ever used as a mapping.
+            return cast(dict, await self._read_lazily())
+        return await super().read()
+
+    async def _read_lazily(self) -> Union[LazyMapping, dict]:
+        self._log.info(f"Indexing database file for lazy loading: {self._path}")
+        index, file_state = await run_in_executor(
+            self._executor, file_io.index_file, self._path, self.codec.index
+        )
+        buffer, identity = file_io.map_file(self._path)
+        # If the file was replaced in the meantime, then the index doesn't apply to it anymore.
+        if identity != file_state.identity:
+            buffer.close()
+            self._log.warning(
+                "Database file changed while it was being indexed; loading it entirely instead"
+            )
+            return await super().read()
+        self._file_state = file_state
+        return LazyMapping(buffer, index, self.codec.loads)
@@ -0,0 +1,28 @@
+from typing import Callable
+
+from discord.ext.commands import Bot, Cog
+
+from commanderbot_lib.database.abc.read_only_remote_file_database import (
+    ReadOnlyRemoteFileDatabase,
+)
+from commanderbot_lib.database.codecs import Codec
+
+
+class CodecReadOnlyRemoteFileDatabase(ReadOnlyRemoteFileDatabase):
+    """
+    A `ReadOnlyRemoteFileDatabase` that parses the remote file with any registered `Codec`.
+
+    Accepts the same arguments as `ReadOnlyRemoteFileDatabase`, plus the `Codec` to use.
+    """
+
+    def __init__(self, bot: Bot, cog: Cog, codec: Codec, **kwargs):
+        super().__init__(bot, cog, **kwargs)
+        self.codec: Codec = codec
+
+    # NOTE This returns the codec's function instead of wrapping it in a method, so that it can be
+    # sent to a process executor without the database itself.
+
+    # @implements ReadOnlyRemoteFileDatabase
+    @property
+    def parse(self) -> Callable[[str], dict]:
+        return self.codec.loads
@@ -0,0 +1,31 @@
+from typing import IO, Callable
+
+from discord.ext.commands import Bot, Cog
+
+from commanderbot_lib.database.abc.sharded_file_database import ShardedFileDatabase
+from commanderbot_lib.database.codecs import Codec
+
+
+class CodecShardedFileDatabase(ShardedFileDatabase):
+    """
+    A `ShardedFileDatabase` that reads and writes its shards with any registered `Codec`.
+
+    Accepts the same arguments as `ShardedFileDatabase`, plus the `Codec` to use.
+    """
+
+    def __init__(self, bot: Bot, cog: Cog, codec: Codec, **kwargs):
+        super().__init__(bot, cog, **kwargs)
+        self.codec: Codec = codec
+
+    # NOTE These return the codec's functions instead of wrapping them in methods, so that they
+    # can be sent to a process executor without the database itself. See `FileDatabase`.
+
+    # @implements ShardedFileDatabase
+    @property
+    def load(self) -> Callable[[IO], dict]:
+        return self.codec.load
+
+    # @implements ShardedFileDatabase
+    @property
+    def dump(self) -> Callable[[dict, IO], None]:
+        return self.codec.dump
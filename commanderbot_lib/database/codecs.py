@@ -0,0 +1,352 @@
+# NOTE Codec functions are run inside of an executor, so they must be defined at the module level
+# in order to be sent to a process pool. See `file_io`.
+
+import json
+import re
+from dataclasses import dataclass
+from typing import IO, Any, BinaryIO, Callable, Dict, List, Optional, Tuple, cast
+
+from commanderbot_lib.database.lazy_mapping import LazyIndex
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+@dataclass(frozen=True)
+class Codec:
+    """
+    A way of serializing data to and from files, such as JSON or YAML.
+
+    Attributes
+    -----------
+    name: :class:`str`
+        The name of the format, such as `json`.
+    extensions: :class:`Tuple[str, ...]`
+        The file extensions to use the codec for, including the leading dot.
+    load: :class:`Callable[[IO], Any]`
+        Parse data from an open file.
+    dump: :class:`Callable[[Any, IO], None]`
+        Serialize data to an open file.
+    loads: :class:`Callable[[Any], Any]`
+        Parse data from a string, such as the body of an HTTP response, or from bytes if the codec
+        is binary.
+    implementation: :class:`str`
+        The library backing the codec, for logging and benchmarking.
+    binary: :class:`bool`
+        Whether the codec reads and writes bytes rather than text. Files are always opened as text,
+        so binary codecs should use the underlying buffer, as given by `binary_file()`.
+    index: :class:`Optional[Callable[[bytes], LazyIndex]]`
+        Find the offsets of each top-level value in the encoded bytes of an object, without
+        decoding the values. Each value can then be decoded separately by `loads`, which must also
+        accept bytes. Only codecs with an index support lazy loading.
+    string_keys: :class:`bool`
+        Whether every key of a mapping is read back as a string, as with JSON, regardless of what
+        type it was written as.
+    """
+
+    name: str
+    extensions: Tuple[str, ...]
+    load: Callable[[IO], Any]
+    dump: Callable[[Any, IO], None]
+    loads: Callable[[Any], Any]
+    implementation: str = ""
+    binary: bool = False
+    index: Optional[Callable[[bytes], LazyIndex]] = None
+    string_keys: bool = False
+
+
+_codecs_by_name: Dict[str, Codec] = {}
+_codecs_by_extension: Dict[str, Codec] = {}
+
+
+def register_codec(codec: Codec, replace: bool = False):
+    """
+    Register a codec under its name and each of its extensions, so that file databases can be
+    created for paths ending in one of them.
+
+    Raises a `ValueError` if the name or any of the extensions are taken, unless `replace` is set.
+    """
+    if not replace:
+        if codec.name in _codecs_by_name:
+            raise ValueError(f"A codec named {codec.name} is already registered")
+        for extension in codec.extensions:
+            if extension in _codecs_by_extension:
+                raise ValueError(f"A codec for {extension} files is already registered")
+    _codecs_by_name[codec.name] = codec
+    for extension in codec.extensions:
+        _codecs_by_extension[extension] = codec
+
+
+def get_codec(name: str) -> Codec:
+    """ Return the codec registered under the given name, raising a `KeyError` if there isn't one. """
+    return _codecs_by_name[name]
+
+
+def get_codec_for_path(path: str) -> Optional[Codec]:
+    """ Return the codec to use for the given path or URL, or `None` if there isn't one. """
+    # Check longer extensions first, so that something like `.json.gz` takes precedence over `.gz`.
+    for extension in sorted(_codecs_by_extension, key=len, reverse=True):
+        if path.endswith(extension):
+            return _codecs_by_extension[extension]
+    return None
+
+
+def registered_codecs() -> List[Codec]:
+    return list(_codecs_by_name.values())
+
+
+def binary_file(file: IO) -> BinaryIO:
+    """ Return the binary buffer underlying a text file, or the file itself if it is binary. """
+    return cast(BinaryIO, getattr(file, "buffer", file))
+
+
+# JSON
+
+
+def _load_json(file: IO) -> Any:
+    return json.load(file)
+
+
+def _loads_json(raw: str) -> Any:
+    return json.loads(raw)
+
+
+def _dump_json(data: Any, file: IO):
+    # TODO Make the indent (and other options) configurable. #enhance
+    # Dumping to a string first is much faster than `json.dump`, which writes one chunk at a time.
+    file.write(json.dumps(data, indent=2))
+
+
+_JSON_WHITESPACE = re.compile(rb"[ \t\n\r]*")
+_JSON_STRING = rb'"[^"\\]*(?:\\.[^"\\]*)*"'
+_JSON_NOT_STRING_OR_BRACKET = rb'[^"{}\[\]]*'
+# An object or array that contains no further objects or arrays.
+_JSON_FLAT_CONTAINER = (
+    rb"[\[{]"
+    + _JSON_NOT_STRING_OR_BRACKET
+    + rb"(?:"
+    + _JSON_STRING
+    + _JSON_NOT_STRING_OR_BRACKET
+    + rb")*[\]}]"
+)
+# An object or array that contains, at most, flat objects or arrays.
+_JSON_SHALLOW_CONTAINER = (
+    rb"[\[{]"
+    + _JSON_NOT_STRING_OR_BRACKET
+    + rb"(?:(?:"
+    + _JSON_STRING
+    + rb"|"
+    + _JSON_FLAT_CONTAINER
+    + rb")"
+    + _JSON_NOT_STRING_OR_BRACKET
+    + rb")*[\]}]"
+)
+# Everything up to the next bracket, skipping over strings (which may contain brackets) and shallow
+# containers as a whole. Skipping shallow containers in one go is what makes indexing fast, since
+# the loop in `_skip_json_value` then only has to visit the outer layers of each value. Every part
+# of this is unambiguous, so a failed attempt to match a container can't backtrack excessively.
+_JSON_UNTIL_BRACKET = re.compile(
+    _JSON_NOT_STRING_OR_BRACKET
+    + rb"(?:(?:"
+    + _JSON_STRING
+    + rb"|"
+    + _JSON_SHALLOW_CONTAINER
+    + rb")"
+    + _JSON_NOT_STRING_OR_BRACKET
+    + rb")*"
+)
+_JSON_KEY = re.compile(_JSON_STRING)
+_JSON_SCALAR = re.compile(_JSON_STRING + rb"|[^,}\]\s]+")
+_JSON_OPENING_BRACKETS = b"{["
+_JSON_CLOSING_BRACKETS = b"}]"
+
+
+def _index_json(buffer: bytes) -> LazyIndex:
+    """
+    Find the offsets of each top-level value of a JSON object, without decoding the values.
+
+    This only scans for strings and brackets, and otherwise assumes that the JSON is valid.
+    """
+    index = {}
+    pos = _skip_json_whitespace(buffer, 0)
+    pos = _expect_json(buffer, pos, b"{")
+    if buffer[pos : pos + 1] == b"}":
+        return index
+    while True:
+        match = _JSON_KEY.match(buffer, pos)
+        if match is None:
+            raise ValueError(f"Expected a key at position {pos}")
+        key = json.loads(match.group())
+        pos = _expect_json(buffer, match.end(), b":")
+        end = _skip_json_value(buffer, pos)
+        index[key] = (pos, end)
+        pos = _skip_json_whitespace(buffer, end)
+        if buffer[pos : pos + 1] == b"}":
+            return index
+        pos = _expect_json(buffer, pos, b",")
+
+
+def _skip_json_whitespace(buffer: bytes, pos: int) -> int:
+    # The pattern matches the empty string, so it always matches.
+    match = _JSON_WHITESPACE.match(buffer, pos)
+    assert match is not None
+    return match.end()
+
+
+def _expect_json(buffer: bytes, pos: int, token: bytes) -> int:
+    """ Expect `token` at `pos`, and return the position of whatever comes after it. """
+    pos = _skip_json_whitespace(buffer, pos)
+    if buffer[pos : pos + 1] != token:
+        raise ValueError(f"Expected {token.decode()} at position {pos}")
+    return _skip_json_whitespace(buffer, pos + 1)
+
+
+def _skip_json_value(buffer: bytes, pos: int) -> int:
+    """ Return the position just after the value starting at `pos`. """
+    if buffer[pos : pos + 1] not in (b"{", b"["):
+        match = _JSON_SCALAR.match(buffer, pos)
+        if match is None:
+            raise ValueError(f"Expected a value at position {pos}")
+        return match.end()
+    depth = 0
+    while True:
+        bracket = buffer[pos : pos + 1]
+        if not bracket:
+            raise ValueError("Unexpected end of JSON")
+        if bracket in _JSON_OPENING_BRACKETS:
+            depth += 1
+        elif bracket in _JSON_CLOSING_BRACKETS:
+            depth -= 1
+        else:
+            raise ValueError(f"Unterminated string at position {pos}")
+        pos += 1
+        if depth == 0:
+            return pos
+        # Like whitespace, this always matches.
+        match = _JSON_UNTIL_BRACKET.match(buffer, pos)
+        assert match is not None
+        pos = match.end()
+
+
+def _load_orjson(file: IO) -> Any:
+    assert orjson is not None
+    return orjson.loads(file.read())
+
+
+def _loads_orjson(raw: str) -> Any:
+    assert orjson is not None
+    return orjson.loads(raw)
+
+
+def _dump_orjson(data: Any, file: IO):
+    assert orjson is not None
+    try:
+        raw = orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+    except orjson.JSONEncodeError:
+        # orjson is stricter than the standard library, for example about integers over 64 bits.
+        _dump_json(data, file)
+    else:
+        file.write(raw.decode("utf-8"))
+
+
+if orjson is not None:
+    register_codec(
+        Codec(
+            name="json",
+            extensions=(".json",),
+            load=_load_orjson,
+            dump=_dump_orjson,
+            loads=_loads_orjson,
+            implementation="orjson",
+            index=_index_json,
+            string_keys=True,
+        )
+    )
+else:
+    register_codec(
+        Codec(
+            name="json",
+            extensions=(".json",),
+            load=_load_json,
+            dump=_dump_json,
+            loads=_loads_json,
+            implementation="json",
+            index=_index_json,
+            string_keys=True,
+        )
+    )
+
+
+# YAML
+
+
+if yaml is not None:
+    # Use the libyaml bindings if PyYAML was built with them; they are many times faster.
+    _YamlLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+    _YamlDumper = getattr(yaml, "CSafeDumper", yaml.SafeDumper)
+
+    def _load_yaml(file: IO) -> Any:
+        assert yaml is not None
+        return yaml.load(file, Loader=_YamlLoader)
+
+    def _loads_yaml(raw: str) -> Any:
+        assert yaml is not None
+        return yaml.load(raw, Loader=_YamlLoader)
+
+    def _dump_yaml(data: Any, file: IO):
+        assert yaml is not None
+        yaml.dump(data, file, Dumper=_YamlDumper)
+
+    register_codec(
+        Codec(
+            name="yaml",
+            extensions=(".yaml", ".yml"),
+            load=_load_yaml,
+            dump=_dump_yaml,
+            loads=_loads_yaml,
+            implementation="libyaml" if yaml.__with_libyaml__ else "pyyaml",
+        )
+    )
+
+
+# MessagePack
+
+
+if msgpack is not None:
+
+    def _load_msgpack(file: IO) -> Any:
+        return _loads_msgpack(binary_file(file).read())
+
+    def _loads_msgpack(raw: bytes) -> Any:
+        # Unlike JSON, MessagePack can represent non-string keys such as integers.
+        assert msgpack is not None
+        return msgpack.unpackb(raw, strict_map_key=False)
+
+    def _dump_msgpack(data: Any, file: IO):
+        assert msgpack is not None
+        # Packing only returns nothing when streaming, which `packb` never does.
+        binary_file(file).write(cast(bytes, msgpack.packb(data)))
+
+    register_codec(
+        Codec(
+            name="msgpack",
+            extensions=(".msgpack",),
+            load=_load_msgpack,
+            dump=_dump_msgpack,
+            loads=_loads_msgpack,
+            implementation="msgpack",
+            binary=True,
+        )
+    )
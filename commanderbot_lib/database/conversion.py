@@ -0,0 +1,83 @@
+import argparse
+import io
+from os import PathLike
+from typing import Any, List, Optional
+
+from commanderbot_lib.database import file_io
+from commanderbot_lib.database.codecs import Codec, get_codec_for_path
+from commanderbot_lib.database.file_io import Durability
+from commanderbot_lib.utils import fix_path
+
+
+class ConversionError(Exception):
+    def __init__(self, source: str, target: str, reason: str):
+        super().__init__(f"Cannot convert {source} to {target}: {reason}")
+        self.source: str = source
+        self.target: str = target
+        self.reason: str = reason
+
+
+def convert_file(
+    source: PathLike,
+    target: PathLike,
+    durability: Durability = Durability.FILE,
+):
+    """
+    Convert a file database from one format into another, such as from JSON to MessagePack. The
+    format of each file is picked by its extension, as with `get_codec_for_path()`.
+
+    This works for versioned file databases as well, since their `version` and `data` wrapper is
+    part of the file's contents.
+
+    The converted data is read back and compared with the original before anything is written, so
+    that a format that can't represent some of the data (such as non-string keys in JSON) fails
+    with a `ConversionError` instead of losing it. The target file is then written atomically.
+
+    This does blocking file I/O, so it should be run offline or inside of an executor.
+    """
+    source_path = fix_path(source)
+    target_path = fix_path(target)
+    source_codec = _get_codec(source_path, target_path, source_path)
+    target_codec = _get_codec(source_path, target_path, target_path)
+    data = file_io.read_file(source_path, source_codec.load)
+    if _round_trip(target_codec, data) != data:
+        raise ConversionError(
+            str(source_path),
+            str(target_path),
+            f"some of the data can't be represented as {target_codec.name}",
+        )
+    file_io.write_data(target_path, data, target_codec.dump, durability)
+
+
+def _get_codec(source: PathLike, target: PathLike, path: PathLike) -> Codec:
+    codec = get_codec_for_path(str(path))
+    if codec is None:
+        raise ConversionError(
+            str(source), str(target), f"unsupported file type: {path}"
+        )
+    return codec
+
+
+def _round_trip(codec: Codec, data: Any) -> Any:
+    with io.TextIOWrapper(io.BytesIO(), encoding="utf-8") as file:
+        codec.dump(data, file)
+        file.seek(0)
+        return codec.load(file)
+
+
+def main(args: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(
+        description="Convert a file database from one format into another, by file extension."
+    )
+    parser.add_argument("source", help="The file to convert, such as data.json")
+    parser.add_argument("target", help="The file to write, such as data.msgpack")
+    parsed = parser.parse_args(args)
+    try:
+        convert_file(parsed.source, parsed.target)
+    except ConversionError as ex:
+        parser.exit(1, f"{ex}\n")
+    print(f"Converted {parsed.source} to {parsed.target}")
+
+
+if __name__ == "__main__":
+    main()
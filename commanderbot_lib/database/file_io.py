@@ -0,0 +1,446 @@
+# NOTE These functions are run inside of an executor rather than on the event loop, so they must
+# not touch anything owned by the loop. They are defined at the module level (and only ever given
+# module-level or static callables) so that they can be sent to a process pool as well.
+
+import hashlib
+import io
+import json
+import mmap
+import os
+import pickle
+import stat
+from dataclasses import replace
+from enum import Enum
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+from typing import (
+    IO,
+    Any,
+    BinaryIO,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from commanderbot_lib.database.changes import (
+    Change,
+    apply_change,
+    apply_changes,
+    deserialize_change,
+)
+from commanderbot_lib.database.codecs import binary_file
+from commanderbot_lib.database.lazy_mapping import LazyIndex
+
+FileLoader = Callable[[IO], dict]
+FileDumper = Callable[[Any, IO], None]
+# Indexers are given a memory map of the file, which works like `bytes`.
+FileIndexer = Callable[[Any], LazyIndex]
+FileIdentity = Tuple[int, int, int, int]
+
+
+class FileState(NamedTuple):
+    """
+    What a file looked like when it was last read or written, used to tell whether it has changed
+    since.
+
+    Attributes
+    -----------
+    identity: :class:`FileIdentity`
+        The device, inode, size and modification time of the file.
+    content_hash: :class:`Optional[str]`
+        A hash of the file's contents, if known.
+    """
+
+    identity: FileIdentity
+    content_hash: Optional[str]
+
+
+class Durability(Enum):
+    """
+    How hard to try to make sure that a write has actually reached the disk before considering it
+    done. Writes are always atomic regardless: the file is either entirely old or entirely new.
+    """
+
+    # Leave flushing to the OS. A power loss may roll the file back to an older version.
+    NONE = "none"
+
+    # Flush the file itself to disk before it replaces the old one.
+    FILE = "file"
+
+    # Also flush the parent directory, so that the rename itself survives a power loss.
+    DIRECTORY = "directory"
+
+
+def snapshot_data(data: Any) -> bytes:
+    """
+    Take a snapshot of `data` so that it can be handed off to a worker.
+
+    This has to happen on the event loop: the data is usually the live cache of a store, and any
+    coroutine is free to mutate it while a worker is still busy serializing it. Pickling is the
+    cheapest way to take a consistent, deep snapshot of JSON-like data in CPython, and it is also
+    exactly what a process pool would have to do anyway.
+    """
+    return pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def read_file(path: Path, load: FileLoader) -> dict:
+    with open(path, encoding="utf-8") as file:
+        return load(file)
+
+
+def read_file_with_state(path: Path, load: FileLoader) -> Tuple[dict, FileState]:
+    """ Read the file at `path`, along with the state of the file that was read. """
+    with open(path, encoding="utf-8") as file:
+        identity = file_identity(file.fileno())
+        data = load(file)
+        # Hash the file that was actually read, which may have been replaced at `path` since.
+        file.seek(0)
+        content_hash = hash_stream(binary_file(file))
+    return data, FileState(identity, content_hash)
+
+
+def read_file_state(path: Path) -> Optional[FileState]:
+    """ Return the state of the file at `path` without parsing it, or `None` if there isn't one. """
+    try:
+        with open(path, "rb") as file:
+            return FileState(file_identity(file.fileno()), hash_stream(file))
+    except FileNotFoundError:
+        return None
+
+
+def write_file(
+    path: Path,
+    snapshot: bytes,
+    dump: FileDumper,
+    durability: Durability,
+    last_state: Optional[FileState] = None,
+) -> Optional[FileState]:
+    """
+    Write a snapshot taken with `snapshot_data`, and return the state of the new file.
+
+    If the file is still exactly as described by `last_state`, and the data serializes to the same
+    contents, then nothing is written and `None` is returned instead.
+    """
+    content = serialize_data(pickle.loads(snapshot), dump)
+    content_hash = hash_content(content)
+    if (
+        (last_state is not None)
+        and (last_state.content_hash == content_hash)
+        and (path_identity(path) == last_state.identity)
+    ):
+        return None
+    identity = write_data(path, content, _dump_bytes, durability)
+    return FileState(identity, content_hash)
+
+
+def serialize_data(data: Any, dump: FileDumper) -> bytes:
+    """ Dump the data to memory instead of to a file. """
+    buffer = io.BytesIO()
+    file = io.TextIOWrapper(buffer, encoding="utf-8")
+    dump(data, file)
+    file.flush()
+    # Detach the wrapper so that it doesn't close the buffer along with itself.
+    file.detach()
+    return buffer.getvalue()
+
+
+def write_bytes(path: Path, content: bytes, durability: Durability) -> FileIdentity:
+    """ Like `write_data`, but for content that has already been serialized. """
+    return write_data(path, content, _dump_bytes, durability)
+
+
+def write_serialized(
+    path: Path, data: Any, dump: FileDumper, durability: Durability
+) -> FileState:
+    """ Like `write_data`, but return the state of the new file including its content hash. """
+    content = serialize_data(data, dump)
+    identity = write_data(path, content, _dump_bytes, durability)
+    return FileState(identity, hash_content(content))
+
+
+def hash_content(content: Union[bytes, mmap.mmap]) -> str:
+    return hashlib.blake2b(content, digest_size=8).hexdigest()
+
+
+def hash_stream(file: BinaryIO) -> str:
+    """ Hash the rest of the file in chunks, the same way as `hash_content()`. """
+    hasher = hashlib.blake2b(digest_size=8)
+    while chunk := file.read(1024 * 1024):
+        hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def _dump_bytes(content: bytes, file: IO):
+    binary_file(file).write(content)
+
+
+def write_data(
+    path: Path, data: Any, dump: FileDumper, durability: Durability
+) -> FileIdentity:
+    """
+    Dump the data to a temporary file next to `path` and then rename it over `path`, so that a
+    crash or an exception part-way through never leaves behind a truncated file.
+
+    Return the identity of the new file.
+    """
+    with NamedTemporaryFile(
+        "w",
+        encoding="utf-8",
+        dir=path.parent,
+        prefix=f".{path.name}.",
+        suffix=".tmp",
+        delete=False,
+    ) as file:
+        temp_path = Path(file.name)
+        try:
+            dump(data, file)
+            file.flush()
+            if durability is not Durability.NONE:
+                os.fsync(file.fileno())
+            identity = file_identity(file.fileno())
+        except:
+            file.close()
+            temp_path.unlink()
+            raise
+    try:
+        # Temporary files are only accessible by their owner; keep the permissions of the original.
+        if path.exists():
+            os.chmod(temp_path, stat.S_IMODE(path.stat().st_mode))
+        os.replace(temp_path, path)
+    except:
+        temp_path.unlink()
+        raise
+    if durability is Durability.DIRECTORY:
+        fsync_directory(path.parent)
+    return identity
+
+
+def read_text(path: Path) -> str:
+    with open(path, encoding="utf-8") as file:
+        return file.read()
+
+
+def write_text(path: Path, text: str, durability: Durability):
+    """ Atomically write a string to `path`, creating any missing parent directories. """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    write_data(path, text, _dump_text, durability)
+
+
+def _dump_text(text: str, file: IO):
+    file.write(text)
+
+
+def map_file(path: Path) -> Tuple[mmap.mmap, FileIdentity]:
+    """
+    Memory-map the file at `path` for reading, along with something that identifies this version
+    of the file. Empty files can't be mapped, and raise a `ValueError`.
+    """
+    with open(path, "rb") as file:
+        return (
+            mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ),
+            file_identity(file.fileno()),
+        )
+
+
+def index_file(path: Path, index: FileIndexer) -> Tuple[LazyIndex, FileState]:
+    """
+    Index the file at `path` for lazy loading, without decoding it. The state of the file is
+    returned as well, so that the caller can make sure that it maps the same file.
+    """
+    buffer, identity = map_file(path)
+    with buffer:
+        return index(buffer), FileState(identity, hash_content(buffer))
+
+
+def file_identity(fd: int) -> FileIdentity:
+    return _identity(os.fstat(fd))
+
+
+def path_identity(path: Path) -> Optional[FileIdentity]:
+    """ Return the identity of the file at `path`, or `None` if there isn't one. """
+    try:
+        return _identity(os.stat(path))
+    except FileNotFoundError:
+        return None
+
+
+def _identity(stat_result: os.stat_result) -> FileIdentity:
+    # Our own writes always replace the file, which gives it a new inode; the size and modification
+    # time are there to catch anything else that edits the file in place.
+    return (
+        stat_result.st_dev,
+        stat_result.st_ino,
+        stat_result.st_size,
+        stat_result.st_mtime_ns,
+    )
+
+
+def fsync_directory(path: Path):
+    # Directories can't be opened (let alone synced) like this on Windows.
+    if not hasattr(os, "O_DIRECTORY"):
+        return
+    fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def iter_journal(path: Path) -> Iterator[dict]:
+    with open(path, encoding="utf-8") as file:
+        lines = file.readlines()
+    for i, line in enumerate(lines):
+        try:
+            yield json.loads(line)
+        except ValueError:
+            # The very last record may have been cut short by a crash; it was never acknowledged
+            # as written, so it's safe to ignore. Anything else means the journal is corrupt.
+            if i == len(lines) - 1:
+                return
+            raise
+
+
+def string_key(key: Any) -> str:
+    """ Return `key` the way that it's read back from a JSON object, where every key is a string. """
+    if isinstance(key, str):
+        return key
+    return next(iter(json.loads(json.dumps({key: None}))))
+
+
+def read_journaled_file(
+    path: Path, journal_paths: List[Path], load: FileLoader, string_keys: bool = False
+) -> Tuple[dict, Optional[FileState]]:
+    """
+    Read the base file (if any) and replay the given journals over it, in order. The state of the
+    base file is returned as well.
+
+    If the base file only has string keys (as with JSON), the keys of every journaled key path are
+    turned into strings too, so that they match.
+    """
+    if path.exists() or not journal_paths:
+        data, state = read_file_with_state(path, load)
+    else:
+        data, state = {}, None
+    for journal_path in journal_paths:
+        for record in iter_journal(journal_path):
+            change = deserialize_change(record)
+            if string_keys:
+                change = replace(change, path=tuple(map(string_key, change.path)))
+            apply_change(data, change)
+    return data, state
+
+
+def append_journal(path: Path, raw: str, durability: Durability):
+    """
+    Append records to a journal. If that fails, the journal is cut back to where it was, so that
+    records appended afterwards don't follow a torn one.
+    """
+    created = not path.exists()
+    # Write straight to the file descriptor, so that nothing is left in a buffer to be written
+    # after truncating the file.
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o666)
+    try:
+        offset = os.lseek(fd, 0, os.SEEK_END)
+        try:
+            remaining = memoryview(raw.encode("utf-8"))
+            while remaining:
+                remaining = remaining[os.write(fd, remaining) :]
+            if durability is not Durability.NONE:
+                os.fsync(fd)
+        except:
+            try:
+                os.ftruncate(fd, offset)
+            except OSError:
+                pass
+            raise
+    finally:
+        os.close(fd)
+    if created and (durability is Durability.DIRECTORY):
+        fsync_directory(path.parent)
+
+
+def compact_journal(
+    path: Path,
+    journal_paths: List[Path],
+    load: FileLoader,
+    dump: FileDumper,
+    durability: Durability,
+    string_keys: bool = False,
+) -> FileState:
+    """
+    Fold the given journals into the base file, and then delete them. Return the state of the new
+    base file.
+    """
+    data, _ = read_journaled_file(path, journal_paths, load, string_keys)
+    state = write_serialized(path, data, dump, durability)
+    delete_files(journal_paths)
+    return state
+
+
+def delete_files(paths: List[Path]):
+    for path in paths:
+        if path.exists():
+            path.unlink()
+
+
+def read_shard(path: Path, load: FileLoader) -> dict:
+    """ Read a single shard, which may not exist yet. """
+    if not path.exists():
+        return {}
+    return read_file(path, load) or {}
+
+
+def read_shards(paths: List[Path], load: FileLoader) -> dict:
+    data = {}
+    for path in paths:
+        data.update(read_shard(path, load))
+    return data
+
+
+def write_shard(
+    path: Path,
+    snapshot: bytes,
+    merge: bool,
+    load: FileLoader,
+    dump: FileDumper,
+    durability: Durability,
+):
+    """
+    Write a shard, deleting it if it ends up empty. If `merge` is true, the snapshot is merged into
+    the shard's existing data instead of replacing it.
+    """
+    data = pickle.loads(snapshot)
+    if merge:
+        data = {**read_shard(path, load), **data}
+    _write_or_delete_shard(path, data, dump, durability)
+
+
+def apply_shard_changes(
+    paths: Dict[Path, bytes],
+    load: FileLoader,
+    dump: FileDumper,
+    durability: Durability,
+):
+    """ Apply a pickled list of changes to each of the given shards. """
+    for path, snapshot in paths.items():
+        changes: List[Change] = pickle.loads(snapshot)
+        data = read_shard(path, load)
+        apply_changes(data, changes)
+        _write_or_delete_shard(path, data, dump, durability)
+
+
+def _write_or_delete_shard(
+    path: Path, data: dict, dump: FileDumper, durability: Durability
+):
+    if data:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        write_data(path, data, dump, durability)
+    elif path.exists():
+        path.unlink()
+        if durability is Durability.DIRECTORY:
+            fsync_directory(path.parent)
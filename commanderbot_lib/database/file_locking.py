@@ -0,0 +1,147 @@
+# NOTE Like those in `file_io`, these functions do blocking file I/O (and wait on locks) and are
+# meant to be run inside of an executor.
+#
+# Several processes can share a file database by taking an advisory lock on a sidecar file next to
+# it, such as `data.json.lock`, whenever they read or replace the file. The sidecar also holds the
+# generation of the file: a counter that every locked write increments, so that a process can tell
+# whether anyone else has written to the file since it last read it. The database file itself is
+# left untouched, so that it can still be read by anything else.
+
+import os
+import pickle
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+from commanderbot_lib.database import file_io
+from commanderbot_lib.database.changes import Change, apply_changes
+from commanderbot_lib.database.file_io import (
+    Durability,
+    FileDumper,
+    FileIdentity,
+    FileLoader,
+    FileState,
+)
+
+# Advisory locks are only available on Unix-like systems.
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+LOCK_SUFFIX = ".lock"
+
+# The generation is written in place as a fixed-width number, so that it never needs truncating.
+_GENERATION_FORMAT = "{:<20}\n"
+_GENERATION_SIZE = 21
+
+
+def locking_supported() -> bool:
+    return fcntl is not None
+
+
+def lock_path_for(path: Path) -> Path:
+    return path.with_name(path.name + LOCK_SUFFIX)
+
+
+@contextmanager
+def lock_file(lock_path: Path, exclusive: bool) -> Iterator[int]:
+    """
+    Hold a shared or exclusive lock on the given lock file, creating it if necessary, and yield its
+    file descriptor. Waits for as long as it takes to acquire the lock.
+    """
+    if fcntl is None:
+        raise NotImplementedError("File locking is not supported on this platform")
+    fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        # Locks taken with `flock` belong to the open file, so separate threads of the same process
+        # exclude each other just like separate processes do.
+        fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        yield fd
+    finally:
+        # Closing the file releases the lock.
+        os.close(fd)
+
+
+def read_generation(fd: int) -> int:
+    """ Return the generation held by a locked lock file, which is 0 for a new one. """
+    raw = os.pread(fd, _GENERATION_SIZE, 0)
+    try:
+        return int(raw)
+    except ValueError:
+        return 0
+
+
+def write_generation(fd: int, generation: int):
+    os.pwrite(fd, _GENERATION_FORMAT.format(generation).encode("ascii"), 0)
+
+
+def read_locked_file(
+    path: Path, lock_path: Path, load: FileLoader
+) -> Tuple[dict, FileState, int]:
+    """ Read the file under a shared lock, along with its state and generation. """
+    with lock_file(lock_path, exclusive=False) as fd:
+        data, state = file_io.read_file_with_state(path, load)
+        return data, state, read_generation(fd)
+
+
+def locked_identity(path: Path, lock_path: Path) -> Tuple[Optional[FileIdentity], int]:
+    """ Return the identity and generation of the file, under a shared lock. """
+    with lock_file(lock_path, exclusive=False) as fd:
+        return file_io.path_identity(path), read_generation(fd)
+
+
+def write_locked_file(
+    path: Path,
+    lock_path: Path,
+    snapshot: bytes,
+    dump: FileDumper,
+    durability: Durability,
+    last_state: Optional[FileState],
+    last_generation: Optional[int],
+) -> Tuple[Optional[FileState], int, bool]:
+    """
+    Write a snapshot taken with `snapshot_data` under an exclusive lock, as with `write_file`, and
+    increment the generation.
+
+    Return the state of the new file (or `None` if nothing was written), the new generation, and
+    whether anyone else had written to the file since `last_generation`.
+    """
+    with lock_file(lock_path, exclusive=True) as fd:
+        generation = read_generation(fd)
+        stale = generation != last_generation
+        # If someone else wrote the file in the meantime, then the contents can't be compared.
+        state = file_io.write_file(
+            path, snapshot, dump, durability, None if stale else last_state
+        )
+        if state is not None:
+            generation += 1
+            write_generation(fd, generation)
+        return state, generation, stale
+
+
+def apply_locked_changes(
+    path: Path,
+    lock_path: Path,
+    snapshot: bytes,
+    load: FileLoader,
+    dump: FileDumper,
+    durability: Durability,
+    last_generation: Optional[int],
+) -> Tuple[FileState, int, bool]:
+    """
+    Apply a pickled list of changes to the current contents of the file under an exclusive lock,
+    so that changes written by other processes in the meantime are kept, and increment the
+    generation.
+
+    Return the state of the new file, the new generation, and whether anyone else had written to
+    the file since `last_generation`.
+    """
+    changes: List[Change] = pickle.loads(snapshot)
+    with lock_file(lock_path, exclusive=True) as fd:
+        generation = read_generation(fd)
+        data = file_io.read_file(path, load) if path.exists() else {}
+        apply_changes(data, changes)
+        state = file_io.write_serialized(path, data, dump, durability)
+        write_generation(fd, generation + 1)
+        return state, generation + 1, generation != last_generation
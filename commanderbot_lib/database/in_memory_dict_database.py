@@ -1,6 +1,9 @@
+from typing import Hashable, Iterable, List
+
 from discord.ext.commands import Bot, Cog
 
 from commanderbot_lib.database.abc.dict_database import DictDatabase
+from commanderbot_lib.database.changes import Change, apply_changes
 
 
 class InMemoryDictDatabase(DictDatabase):
@@ -17,6 +20,24 @@ class InMemoryDictDatabase(DictDatabase):
     async def read(self) -> dict:
         return self._data
 
+    # @overrides DictDatabase
+    @property
+    def supports_key_reads(self) -> bool:
+        return True
+
+    # @overrides DictDatabase
+    async def read_keys(self, keys: Iterable[Hashable]) -> dict:
+        return {key: self._data[key] for key in keys if key in self._data}
+
     # @implements DictDatabase
     async def write(self, data: dict):
         self._data = data
+
+    # @overrides DictDatabase
+    @property
+    def supports_changes(self) -> bool:
+        return True
+
+    # @overrides DictDatabase
+    async def write_changes(self, changes: List[Change]):
+        apply_changes(self._data, changes)
@@ -8,9 +8,11 @@ from commanderbot_lib.database.mixins.json_file_database_mixin import (
 
 class JsonFileDatabase(FileDatabase, JsonFileDatabaseMixin):
     # @implements FileDatabase
-    async def load(self, file: IO) -> dict:
-        return await self.load_json(file)
+    @staticmethod
+    def load(file: IO) -> dict:
+        return JsonFileDatabaseMixin.load_json(file)
 
     # @implements FileDatabase
-    async def dump(self, data: dict, file: IO):
-        await self.dump_json(data, file)
+    @staticmethod
+    def dump(data: dict, file: IO):
+        JsonFileDatabaseMixin.dump_json(data, file)
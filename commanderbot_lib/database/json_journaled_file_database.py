@@ -0,0 +1,23 @@
+from typing import IO
+
+from commanderbot_lib.database.abc.journaled_file_database import JournaledFileDatabase
+from commanderbot_lib.database.mixins.json_file_database_mixin import (
+    JsonFileDatabaseMixin,
+)
+
+
+class JsonJournaledFileDatabase(JournaledFileDatabase, JsonFileDatabaseMixin):
+    # @implements FileDatabase
+    @staticmethod
+    def load(file: IO) -> dict:
+        return JsonFileDatabaseMixin.load_json(file)
+
+    # @implements FileDatabase
+    @staticmethod
+    def dump(data: dict, file: IO):
+        JsonFileDatabaseMixin.dump_json(data, file)
+
+    # @overrides JournaledFileDatabase
+    @property
+    def string_keys(self) -> bool:
+        return True
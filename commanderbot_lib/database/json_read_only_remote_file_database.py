@@ -1,11 +1,11 @@
-import json
-
 from commanderbot_lib.database.abc.read_only_remote_file_database import (
     ReadOnlyRemoteFileDatabase,
 )
+from commanderbot_lib.database.codecs import get_codec
 
 
 class JsonReadOnlyRemoteFileDatabase(ReadOnlyRemoteFileDatabase):
     # @implements ReadOnlyRemoteFileDatabase
-    async def parse(self, raw: str) -> dict:
-        return json.loads(raw)
+    @staticmethod
+    def parse(raw: str) -> dict:
+        return get_codec("json").loads(raw)
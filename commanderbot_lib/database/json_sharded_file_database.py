@@ -0,0 +1,18 @@
+from typing import IO
+
+from commanderbot_lib.database.abc.sharded_file_database import ShardedFileDatabase
+from commanderbot_lib.database.mixins.json_file_database_mixin import (
+    JsonFileDatabaseMixin,
+)
+
+
+class JsonShardedFileDatabase(ShardedFileDatabase, JsonFileDatabaseMixin):
+    # @implements ShardedFileDatabase
+    @staticmethod
+    def load(file: IO) -> dict:
+        return JsonFileDatabaseMixin.load_json(file)
+
+    # @implements ShardedFileDatabase
+    @staticmethod
+    def dump(data: dict, file: IO):
+        JsonFileDatabaseMixin.dump_json(data, file)
@@ -0,0 +1,97 @@
+from typing import Any, Callable, Dict, Hashable, Iterator, MutableMapping, Tuple
+
+# The start and end offsets of each top-level value in a serialized object, by key.
+LazyIndex = Dict[Hashable, Tuple[int, int]]
+
+
+class _Undecoded:
+    __slots__ = ("start", "end")
+
+    def __init__(self, start: int, end: int):
+        self.start: int = start
+        self.end: int = end
+
+
+class LazyMapping(MutableMapping):
+    """
+    A mapping over the top-level entries of a serialized object, such as a memory-mapped JSON
+    file, that only decodes each value the first time it is accessed.
+
+    Decoded values are kept, so each value is decoded at most once, and the buffer is released as
+    soon as every value has been decoded. The mapping can be changed like a `dict`, without having
+    to decode the values being replaced or deleted.
+
+    The buffer has to stay the same for as long as the mapping is alive. This is the case for a
+    memory-mapped file that is only ever replaced atomically, as `FileDatabase` does: the mapping
+    keeps referring to the old file, which the OS keeps around until it is unmapped.
+
+    Pickling a `LazyMapping` decodes everything and produces a plain `dict`.
+
+    Attributes
+    -----------
+    buffer: :class:`Any`
+        The bytes-like object that the index refers to.
+    index: :class:`LazyIndex`
+        The offsets of each top-level value within the buffer, by key.
+    loads: :class:`Callable[[bytes], Any]`
+        Decode a single value from its bytes.
+    """
+
+    def __init__(self, buffer: Any, index: LazyIndex, loads: Callable[[bytes], Any]):
+        self._buffer: Any = buffer
+        self._loads: Callable[[bytes], Any] = loads
+        self._entries: Dict[Hashable, Any] = {
+            key: _Undecoded(start, end) for key, (start, end) in index.items()
+        }
+        self._undecoded_count: int = len(self._entries)
+        if not self._undecoded_count:
+            self._release_buffer()
+
+    @property
+    def undecoded_count(self) -> int:
+        """ The number of values that haven't been decoded yet. """
+        return self._undecoded_count
+
+    def __getitem__(self, key: Hashable) -> Any:
+        value = self._entries[key]
+        if isinstance(value, _Undecoded):
+            value = self._loads(self._buffer[value.start : value.end])
+            self._entries[key] = value
+            self._forget_undecoded()
+        return value
+
+    def __setitem__(self, key: Hashable, value: Any):
+        if isinstance(self._entries.get(key), _Undecoded):
+            self._forget_undecoded()
+        self._entries[key] = value
+
+    def __delitem__(self, key: Hashable):
+        if isinstance(self._entries.pop(key), _Undecoded):
+            self._forget_undecoded()
+
+    def __iter__(self) -> Iterator[Hashable]:
+        return iter(self._entries)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Any) -> bool:
+        # Avoid decoding the value, which the default implementation would do.
+        return key in self._entries
+
+    def __repr__(self) -> str:
+        return f"<{type(self).__name__} with {len(self)} key(s), {self._undecoded_count} undecoded>"
+
+    def __reduce__(self):
+        return (dict, (list(self.items()),))
+
+    def _forget_undecoded(self):
+        self._undecoded_count -= 1
+        if not self._undecoded_count:
+            self._release_buffer()
+
+    def _release_buffer(self):
+        close = getattr(self._buffer, "close", None)
+        if close is not None:
+            close()
+        self._buffer = None
@@ -0,0 +1,270 @@
+# Migrate versioned file databases offline, before deploying a bot, rather than during startup:
+#
+#   commanderbot-migrate --migrations my_cog.migrations:collect --version 3 data/
+#
+# Migrations are collected by a module-level `DataMigrationCollector`, given as `module:name`, so
+# that each worker process can import it for itself. A store's `_collect_migrations` can delegate
+# to the same function, so that both use the same migrations.
+#
+# Unversioned files are only migrated (and so wrapped in the given version) when named explicitly;
+# those found by searching a directory are skipped, since they may not be databases at all.
+
+import argparse
+import asyncio
+import importlib
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+
+from discord.ext.commands import Bot, Cog
+
+from commanderbot_lib.database.codec_versioned_file_database import (
+    CodecVersionedFileDatabase,
+)
+from commanderbot_lib.database.codecs import get_codec_for_path
+from commanderbot_lib.database.mixins.versioned_database_mixin import (
+    DataMigrationCollector,
+)
+
+
+@dataclass
+class MigrationResult:
+    """
+    The outcome of migrating a single file.
+
+    Attributes
+    -----------
+    path: :class:`str`
+        The path to the file.
+    file_version: :class:`Optional[int]`
+        The version of the data in the file before migrating, or `None` if it was unversioned.
+    version: :class:`int`
+        The version that the data was migrated to.
+    seconds: :class:`float`
+        How long it took to read, migrate and write the file.
+    error: :class:`Optional[str]`
+        What went wrong, if anything.
+    skipped: :class:`bool`
+        Whether the file was left alone for being unversioned.
+    """
+
+    path: str
+    file_version: Optional[int]
+    version: int
+    seconds: float
+    error: Optional[str] = None
+    skipped: bool = False
+
+    @property
+    def changed(self) -> bool:
+        return (
+            (self.error is None)
+            and (not self.skipped)
+            and (self.file_version != self.version)
+        )
+
+
+class MigrationCog(Cog):
+    """ Stands in for the cog of a database that is migrated offline, which is named after it. """
+
+    def __init__(self, name: str):
+        self.__cog_name__ = name
+
+
+def resolve_collector(reference: str) -> DataMigrationCollector:
+    """ Import a collector given as `module:name`. """
+    module_name, _, attr_name = reference.partition(":")
+    if not (module_name and attr_name):
+        raise ValueError(
+            f"Expected a collector in the form module:name, got: {reference}"
+        )
+    return getattr(importlib.import_module(module_name), attr_name)
+
+
+def discover_files(paths: Iterable[str]) -> List[Tuple[Path, bool]]:
+    """
+    Return the given files, plus any file databases found within the given directories, along with
+    whether each file was given explicitly. Backups, journals, metadata and temporary files are
+    skipped.
+
+    Files found within directories are only migrated if they're already versioned, since other
+    files with the same extensions (such as configuration files and the shards of sharded
+    databases) aren't necessarily versioned databases.
+    """
+    files = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            for file_path in sorted(path.rglob("*")):
+                if file_path.is_file() and _looks_like_database(file_path):
+                    files.append((file_path, False))
+        else:
+            files.append((path, True))
+    return files
+
+
+def _looks_like_database(path: Path) -> bool:
+    if path.name.startswith("."):
+        return False
+    if (".backup." in path.name) or (".journal." in path.name):
+        return False
+    if path.name.endswith(".meta.json"):
+        return False
+    return get_codec_for_path(path.name) is not None
+
+
+def migrate_file(
+    path: str,
+    collector: str,
+    version: int,
+    dry_run: bool = False,
+    unversioned: bool = True,
+) -> MigrationResult:
+    """
+    Migrate a single file, unless it's unversioned and `unversioned` is false. This is run inside
+    of a worker process.
+    """
+    started = time.perf_counter()
+    try:
+        file_version = asyncio.run(
+            _migrate_file(path, collector, version, dry_run, unversioned)
+        )
+    except Exception as ex:
+        cause = f" ({ex.__cause__!r})" if ex.__cause__ else ""
+        return MigrationResult(
+            path=path,
+            file_version=None,
+            version=version,
+            seconds=time.perf_counter() - started,
+            error=f"{ex!r}{cause}",
+        )
+    return MigrationResult(
+        path=path,
+        file_version=file_version,
+        version=version,
+        seconds=time.perf_counter() - started,
+        skipped=(file_version is None) and not unversioned,
+    )
+
+
+async def _migrate_file(
+    path: str, collector: str, version: int, dry_run: bool, unversioned: bool
+) -> Optional[int]:
+    codec = get_codec_for_path(path)
+    if codec is None:
+        raise ValueError(f"Unsupported file type: {path}")
+    # The bot is never connected, but migrations can still use it like any other.
+    database = CodecVersionedFileDatabase(
+        Bot(command_prefix=()),
+        MigrationCog(f"migrate:{Path(path).name}"),
+        codec=codec,
+        path=path,
+        version=version,
+        migrate=resolve_collector(collector),
+    )
+    file_version, _ = await database.migrate(dry_run=dry_run, unversioned=unversioned)
+    return file_version
+
+
+def migrate_files(
+    paths: List[Tuple[Path, bool]],
+    collector: str,
+    version: int,
+    dry_run: bool = False,
+    workers: Optional[int] = None,
+) -> Iterable[MigrationResult]:
+    """
+    Migrate the files from `discover_files()` in a pool of worker processes, yielding results as
+    they complete. Unversioned files are only migrated if they were given explicitly.
+    """
+    # Forked workers would inherit any executor threads that the caller started, without the
+    # threads themselves, and hang as soon as they use them.
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        futures = [
+            executor.submit(
+                migrate_file, str(path), collector, version, dry_run, explicit
+            )
+            for path, explicit in paths
+        ]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def main(args: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(
+        description="Migrate versioned file databases to the expected version, in parallel."
+    )
+    parser.add_argument(
+        "paths",
+        nargs="+",
+        help="Database files, or directories to search for database files",
+    )
+    parser.add_argument(
+        "--migrations",
+        required=True,
+        help="The DataMigrationCollector to use, such as my_cog.migrations:collect",
+    )
+    parser.add_argument(
+        "--version",
+        type=int,
+        required=True,
+        help="The version to migrate the data to",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Run the migrations without writing anything back",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="How many worker processes to use; defaults to the number of CPUs",
+    )
+    parsed = parser.parse_args(args)
+    # Fail early, rather than once in every worker.
+    try:
+        resolve_collector(parsed.migrations)
+    except (ImportError, AttributeError, ValueError) as ex:
+        parser.exit(2, f"Cannot load migrations: {ex}\n")
+    paths = discover_files(parsed.paths)
+    if not paths:
+        parser.exit(1, "No database files found\n")
+    started = time.perf_counter()
+    changed = failed = skipped = 0
+    for result in migrate_files(
+        paths, parsed.migrations, parsed.version, parsed.dry_run, parsed.workers
+    ):
+        if result.error:
+            failed += 1
+            status = f"FAILED: {result.error}"
+        elif result.skipped:
+            skipped += 1
+            status = "skipped, not versioned"
+        elif result.changed:
+            changed += 1
+            verb = "would migrate" if parsed.dry_run else "migrated"
+            from_version = (
+                "unversioned"
+                if result.file_version is None
+                else f"version {result.file_version}"
+            )
+            status = f"{verb} from {from_version}"
+        else:
+            status = "up-to-date"
+        print(f"{result.seconds * 1000:8.1f} ms  {result.path}: {status}")
+    print(
+        f"{len(paths)} file(s) in {time.perf_counter() - started:.2f} s:"
+        f" {changed} {'to migrate' if parsed.dry_run else 'migrated'},"
+        f" {len(paths) - changed - failed - skipped} up-to-date,"
+        f" {skipped} skipped, {failed} failed"
+    )
+    if failed:
+        parser.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,15 @@
-import json
 from typing import IO
 
+from commanderbot_lib.database.codecs import get_codec
+
 
 class JsonFileDatabaseMixin:
-    async def load_json(self, file: IO) -> dict:
-        return json.load(file)
+    # NOTE These are static so that they can be run inside of any executor. See `FileDatabase`.
+
+    @staticmethod
+    def load_json(file: IO) -> dict:
+        return get_codec("json").load(file)
 
-    async def dump_json(self, data: dict, file: IO):
-        # TODO Make the indent (and other options) configurable. #enhance
-        return json.dump(data, file, indent=2)
+    @staticmethod
+    def dump_json(data: dict, file: IO):
+        get_codec("json").dump(data, file)
@@ -0,0 +1,81 @@
+from logging import Logger
+from typing import Any, Awaitable, Callable, Hashable, Iterable, Optional
+
+DataMigration = Callable[["VersionedDatabaseMixin", dict], None]
+DataMigrationCollector = Callable[
+    ["VersionedDatabaseMixin", int, int], Iterable[DataMigration]
+]
+
+# Record migrations take the key and value of a single top-level record, and return the new value.
+RecordMigration = Callable[["VersionedDatabaseMixin", Hashable, Any], Awaitable[Any]]
+RecordMigrationCollector = Callable[
+    ["VersionedDatabaseMixin", int, int], Iterable[RecordMigration]
+]
+
+
+class BackwardsMigrationError(Exception):
+    def __init__(self, expected_version: int, actual_version: int):
+        super().__init__(
+            f"Cannot migrate data backwards from unrecognized future version {actual_version} down"
+            f" to expected version {expected_version}."
+        )
+        self.expected_version: int = expected_version
+        self.actual_version: int = actual_version
+
+
+class FailedMigrationError(Exception):
+    def __init__(self, expected_version: int, actual_version: int):
+        super().__init__(
+            f"Failed to migrate data from version {actual_version} to expected version {expected_version}."
+        )
+        self.expected_version: int = expected_version
+        self.actual_version: int = actual_version
+
+
+class VersionedDatabaseMixin:
+    """
+    Shared logic for databases that maintain a versioned set of data, which is upgraded from one
+    format to another through the use of pre-programmed migrations.
+    """
+
+    version: int
+    _migrate: DataMigrationCollector
+    _migrate_record: Optional[RecordMigrationCollector]
+    _log: Logger
+
+    async def _apply_migrations(self, data: dict, actual_version: int):
+        """ Migrate `data` in-place from `actual_version` to the expected version. """
+        # If the actual version is from the future, throw an error.
+        if actual_version > self.version:
+            raise BackwardsMigrationError(self.version, actual_version)
+        self._log.warning(
+            f"Migrating data from version {actual_version} to {self.version}..."
+        )
+        # Collect and apply migrations, in order.
+        try:
+            migrations = list(self._migrate(self, actual_version, self.version))
+            if migrations:
+                self._log.warning(f"Applying {len(migrations)} data migrations...")
+                for migration in migrations:
+                    self._log.warning(f"[->] {migration.__name__}")
+                    await migration(self, data)
+        except Exception as ex:
+            raise FailedMigrationError(self.version, actual_version) from ex
+
+    async def _apply_record_migrations(
+        self, key: Hashable, record: Any, record_version: int
+    ) -> Any:
+        """ Migrate a single record from `record_version` to the expected version. """
+        if record_version > self.version:
+            raise BackwardsMigrationError(self.version, record_version)
+        if self._migrate_record is None:
+            raise ValueError("Cannot migrate a record without any record migrations")
+        try:
+            for migration in self._migrate_record(self, record_version, self.version):
+                record = await migration(self, key, record)
+        except Exception as ex:
+            raise FailedMigrationError(self.version, record_version) from ex
+        self._log.debug(
+            f"Migrated record {key} from version {record_version} to {self.version}"
+        )
+        return record
@@ -1,11 +1,18 @@
 from typing import IO
 
+# Imported for its side effect: it fails early if PyYAML isn't installed.
 import yaml
 
+from commanderbot_lib.database.codecs import get_codec
+
 
 class YamlFileDatabaseMixin:
-    async def load_yaml(self, file: IO) -> dict:
-        return yaml.safe_load(file)
+    # NOTE These are static so that they can be run inside of any executor. See `FileDatabase`.
+
+    @staticmethod
+    def load_yaml(file: IO) -> dict:
+        return get_codec("yaml").load(file)
 
-    async def dump_yaml(self, data: dict, file: IO):
-        return yaml.safe_dump(data, file)
+    @staticmethod
+    def dump_yaml(data: dict, file: IO):
+        get_codec("yaml").dump(data, file)
@@ -0,0 +1,132 @@
+import asyncio
+from typing import Any, Iterable, List, Optional, Sequence, Union
+
+# A single argument of a command. Anything else should be serialized before being sent.
+RedisArg = Union[str, bytes, int, float]
+RedisCommand = Sequence[RedisArg]
+
+
+class RedisError(Exception):
+    """ An error reply sent by the server, such as a command with the wrong number of arguments. """
+
+
+class RedisConnection:
+    """
+    A single connection to a server that speaks the Redis protocol (RESP), such as Redis itself or
+    one of its compatible alternatives.
+
+    Commands can be sent one at a time with `execute()`, or in batches with `pipeline()`, which
+    sends every command before waiting for any of the replies so that a whole batch only costs a
+    single round trip.
+
+    Bulk string replies are returned as `bytes`, simple string replies as `str`, and error replies
+    are raised as `RedisError` (or returned as such, when nested inside of an array reply).
+
+    Connections are not safe to share between tasks; use a `RedisPool` instead.
+
+    Attributes
+    -----------
+    timeout: :class:`float`
+        How long to wait for the replies to each command or pipeline, in seconds.
+    """
+
+    def __init__(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+        timeout: float,
+    ):
+        self.timeout: float = timeout
+        self._reader: asyncio.StreamReader = reader
+        self._writer: asyncio.StreamWriter = writer
+
+    @classmethod
+    async def open(
+        cls,
+        host: str,
+        port: int,
+        db: int = 0,
+        password: Optional[str] = None,
+        timeout: float = 10.0,
+    ) -> "RedisConnection":
+        """ Connect to the server, and then authenticate and select the database if necessary. """
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(host, port), timeout
+        )
+        connection = cls(reader, writer, timeout)
+        try:
+            commands = []
+            if password is not None:
+                commands.append(("AUTH", password))
+            if db:
+                commands.append(("SELECT", db))
+            if commands:
+                await connection.pipeline(commands)
+        except:
+            connection.close()
+            raise
+        return connection
+
+    @property
+    def closed(self) -> bool:
+        return self._writer.is_closing() or self._reader.at_eof()
+
+    async def execute(self, *command: RedisArg) -> Any:
+        """ Send a single command and return its reply. """
+        replies = await self.pipeline([command])
+        return replies[0]
+
+    async def pipeline(self, commands: Iterable[RedisCommand]) -> List[Any]:
+        """
+        Send every command at once, and then return their replies in order. If any of them failed,
+        the first error is raised once every reply has been read.
+        """
+        encoded = [encode_command(command) for command in commands]
+        self._writer.write(b"".join(encoded))
+        replies = await asyncio.wait_for(self._read_replies(len(encoded)), self.timeout)
+        for reply in replies:
+            if isinstance(reply, RedisError):
+                raise reply
+        return replies
+
+    def close(self):
+        self._writer.close()
+
+    async def _read_replies(self, count: int) -> List[Any]:
+        await self._writer.drain()
+        return [await self._read_reply() for _ in range(count)]
+
+    async def _read_reply(self) -> Any:
+        line = await self._reader.readline()
+        if not line.endswith(b"\r\n"):
+            raise ConnectionError("Connection closed by the server")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"$":
+            length = int(rest)
+            if length < 0:
+                return None
+            return (await self._reader.readexactly(length + 2))[:-2]
+        if kind == b"*":
+            length = int(rest)
+            if length < 0:
+                return None
+            return [await self._read_reply() for _ in range(length)]
+        if kind == b":":
+            return int(rest)
+        if kind == b"+":
+            return rest.decode("utf-8")
+        if kind == b"-":
+            return RedisError(rest.decode("utf-8"))
+        raise ConnectionError(f"Unexpected reply from the server: {line!r}")
+
+
+def encode_command(command: RedisCommand) -> bytes:
+    """ Encode a command as an array of bulk strings. """
+    parts = [b"*%d\r\n" % len(command)]
+    for arg in command:
+        if isinstance(arg, str):
+            arg = arg.encode("utf-8")
+        elif isinstance(arg, (int, float)):
+            arg = repr(arg).encode("ascii")
+        parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+    return b"".join(parts)
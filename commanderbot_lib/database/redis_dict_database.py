@@ -0,0 +1,202 @@
+import asyncio
+import json
+import pickle
+import random
+from typing import Any, Dict, Iterable, List, Tuple
+
+from discord.ext.commands import Bot, Cog
+
+from commanderbot_lib.database.abc.dict_database import DictDatabase
+from commanderbot_lib.database.changes import Change, apply_changes
+from commanderbot_lib.database.redis_connection import RedisCommand, RedisError
+from commanderbot_lib.database.redis_pool import RedisPool
+
+REDIS_LOCATION_PREFIX = "redis://"
+
+# How many fields to send in each `HSET` command of a full write.
+WRITE_BATCH_SIZE = 500
+
+# How many times to retry a write whose records were changed by someone else in the meantime.
+MAX_WRITE_ATTEMPTS = 10
+
+# How long to wait before the first retry, in seconds. This doubles after each attempt, and is
+# randomized so that competing writers don't keep retrying in lockstep.
+RETRY_DELAY = 0.005
+
+
+class RedisDictDatabase(DictDatabase):
+    """
+    A `DictDatabase` backed by a single hash on a server that speaks the Redis protocol, with one
+    field per top-level key (usually a guild ID) so that changes only have to update the affected
+    fields.
+
+    Keys and values are stored as JSON, as with `SqliteDictDatabase`. Connections are borrowed from
+    a `RedisPool`, which is usually shared by every cog using the same server.
+
+    Full writes replace the entire hash in a single transaction. Changes to top-level keys are sent
+    as a single transaction as well. Changes nested within a top-level key first have to read the
+    current value of that key; the transaction is retried if another client changes the hash in
+    the meantime, so that concurrent writers never overwrite each other's changes.
+
+    Attributes
+    -----------
+    bot: :class:`Bot`
+        The parent discord.py bot instance.
+    cog: :class:`Cog`
+        The parent discord.py cog instance.
+    pool: :class:`RedisPool`
+        The pool to borrow connections from.
+    key: :class:`str`
+        The key of the hash to store the data in.
+    persistent: :class:`bool`
+        Whether changes should be written back to the server.
+    """
+
+    def __init__(
+        self,
+        bot: Bot,
+        cog: Cog,
+        pool: RedisPool,
+        key: str,
+        persistent: bool = True,
+    ):
+        super().__init__(bot, cog)
+        self.pool: RedisPool = pool
+        self.key: str = key
+        self._persistent: bool = persistent
+
+    # @implements DictDatabase
+    @property
+    def persistent(self) -> bool:
+        return self._persistent
+
+    # @overrides DictDatabase
+    @property
+    def supports_changes(self) -> bool:
+        return True
+
+    # @implements DictDatabase
+    async def read(self) -> dict:
+        self._log.info(f"Loading database from Redis hash: {self.key}")
+        fields = await self.pool.execute("HGETALL", self.key)
+        return {
+            json.loads(fields[i]): json.loads(fields[i + 1])
+            for i in range(0, len(fields), 2)
+        }
+
+    # @overrides DictDatabase
+    async def read_key(self, key: Any) -> dict:
+        # Everything was already returned by `read()`.
+        return {}
+
+    # @overrides DictDatabase
+    @property
+    def supports_key_reads(self) -> bool:
+        return True
+
+    # @overrides DictDatabase
+    async def read_keys(self, keys: Iterable[Any]) -> dict:
+        keys = list(keys)
+        if not keys:
+            return {}
+        values = await self.pool.execute(
+            "HMGET", self.key, *(json.dumps(key) for key in keys)
+        )
+        return {
+            key: json.loads(value)
+            for key, value in zip(keys, values)
+            if value is not None
+        }
+
+    # @implements DictDatabase
+    async def write(self, data: dict):
+        self._log.info(f"Saving database to Redis hash: {self.key}")
+        # Serialize here, on the event loop, so that the data can't change underneath us.
+        fields = [self._dumps(key, value) for key, value in data.items()]
+        commands: List[RedisCommand] = [("MULTI",), ("DEL", self.key)]
+        for i in range(0, len(fields), WRITE_BATCH_SIZE):
+            batch = fields[i : i + WRITE_BATCH_SIZE]
+            commands.append(
+                ("HSET", self.key, *(part for field in batch for part in field))
+            )
+        commands.append(("EXEC",))
+        await self.pool.pipeline(commands)
+
+    # @overrides DictDatabase
+    async def write_changes(self, changes: List[Change]):
+        """ Update only the fields of the changed keys, in a single transaction. """
+        # Take the snapshot here, on the event loop, so that the values can't change underneath us.
+        snapshot: List[Change] = pickle.loads(
+            pickle.dumps(changes, protocol=pickle.HIGHEST_PROTOCOL)
+        )
+        if not snapshot:
+            return
+        # Only nested changes need to know the current values of their keys.
+        nested_keys = list(
+            {change.path[0] for change in snapshot if len(change.path) > 1}
+        )
+        if not nested_keys:
+            await self.pool.pipeline(self._update_commands({}, snapshot))
+            return
+        async with self.pool.connection() as connection:
+            for attempt in range(MAX_WRITE_ATTEMPTS):
+                # Watch the hash, so that the transaction fails if anyone else changes it first.
+                try:
+                    _, values = await connection.pipeline(
+                        [
+                            ("WATCH", self.key),
+                            (
+                                "HMGET",
+                                self.key,
+                                *(json.dumps(key) for key in nested_keys),
+                            ),
+                        ]
+                    )
+                except RedisError:
+                    # Don't leave the connection watching the hash for whoever uses it next.
+                    await connection.execute("UNWATCH")
+                    raise
+                records = {
+                    key: json.loads(value)
+                    for key, value in zip(nested_keys, values)
+                    if value is not None
+                }
+                replies = await connection.pipeline(
+                    self._update_commands(records, snapshot)
+                )
+                # A failed transaction has a null reply, in which case we try again.
+                if replies[-1] is not None:
+                    return
+                self._log.info(
+                    f"Redis hash changed while writing, retrying: {self.key}"
+                )
+                await asyncio.sleep(random.uniform(0, RETRY_DELAY * 2 ** attempt))
+        raise RuntimeError(
+            f"Redis hash kept changing while writing, gave up after {MAX_WRITE_ATTEMPTS} attempts: {self.key}"
+        )
+
+    def _dumps(self, key: Any, value: Any) -> Tuple[str, str]:
+        return json.dumps(key), json.dumps(value, separators=(",", ":"))
+
+    def _update_commands(
+        self, records: Dict[Any, Any], changes: Iterable[Change]
+    ) -> List[RedisCommand]:
+        """
+        Apply the changes to the given records (the current values of any keys with nested
+        changes), and return a transaction that writes back every changed key.
+        """
+        changed_keys = {change.path[0] for change in changes}
+        apply_changes(records, changes)
+        fields = [
+            self._dumps(key, records[key]) for key in changed_keys if key in records
+        ]
+        deleted = [json.dumps(key) for key in changed_keys if key not in records]
+        commands: List[RedisCommand] = [("MULTI",)]
+        if fields:
+            commands.append(
+                ("HSET", self.key, *(part for field in fields for part in field))
+            )
+        if deleted:
+            commands.append(("HDEL", self.key, *deleted))
+        commands.append(("EXEC",))
+        return commands
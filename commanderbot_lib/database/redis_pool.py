@@ -0,0 +1,166 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional
+from urllib.parse import unquote, urlsplit
+
+from commanderbot_lib.database.redis_connection import (
+    RedisArg,
+    RedisCommand,
+    RedisConnection,
+    RedisError,
+)
+from commanderbot_lib.logging import get_logger
+
+log = get_logger(__name__)
+
+DEFAULT_PORT = 6379
+
+# The maximum number of simultaneous connections in each shared pool.
+DEFAULT_MAX_CONNECTIONS = 10
+
+# The default timeout for connecting, and for the replies to each command or pipeline.
+DEFAULT_TIMEOUT = 10.0
+
+_pools: Dict[str, "RedisPool"] = {}
+
+
+class RedisPool:
+    """
+    A bounded pool of connections to a single server that speaks the Redis protocol.
+
+    Connections are opened as needed, up to `max_connections` at once; any more tasks wait for a
+    connection to be released. Idle connections are kept around to be re-used. A connection is
+    thrown away if anything other than an error reply goes wrong while using it, since it may be
+    out of sync with the server.
+
+    Attributes
+    -----------
+    host: :class:`str`
+        The host name of the server.
+    port: :class:`int`
+        The port of the server.
+    db: :class:`int`
+        The numbered database to select upon connecting.
+    password: :class:`Optional[str]`
+        The password to authenticate with upon connecting, if any.
+    max_connections: :class:`int`
+        The maximum number of connections to have open at once.
+    timeout: :class:`float`
+        How long to wait to connect, and for the replies to each command, in seconds.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int = DEFAULT_PORT,
+        db: int = 0,
+        password: Optional[str] = None,
+        max_connections: int = DEFAULT_MAX_CONNECTIONS,
+        timeout: float = DEFAULT_TIMEOUT,
+    ):
+        self.host: str = host
+        self.port: int = port
+        self.db: int = db
+        self.password: Optional[str] = password
+        self.max_connections: int = max_connections
+        self.timeout: float = timeout
+        self._semaphore: asyncio.Semaphore = asyncio.Semaphore(max_connections)
+        self._idle: List[RedisConnection] = []
+        self._closed: bool = False
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs) -> "RedisPool":
+        """ Create a pool from an address such as `redis://:password@localhost:6379/0`. """
+        parts = urlsplit(url)
+        db = parts.path.strip("/")
+        return cls(
+            host=parts.hostname or "localhost",
+            port=parts.port or DEFAULT_PORT,
+            db=int(db) if db else 0,
+            password=unquote(parts.password) if parts.password else None,
+            **kwargs,
+        )
+
+    @property
+    def idle_count(self) -> int:
+        """ The number of open connections that aren't currently in use. """
+        return len(self._idle)
+
+    @asynccontextmanager
+    async def connection(self) -> AsyncIterator[RedisConnection]:
+        """ Borrow a connection for the duration of the context, opening one if necessary. """
+        if self._closed:
+            raise RuntimeError("The connection pool has been closed")
+        async with self._semaphore:
+            connection = await self._take_connection()
+            try:
+                yield connection
+            except RedisError:
+                self._release(connection)
+                raise
+            except:
+                connection.close()
+                raise
+            else:
+                self._release(connection)
+
+    async def execute(self, *command: RedisArg) -> Any:
+        """ Send a single command on any available connection, and return its reply. """
+        async with self.connection() as connection:
+            return await connection.execute(*command)
+
+    async def pipeline(self, commands: Iterable[RedisCommand]) -> List[Any]:
+        """ Send a batch of commands on any available connection. See `RedisConnection`. """
+        async with self.connection() as connection:
+            return await connection.pipeline(commands)
+
+    async def close(self):
+        """ Close every idle connection, and any others as soon as they are released. """
+        self._closed = True
+        idle, self._idle = self._idle, []
+        for connection in idle:
+            connection.close()
+
+    async def _take_connection(self) -> RedisConnection:
+        while self._idle:
+            connection = self._idle.pop()
+            # The server may have closed the connection while it was idle.
+            if not connection.closed:
+                return connection
+            connection.close()
+        return await RedisConnection.open(
+            self.host,
+            self.port,
+            db=self.db,
+            password=self.password,
+            timeout=self.timeout,
+        )
+
+    def _release(self, connection: RedisConnection):
+        if self._closed:
+            connection.close()
+        else:
+            self._idle.append(connection)
+
+
+def get_redis_pool(url: str) -> RedisPool:
+    """
+    Return the shared connection pool for the server at the given address, creating it if
+    necessary. Sharing a pool lets every cog that uses the same server share its connections. It
+    must be created from within the event loop.
+    """
+    pool = _pools.get(url)
+    if pool is None:
+        pool = RedisPool.from_url(url)
+        _pools[url] = pool
+    return pool
+
+
+async def close_redis_pools():
+    """ Close every shared connection pool. """
+    if _pools:
+        log.info(f"Closing {len(_pools)} shared Redis connection pool(s)...")
+    pools = list(_pools.values())
+    _pools.clear()
+    for pool in pools:
+        await pool.close()
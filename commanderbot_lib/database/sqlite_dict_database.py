@@ -0,0 +1,281 @@
+import json
+import pickle
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from os import PathLike
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from weakref import WeakSet
+
+from discord.ext.commands import Bot, Cog
+
+from commanderbot_lib.database import backups
+from commanderbot_lib.database.abc.dict_database import DictDatabase
+from commanderbot_lib.database.backups import Backup, BackupPolicy
+from commanderbot_lib.database.changes import (
+    Change,
+    DeleteChange,
+    SetChange,
+    apply_change,
+)
+from commanderbot_lib.database.file_io import Durability
+from commanderbot_lib.executors import run_in_executor
+from commanderbot_lib.logging import get_logger
+from commanderbot_lib.utils import fix_path
+
+log = get_logger(__name__)
+
+SQLITE_LOCATION_PREFIX = "sqlite:"
+
+# How each level of durability maps onto SQLite's `synchronous` setting, in WAL mode. Both `FULL`
+# and `EXTRA` sync the write-ahead log upon every commit, so that a committed write survives a
+# power loss, just like a file that has been flushed before replacing the old one. (`NORMAL` only
+# syncs the log upon checkpoints, so the last few commits may be rolled back by a power loss.)
+SQLITE_SYNCHRONOUS = {
+    Durability.NONE: "OFF",
+    Durability.FILE: "FULL",
+    Durability.DIRECTORY: "EXTRA",
+}
+
+# Every SQLite database that is open, so that they can all be closed upon shutdown.
+_open_databases: "WeakSet[SqliteDictDatabase]" = WeakSet()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS data (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL);
+"""
+
+
+class SqliteDictDatabase(DictDatabase):
+    """
+    A `DictDatabase` backed by an SQLite database file, with one row per top-level key (usually a
+    guild ID) so that changes only have to update the affected rows.
+
+    Keys and values are stored as JSON. The database runs in WAL mode, and all queries are run on a
+    dedicated thread so that they never block the event loop. The connection and its thread are
+    closed by `close()`, which `CommanderBot.close()` calls for every open database.
+
+    Attributes
+    -----------
+    bot: :class:`Bot`
+        The parent discord.py bot instance.
+    cog: :class:`Cog`
+        The parent discord.py cog instance.
+    path: :class:`PathLike`
+        The path to the database file on the local filesystem.
+    persistent: :class:`bool`
+        Whether changes should be written back to the database.
+    durability: :class:`Durability`
+        How hard to try to make sure that writes have reached the disk.
+    backups: :class:`Optional[BackupPolicy]`
+        How to create and keep backups of the database. Defaults to `BackupPolicy()`.
+    """
+
+    def __init__(
+        self,
+        bot: Bot,
+        cog: Cog,
+        path: PathLike,
+        persistent: bool = True,
+        durability: Durability = Durability.FILE,
+        backups: Optional[BackupPolicy] = None,
+    ):
+        super().__init__(bot, cog)
+        self._path: Path = fix_path(path)
+        self._persistent: bool = persistent
+        self._durability: Durability = durability
+        self.backup_policy: BackupPolicy = backups or BackupPolicy()
+        # SQLite connections belong to the thread that created them, so use a dedicated one.
+        self._executor: ThreadPoolExecutor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="commanderbot-sqlite"
+        )
+        self._connection: Optional[sqlite3.Connection] = None
+
+    # @overrides CogDatabase
+    async def _async_init(self):
+        self._log.info(f"Opening SQLite database: {self._path}")
+        await self._run(self._connect)
+        _open_databases.add(self)
+
+    # @implements DictDatabase
+    @property
+    def persistent(self) -> bool:
+        return self._persistent
+
+    # @overrides DictDatabase
+    @property
+    def supports_changes(self) -> bool:
+        return True
+
+    # @implements DictDatabase
+    async def read(self) -> dict:
+        self._log.info(f"Loading database from SQLite: {self._path}")
+        return await self._run(self._select_all)
+
+    # @overrides DictDatabase
+    async def read_key(self, key: Any) -> dict:
+        return await self._run(self._select_keys, [key])
+
+    # @overrides DictDatabase
+    @property
+    def supports_key_reads(self) -> bool:
+        return True
+
+    # @overrides DictDatabase
+    async def read_keys(self, keys: Iterable[Any]) -> dict:
+        return await self._run(self._select_keys, list(keys))
+
+    # @implements DictDatabase
+    async def write(self, data: dict):
+        self._log.info(f"Saving database to SQLite: {self._path}")
+        # Take the snapshot here, on the event loop, so that the data can't change underneath us.
+        # Serializing it can then happen on the database's thread, like everything else.
+        snapshot = pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+        await self._run(self._replace_all, snapshot, self._meta())
+
+    # @overrides DictDatabase
+    async def write_changes(self, changes: List[Change]):
+        """ Update only the rows of the changed keys, in a single transaction. """
+        # Take the snapshot here, on the event loop, so that the values can't change underneath us.
+        snapshot = pickle.dumps(changes, protocol=pickle.HIGHEST_PROTOCOL)
+        await self._run(self._apply_changes, snapshot)
+
+    async def backup(self) -> Backup:
+        """ Back up the database next to it, according to the backup policy. See `FileDatabase`. """
+        self._log.warning(f'Backing up database file "{self._path}"')
+        backup = await self._run(self._backup)
+        self._log.warning(f'Database file backed up to "{backup.path}"')
+        return backup
+
+    async def close(self):
+        """ Close the connection, and then the thread that it belongs to. """
+        _open_databases.discard(self)
+        if self._connection is not None:
+            self._log.info(f"Closing SQLite database: {self._path}")
+            await self._run(self._disconnect)
+        self._executor.shutdown(wait=False)
+
+    async def _run(self, func, *args) -> Any:
+        return await run_in_executor(self._executor, func, *args)
+
+    def _meta(self) -> Dict[str, str]:
+        """ Override this to store metadata alongside every full write. """
+        return {}
+
+    # NOTE Everything below is run on the database's own thread.
+
+    def _connect(self):
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        # Transactions are managed explicitly, with `with connection:`.
+        connection = sqlite3.connect(self._path, isolation_level=None)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS[self._durability]}")
+        connection.executescript(SCHEMA)
+        self._connection = connection
+
+    def _disconnect(self):
+        self._connected().close()
+        self._connection = None
+
+    def _connected(self) -> sqlite3.Connection:
+        if self._connection is None:
+            raise RuntimeError(f"SQLite database is not open: {self._path}")
+        return self._connection
+
+    def _transaction(self) -> sqlite3.Connection:
+        connection = self._connected()
+        connection.execute("BEGIN")
+        return connection
+
+    def _dumps(self, key: Any, value: Any) -> Tuple[str, str]:
+        return json.dumps(key), json.dumps(value, separators=(",", ":"))
+
+    def _select_all(self) -> dict:
+        rows = self._connected().execute("SELECT key, value FROM data")
+        return {json.loads(key): json.loads(value) for key, value in rows}
+
+    def _select_keys(self, keys: Iterable[Any]) -> dict:
+        data = {}
+        for key in keys:
+            row = (
+                self._connected()
+                .execute("SELECT value FROM data WHERE key = ?", (json.dumps(key),))
+                .fetchone()
+            )
+            if row is not None:
+                data[key] = json.loads(row[0])
+        return data
+
+    def _replace_all(self, snapshot: bytes, meta: Dict[str, str]):
+        data: dict = pickle.loads(snapshot)
+        rows = [self._dumps(key, value) for key, value in data.items()]
+        with self._transaction() as connection:
+            connection.execute("DELETE FROM data")
+            connection.executemany("INSERT INTO data (key, value) VALUES (?, ?)", rows)
+            for name, value in meta.items():
+                self._set_meta(name, value)
+
+    def _apply_changes(self, snapshot: bytes):
+        changes: List[Change] = pickle.loads(snapshot)
+        with self._transaction() as connection:
+            for change in changes:
+                key, *path = change.path
+                raw_key = json.dumps(key)
+                # Top-level changes map directly onto rows.
+                if not path:
+                    if isinstance(change, SetChange):
+                        connection.execute(
+                            "INSERT OR REPLACE INTO data (key, value) VALUES (?, ?)",
+                            self._dumps(key, change.value),
+                        )
+                    elif isinstance(change, DeleteChange):
+                        connection.execute("DELETE FROM data WHERE key = ?", (raw_key,))
+                    continue
+                # Nested changes have to read-modify-write the row.
+                data = self._select_keys([key])
+                apply_change(data, change)
+                if key in data:
+                    connection.execute(
+                        "INSERT OR REPLACE INTO data (key, value) VALUES (?, ?)",
+                        self._dumps(key, data[key]),
+                    )
+
+    def _get_meta(self, name: str) -> Optional[str]:
+        row = (
+            self._connected()
+            .execute("SELECT value FROM meta WHERE name = ?", (name,))
+            .fetchone()
+        )
+        return row[0] if row else None
+
+    def _set_meta(self, name: str, value: str):
+        self._connected().execute(
+            "INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)", (name, value)
+        )
+
+    def _backup(self) -> Backup:
+        # The file may be in the middle of a transaction, so take a consistent copy of it first.
+        snapshot_path = self._path.with_name(f".{self._path.name}.backup.tmp")
+        target = sqlite3.connect(snapshot_path)
+        try:
+            self._connected().backup(target)
+        finally:
+            target.close()
+        try:
+            return backups.create_backup(
+                self._path, self.backup_policy, self._durability, source=snapshot_path
+            )
+        finally:
+            snapshot_path.unlink()
+
+
+async def close_sqlite_databases():
+    """ Close every SQLite database that is open. """
+    databases = list(_open_databases)
+    if databases:
+        log.info(f"Closing {len(databases)} SQLite database(s)...")
+    for database in databases:
+        try:
+            await database.close()
+        except:
+            log.exception(f"Failed to close SQLite database: {database._path}")
@@ -0,0 +1,93 @@
+from os import PathLike
+from typing import Dict, Optional, Tuple
+
+from discord.ext.commands import Bot, Cog
+
+from commanderbot_lib.database.backups import BackupPolicy
+from commanderbot_lib.database.file_io import Durability
+from commanderbot_lib.database.mixins.versioned_database_mixin import (
+    DataMigrationCollector,
+    VersionedDatabaseMixin,
+)
+from commanderbot_lib.database.sqlite_dict_database import SqliteDictDatabase
+
+
+class VersionedSqliteDictDatabase(SqliteDictDatabase, VersionedDatabaseMixin):
+    """
+    A `SqliteDictDatabase` that maintains a versioned set of data, just like a
+    `VersionedFileDatabase`. The version is kept in the database's metadata table.
+
+    Attributes
+    -----------
+    bot: :class:`Bot`
+        The parent discord.py bot instance.
+    cog: :class:`Cog`
+        The parent discord.py cog instance.
+    path: :class:`PathLike`
+        The path to the database file on the local filesystem.
+    version: :class:`int`
+        The expected version of the data
+    migrate: :class:`DataMigrationCollector`
+        A callable iterator that yields migrations. See `VersionedFileDatabase`.
+    persistent: :class:`bool`
+        Whether changes should be written back to the database.
+    durability: :class:`Durability`
+        How hard to try to make sure that writes have reached the disk.
+    backups: :class:`Optional[BackupPolicy]`
+        How to create and keep backups of the database. Defaults to `BackupPolicy()`.
+    """
+
+    def __init__(
+        self,
+        bot: Bot,
+        cog: Cog,
+        path: PathLike,
+        version: int,
+        migrate: DataMigrationCollector,
+        persistent: bool = True,
+        durability: Durability = Durability.FILE,
+        backups: Optional[BackupPolicy] = None,
+    ):
+        super().__init__(
+            bot,
+            cog,
+            path=path,
+            persistent=persistent,
+            durability=durability,
+            backups=backups,
+        )
+        assert isinstance(version, int)
+        self.version: int = version
+        self._migrate: DataMigrationCollector = migrate
+
+    # @overrides SqliteDictDatabase
+    async def read(self) -> dict:
+        actual_version, data = await self._run(self._select_versioned)
+        # If no version is defined, assume the data is of the expected version. This is either a
+        # brand new database, or one that was created by an unversioned store.
+        if actual_version is None:
+            self._log.warning(
+                f"Data is unversioned! Assuming expected version: {self.version}"
+            )
+            await self._run(self._write_version)
+        # Attempt to migrate the data from one version to another, if necessary.
+        elif actual_version != self.version:
+            await self._apply_migrations(data, actual_version)
+            # Create a backup of the old data just in case.
+            await self.backup()
+            # Immediately write the migrated data back, along with the new version.
+            await self.write(data)
+            self._log.warning(f"Data migration complete!")
+        return data
+
+    # @overrides SqliteDictDatabase
+    def _meta(self) -> Dict[str, str]:
+        return {"version": str(self.version)}
+
+    def _select_versioned(self) -> Tuple[Optional[int], dict]:
+        version = self._get_meta("version")
+        return (None if version is None else int(version)), self._select_all()
+
+    def _write_version(self):
+        with self._transaction():
+            self._set_meta("version", str(self.version))
@@ -0,0 +1,18 @@
+from typing import IO
+
+from commanderbot_lib.database.abc.journaled_file_database import JournaledFileDatabase
+from commanderbot_lib.database.mixins.yaml_file_database_mixin import (
+    YamlFileDatabaseMixin,
+)
+
+
+class YamlJournaledFileDatabase(JournaledFileDatabase, YamlFileDatabaseMixin):
+    # @implements FileDatabase
+    @staticmethod
+    def load(file: IO) -> dict:
+        return YamlFileDatabaseMixin.load_yaml(file)
+
+    # @implements FileDatabase
+    @staticmethod
+    def dump(data: dict, file: IO):
+        YamlFileDatabaseMixin.dump_yaml(data, file)
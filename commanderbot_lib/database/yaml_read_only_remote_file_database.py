@@ -1,11 +1,11 @@
-import yaml
-
 from commanderbot_lib.database.abc.read_only_remote_file_database import (
     ReadOnlyRemoteFileDatabase,
 )
+from commanderbot_lib.database.codecs import get_codec
 
 
 class YamlReadOnlyRemoteFileDatabase(ReadOnlyRemoteFileDatabase):
     # @implements ReadOnlyRemoteFileDatabase
-    async def parse(self, raw: str) -> dict:
-        return yaml.safe_load(raw)
+    @staticmethod
+    def parse(raw: str) -> dict:
+        return get_codec("yaml").loads(raw)
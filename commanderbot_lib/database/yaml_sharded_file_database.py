@@ -0,0 +1,18 @@
+from typing import IO
+
+from commanderbot_lib.database.abc.sharded_file_database import ShardedFileDatabase
+from commanderbot_lib.database.mixins.yaml_file_database_mixin import (
+    YamlFileDatabaseMixin,
+)
+
+
+class YamlShardedFileDatabase(ShardedFileDatabase, YamlFileDatabaseMixin):
+    # @implements ShardedFileDatabase
+    @staticmethod
+    def load(file: IO) -> dict:
+        return YamlFileDatabaseMixin.load_yaml(file)
+
+    # @implements ShardedFileDatabase
+    @staticmethod
+    def dump(data: dict, file: IO):
+        YamlFileDatabaseMixin.dump_yaml(data, file)
@@ -8,9 +8,11 @@ from commanderbot_lib.database.mixins.yaml_file_database_mixin import (
 
 class YamlVersionedFileDatabase(VersionedFileDatabase, YamlFileDatabaseMixin):
     # @implements FileDatabase
-    async def load(self, file: IO) -> dict:
-        return await self.load_yaml(file)
+    @staticmethod
+    def load(file: IO) -> dict:
+        return YamlFileDatabaseMixin.load_yaml(file)
 
     # @implements FileDatabase
-    async def dump(self, data: dict, file: IO):
-        await self.dump_yaml(data, file)
+    @staticmethod
+    def dump(data: dict, file: IO):
+        YamlFileDatabaseMixin.dump_yaml(data, file)
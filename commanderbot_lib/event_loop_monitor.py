@@ -0,0 +1,95 @@
+import asyncio
+from dataclasses import dataclass
+from typing import Optional
+
+from commanderbot_lib.logging import Logger, get_logger
+
+
+@dataclass
+class EventLoopStats:
+    """
+    Measurements of how long the event loop was blocked for, beyond the expected interval.
+
+    Attributes
+    -----------
+    samples: :class:`int`
+        The number of times the loop was sampled.
+    stalls: :class:`int`
+        The number of samples that were late by at least the stall threshold.
+    max_lag: :class:`float`
+        The longest that a single sample was late by, in seconds.
+    total_lag: :class:`float`
+        The sum of how late every sample was, in seconds.
+    last_lag: :class:`float`
+        How late the most recent sample was, in seconds.
+    """
+
+    samples: int = 0
+    stalls: int = 0
+    max_lag: float = 0.0
+    total_lag: float = 0.0
+    last_lag: float = 0.0
+
+    @property
+    def mean_lag(self) -> float:
+        return self.total_lag / self.samples if self.samples else 0.0
+
+
+class EventLoopMonitor:
+    """
+    Periodically measures how late the event loop is to wake up a sleeping task. Anything that
+    blocks the loop - like synchronous file I/O - shows up as lag, so this can be used to prove
+    whether or not a given operation stalls the bot.
+
+    Attributes
+    -----------
+    interval: :class:`float`
+        How often to sample the loop, in seconds.
+    threshold: :class:`float`
+        How late a sample has to be to count as a stall, in seconds.
+    """
+
+    def __init__(self, interval: float = 0.1, threshold: float = 0.05):
+        self.interval: float = interval
+        self.threshold: float = threshold
+        self.stats: EventLoopStats = EventLoopStats()
+        self._log: Logger = get_logger("EventLoopMonitor")
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        """ Start sampling the running event loop, if not already doing so. """
+        if not self.running:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self):
+        """ Stop sampling the event loop. The collected stats are kept. """
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def reset(self) -> EventLoopStats:
+        """ Reset the collected stats, returning the old ones. """
+        stats = self.stats
+        self.stats = EventLoopStats()
+        return stats
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self._record(max(0.0, loop.time() - expected))
+
+    def _record(self, lag: float):
+        stats = self.stats
+        stats.samples += 1
+        stats.total_lag += lag
+        stats.last_lag = lag
+        stats.max_lag = max(stats.max_lag, lag)
+        if lag >= self.threshold:
+            stats.stalls += 1
+            self._log.warning(f"Event loop was blocked for {lag*1000:.0f} ms")
@@ -0,0 +1,72 @@
+import asyncio
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from enum import Enum
+from functools import partial
+from typing import Any, Callable, Dict, Optional
+
+from commanderbot_lib.logging import get_logger
+
+log = get_logger(__name__)
+
+
+class ExecutorKind(Enum):
+    """ The kinds of shared executors that blocking work can be offloaded to. """
+
+    # Good for blocking I/O and for C extensions that release the GIL.
+    THREAD = "thread"
+
+    # Good for CPU-heavy, pure-Python work such as YAML (de)serialization without libyaml.
+    PROCESS = "process"
+
+
+# Shared executors are created lazily, the first time they are requested.
+_executors: Dict[ExecutorKind, Executor] = {}
+
+
+def get_executor(kind: ExecutorKind = ExecutorKind.THREAD) -> Executor:
+    """ Return the shared executor of the given kind, creating it if necessary. """
+    executor = _executors.get(kind)
+    if executor is None:
+        if kind is ExecutorKind.PROCESS:
+            executor = ProcessPoolExecutor()
+        else:
+            executor = ThreadPoolExecutor(thread_name_prefix="commanderbot-io")
+        _executors[kind] = executor
+    return executor
+
+
+def set_executor(kind: ExecutorKind, executor: Executor):
+    """
+    Replace the shared executor of the given kind, such as to configure the number of workers.
+
+    This should be done before any databases are created, otherwise they will keep using the
+    previous executor. The previous executor, if any, is shut down without waiting.
+    """
+    if previous := _executors.get(kind):
+        previous.shutdown(wait=False)
+    _executors[kind] = executor
+
+
+def shutdown_executors(wait: bool = True):
+    """ Shut down all shared executors. They will be re-created if requested again. """
+    for kind, executor in list(_executors.items()):
+        log.info(f"Shutting down {kind.value} executor...")
+        executor.shutdown(wait=wait)
+    _executors.clear()
+
+
+async def run_in_executor(
+    executor: Optional[Executor], func: Callable[..., Any], *args, **kwargs
+) -> Any:
+    """
+    Run `func` in the given executor (or the shared thread executor, if none is given) and wait
+    for it without blocking the event loop.
+
+    When using a process executor, `func` and all arguments must be picklable.
+    """
+    loop = asyncio.get_running_loop()
+    if executor is None:
+        executor = get_executor(ExecutorKind.THREAD)
+    if kwargs:
+        func = partial(func, **kwargs)
+    return await loop.run_in_executor(executor, func, *args)
@@ -0,0 +1,40 @@
+from typing import Optional
+
+import aiohttp
+
+from commanderbot_lib.logging import get_logger
+
+log = get_logger(__name__)
+
+# The maximum number of simultaneous connections in the shared session.
+DEFAULT_CONNECTION_LIMIT = 10
+
+# The default timeout for an entire request, in seconds.
+DEFAULT_TIMEOUT = 30.0
+
+_session: Optional[aiohttp.ClientSession] = None
+
+
+def get_http_session() -> aiohttp.ClientSession:
+    """
+    Return the shared HTTP session, creating it if necessary.
+
+    Sharing a session means sharing its connection pool, so that requests made by different cogs
+    to the same host can re-use connections. It must be created from within the event loop.
+    """
+    global _session
+    if (_session is None) or _session.closed:
+        _session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=DEFAULT_CONNECTION_LIMIT),
+            timeout=aiohttp.ClientTimeout(total=DEFAULT_TIMEOUT),
+        )
+    return _session
+
+
+async def close_http_session():
+    """ Close the shared HTTP session, if there is one. """
+    global _session
+    if (_session is not None) and not _session.closed:
+        log.info("Closing shared HTTP session...")
+        await _session.close()
+    _session = None
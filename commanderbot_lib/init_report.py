@@ -0,0 +1,148 @@
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+
+@dataclass
+class InitRecord:
+    """
+    How the initialization of a single component went.
+
+    Attributes
+    -----------
+    name: :class:`str`
+        The name of the component, prefixed by the names of the components it's a part of, such as
+        `my-cog / MyCogState / MyStore / JsonFileDatabase`.
+    depth: :class:`int`
+        How many components this one is a part of.
+    started_at: :class:`float`
+        When the component started initializing, in seconds since the scheduler started.
+    duration: :class:`Optional[float]`
+        How long the component took to initialize, in seconds, if it finished.
+    waited: :class:`float`
+        How long the component waited for its dependencies and a free slot before it started, in
+        seconds. Only applies to scheduled components.
+    error: :class:`Optional[str]`
+        Why the component failed to initialize, if it did.
+    """
+
+    name: str
+    depth: int = 0
+    started_at: float = 0.0
+    duration: Optional[float] = None
+    waited: float = 0.0
+    error: Optional[str] = None
+
+
+@dataclass
+class InitReport:
+    """
+    The initialization of every component run by an `InitScheduler`, including the components
+    that each of them initialized in turn.
+
+    Attributes
+    -----------
+    records: :class:`List[InitRecord]`
+        A record for each component, in the order they started.
+    duration: :class:`float`
+        How long it took for every scheduled component to finish, in seconds.
+    """
+
+    records: List[InitRecord] = field(default_factory=list)
+    duration: float = 0.0
+
+    @property
+    def failures(self) -> List[InitRecord]:
+        return [record for record in self.records if record.error is not None]
+
+    @property
+    def busy_time(self) -> float:
+        """ The sum of how long each scheduled component took, in seconds. """
+        return sum(
+            record.duration or 0.0 for record in self.records if record.depth == 0
+        )
+
+    def format(self) -> str:
+        """ Return a human-readable summary, with the slowest scheduled components first. """
+        lines = [
+            f"Initialized {sum(1 for record in self.records if record.depth == 0)} components"
+            + f" in {self.duration:.3f}s ({self.busy_time:.3f}s if run one at a time)"
+        ]
+        # Keep the parts of each component underneath it, in the order they started.
+        groups: Dict[str, List[InitRecord]] = {}
+        for record in self.records:
+            groups.setdefault(record.name.split(" / ")[0], []).append(record)
+        ordered = sorted(
+            groups.values(), key=lambda group: group[0].duration or 0.0, reverse=True
+        )
+        for group in ordered:
+            for record in group:
+                if record.duration is None:
+                    took = "did not finish"
+                else:
+                    took = f"{record.duration:.3f}s"
+                # Parts are indented underneath their component, so their own name is enough.
+                name = record.name.rsplit(" / ", 1)[-1]
+                line = f"{'  ' * (record.depth + 1)}{name}: {took}"
+                if record.waited >= 0.001:
+                    line += f" (waited {record.waited:.3f}s)"
+                if record.error is not None:
+                    line += f" - {record.error}"
+                lines.append(line)
+        return "\n".join(lines)
+
+
+# The report being recorded into along with when its scheduler started, and the record of the
+# component being initialized, if any.
+_current_report: ContextVar[Optional[Tuple[InitReport, float]]] = ContextVar(
+    "_current_report", default=None
+)
+_current_record: ContextVar[Optional[InitRecord]] = ContextVar(
+    "_current_record", default=None
+)
+
+
+@contextmanager
+def reporting_to(report: InitReport, started_at: float) -> Iterator[None]:
+    """
+    Record the initialization of components into `report`, for any tasks created within this
+    context. `started_at` is when the scheduler started, from `time.perf_counter()`.
+    """
+    token = _current_report.set((report, started_at))
+    try:
+        yield
+    finally:
+        _current_report.reset(token)
+
+
+@asynccontextmanager
+async def record_init(name: str) -> AsyncIterator[Optional[InitRecord]]:
+    """
+    Record how long the initialization of a component takes into the current report, if there is
+    one, as a part of whichever component is being initialized already. Yields the record, or
+    `None` if there isn't a report. `AsyncInitMixin.async_init()` does this for every component.
+    """
+    current = _current_report.get()
+    if current is None:
+        yield None
+        return
+    report, scheduler_started_at = current
+    parent = _current_record.get()
+    started_at = time.perf_counter()
+    record = InitRecord(
+        name=name if parent is None else f"{parent.name} / {name}",
+        depth=0 if parent is None else parent.depth + 1,
+        started_at=started_at - scheduler_started_at,
+    )
+    report.records.append(record)
+    token = _current_record.set(record)
+    try:
+        yield record
+    except BaseException as ex:
+        record.error = f"{type(ex).__name__}: {ex}" if str(ex) else type(ex).__name__
+        raise
+    finally:
+        record.duration = time.perf_counter() - started_at
+        _current_record.reset(token)
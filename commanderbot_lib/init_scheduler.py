@@ -0,0 +1,198 @@
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from commanderbot_lib.init_report import (
+    InitRecord,
+    InitReport,
+    record_init,
+    reporting_to,
+)
+from commanderbot_lib.logging import Logger, get_logger
+from commanderbot_lib.mixins.async_init_mixin import AsyncInitMixin
+
+
+@dataclass
+class _ScheduledInit:
+    name: str
+    component: AsyncInitMixin
+    depends_on: Tuple[str, ...]
+    timeout: Optional[float]
+    # Resolves to the error that the component failed with, if any, once it's done.
+    done: Optional[asyncio.Future] = None
+
+
+class InitScheduler:
+    """
+    Initializes components (usually the `CogState` of each cog) concurrently, instead of one at a
+    time, so that startup takes about as long as the slowest component rather than all of them
+    added together.
+
+    Components are added with `add()`, optionally naming the components they depend on, and are
+    then initialized by `run()` once their dependencies have been. Each component still
+    initializes its own parts (such as its store and database) in order. A component whose
+    dependencies failed is not initialized at all.
+
+    `CommanderBot` runs its scheduler before connecting to Discord, and logs the resulting report.
+    Components added after that are initialized right away.
+
+    Attributes
+    -----------
+    concurrency: :class:`Optional[int]`
+        The maximum number of components to initialize at once, if any.
+    timeout: :class:`Optional[float]`
+        How long to give each component to initialize, in seconds, unless it has its own timeout.
+    report: :class:`InitReport`
+        How the initialization of each component went so far.
+    """
+
+    def __init__(self, concurrency: Optional[int] = 8, timeout: Optional[float] = None):
+        self.concurrency: Optional[int] = concurrency
+        self.timeout: Optional[float] = timeout
+        self.report: InitReport = InitReport()
+        self._log: Logger = get_logger("InitScheduler")
+        self._inits: Dict[str, _ScheduledInit] = {}
+        # Both of these are set once the scheduler first runs.
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._started_at: float = 0.0
+
+    @property
+    def started(self) -> bool:
+        return self._semaphore is not None
+
+    def add(
+        self,
+        name: str,
+        component: AsyncInitMixin,
+        depends_on: Iterable[str] = (),
+        timeout: Optional[float] = None,
+    ):
+        """
+        Add a component to initialize, after the components named by `depends_on`, within
+        `timeout` seconds (or the scheduler's default timeout).
+
+        A component can only be replaced by another of the same name once it has finished
+        initializing, such as when the extension that added it is reloaded.
+        """
+        existing = self._inits.get(name)
+        if (existing is not None) and not (existing.done and existing.done.done()):
+            raise ValueError(f"A component named {name} has already been added")
+        scheduled = _ScheduledInit(
+            name=name,
+            component=component,
+            depends_on=tuple(depends_on),
+            timeout=self.timeout if timeout is None else timeout,
+        )
+        self._inits[name] = scheduled
+        # The scheduler has already run, so start the component right away.
+        if self._semaphore is not None:
+            self._check_dependencies()
+            self._start(scheduled, self._semaphore)
+
+    async def run(self) -> InitReport:
+        """ Initialize every component that hasn't been yet, and return the report. """
+        self._check_dependencies()
+        semaphore = self._semaphore
+        if semaphore is None:
+            self._started_at = time.perf_counter()
+            semaphore = self._semaphore = asyncio.Semaphore(
+                self.concurrency or len(self._inits) or 1
+            )
+        await asyncio.gather(
+            *(self._start(scheduled, semaphore) for scheduled in self._inits.values())
+        )
+        self.report.duration = time.perf_counter() - self._started_at
+        return self.report
+
+    def _check_dependencies(self):
+        for scheduled in self._inits.values():
+            for dependency in scheduled.depends_on:
+                if dependency not in self._inits:
+                    raise ValueError(
+                        f"Component {scheduled.name} depends on unknown component: {dependency}"
+                    )
+        # Make sure that there are no cycles, which would otherwise wait forever.
+        visited: Dict[str, bool] = {}
+
+        def visit(name: str, path: Tuple[str, ...]):
+            if visited.get(name):
+                return
+            if name in path:
+                cycle = " -> ".join(path[path.index(name) :] + (name,))
+                raise ValueError(f"Components depend on each other: {cycle}")
+            for dependency in self._inits[name].depends_on:
+                visit(dependency, path + (name,))
+            visited[name] = True
+
+        for name in self._inits:
+            visit(name, ())
+
+    def _start(
+        self, scheduled: _ScheduledInit, semaphore: asyncio.Semaphore
+    ) -> asyncio.Future:
+        """ Start initializing the component, unless it has been already, and return its future. """
+        if scheduled.done is not None:
+            return scheduled.done
+        loop = asyncio.get_running_loop()
+        done = scheduled.done = loop.create_future()
+        # Futures of dependencies have to exist before anything waits on them.
+        dependencies = [
+            self._start(self._inits[dependency], semaphore)
+            for dependency in scheduled.depends_on
+        ]
+        # The task gets a copy of the current context, and so records into the report.
+        with reporting_to(self.report, self._started_at):
+            loop.create_task(self._init(scheduled, done, dependencies, semaphore))
+        return done
+
+    async def _init(
+        self,
+        scheduled: _ScheduledInit,
+        done: asyncio.Future,
+        dependencies: List[asyncio.Future],
+        semaphore: asyncio.Semaphore,
+    ):
+        queued_at = time.perf_counter()
+        error: Optional[str] = None
+        failed = [
+            name
+            for name, dependency in zip(scheduled.depends_on, dependencies)
+            if await asyncio.shield(dependency) is not None
+        ]
+        try:
+            if failed:
+                error = f"Dependencies failed to initialize: {', '.join(failed)}"
+                self._log.error(f"Not initializing {scheduled.name}. {error}")
+                return
+            async with semaphore:
+                self._log.info(f"Initializing: {scheduled.name}")
+                async with record_init(scheduled.name) as record:
+                    if record is not None:
+                        record.waited = record.started_at - (
+                            queued_at - self._started_at
+                        )
+                    await asyncio.wait_for(
+                        scheduled.component.async_init(), scheduled.timeout
+                    )
+        except asyncio.TimeoutError:
+            error = f"Timed out after {scheduled.timeout}s"
+            self._log.error(f"{error} initializing: {scheduled.name}")
+        except Exception as ex:
+            error = f"{type(ex).__name__}: {ex}"
+            self._log.exception(f"Failed to initialize: {scheduled.name}")
+        finally:
+            if error is not None:
+                record = self._find_record(scheduled.name)
+                if record is None:
+                    record = InitRecord(
+                        name=scheduled.name, started_at=queued_at - self._started_at
+                    )
+                    self.report.records.append(record)
+                record.error = error
+            done.set_result(error)
+
+    def _find_record(self, name: str) -> Optional[InitRecord]:
+        for record in reversed(self.report.records):
+            if (record.depth == 0) and (record.name == name):
+                return record
@@ -1,9 +1,29 @@
+import asyncio
+from typing import Optional
+
+from commanderbot_lib.init_report import record_init
+
+
 class AsyncInitMixin:
+    # The initialization of this object, once it has started.
+    _async_init_task: Optional["asyncio.Future[None]"] = None
+
     async def async_init(self):
-        """ Call this from outside the object to initialize it asynchronously. """
-        await self.before_async_init()
-        await self._async_init()
-        await self.after_async_init()
+        """
+        Call this from outside the object to initialize it asynchronously. The object is only
+        initialized once, even if this is called again (such as by an `InitScheduler` as well as by
+        the object's owner); later calls wait for the first one to finish.
+        """
+        if self._async_init_task is None:
+            self._async_init_task = asyncio.ensure_future(self._run_async_init())
+        await self._async_init_task
+
+    async def _run_async_init(self):
+        # Shows up in the startup report, if an `InitScheduler` is running this.
+        async with record_init(type(self).__name__):
+            await self.before_async_init()
+            await self._async_init()
+            await self.after_async_init()
 
     async def _async_init(self):
         """
@@ -1,10 +1,11 @@
 from datetime import datetime
-from typing import Dict, Generic, Iterable, Optional, Type, TypeVar
+from typing import Dict, Generic, Iterable, Optional, Tuple, Type, TypeVar
 
 from discord import Guild, Member, Message, Reaction, TextChannel, User
 from discord.abc import Messageable
 from discord.ext.commands import Bot, Cog
 
+from commanderbot_lib.bot.abc.commander_bot_base import CommanderBotBase
 from commanderbot_lib.guild_state.abc.cog_guild_state import CogGuildState
 from commanderbot_lib.logging import Logger, get_clogger
 from commanderbot_lib.mixins.async_init_mixin import AsyncInitMixin
@@ -44,6 +45,12 @@ class CogState(AsyncInitMixin, Generic[OptionsType, StoreType, GuildStateType]):
     # TODO Can we determine this automatically via reflection? #refactor
     guild_state_class: Type[GuildStateType] = CogGuildState
 
+    # The names of the cogs whose state has to be initialized before this one.
+    init_depends_on: Tuple[str, ...] = ()
+
+    # How long to give this state to initialize, in seconds, instead of the bot's default.
+    init_timeout: Optional[float] = None
+
     def __init__(self, bot: Bot, cog: Cog, options: OptionsType):
         self.bot: Bot = bot
         self.cog: Cog = cog
@@ -51,6 +58,14 @@ class CogState(AsyncInitMixin, Generic[OptionsType, StoreType, GuildStateType]):
         self._log: Logger = get_clogger(self.cog)
         self._store: StoreType = None
         self._guild_state_by_id: Dict[GuildID, GuildStateType] = {}
+        # Let the bot initialize this along with the state of every other cog, concurrently.
+        if isinstance(bot, CommanderBotBase):
+            bot.init_scheduler.add(
+                self.cog.qualified_name,
+                self,
+                depends_on=self.init_depends_on,
+                timeout=self.init_timeout,
+            )
 
     @property
     def store(self) -> StoreType:
@@ -81,6 +96,8 @@ class CogState(AsyncInitMixin, Generic[OptionsType, StoreType, GuildStateType]):
         self._guild_state_by_id[guild.id] = state
 
     async def create_guild_state(self, guild: Guild) -> GuildStateType:
+        # Give the store a chance to lazy-load any data for the guild.
+        await self.store.load_guild(guild)
         guild_state: GuildStateType = self.guild_state_class(
             self.bot, self.cog, self.options, guild, self.store
         )
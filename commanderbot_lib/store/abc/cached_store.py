@@ -1,29 +1,169 @@
+import asyncio
+import hashlib
+import pickle
+import time
 from abc import abstractmethod
-from typing import Generic, TypeVar
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from pathlib import Path, PurePosixPath
+from typing import (
+    Any,
+    AsyncIterator,
+    Dict,
+    Generic,
+    Hashable,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    TypeVar,
+)
+from urllib.parse import urldefrag, urlsplit
+from weakref import WeakSet
 
+from discord import Guild
 from discord.ext.commands import Bot, Cog
 
 from commanderbot_lib.database.abc.dict_database import DictDatabase
-from commanderbot_lib.database.abc.file_database import FileDatabase
+from commanderbot_lib.database.abc.file_database import (
+    FileDatabase,
+    FileDatabaseStats,
+)
+from commanderbot_lib.database.abc.journaled_file_database import JournalOptions
 from commanderbot_lib.database.abc.read_only_remote_file_database import (
     ReadOnlyRemoteFileDatabase,
 )
+from commanderbot_lib.database.abc.sharded_file_database import (
+    SHARD_PLACEHOLDER,
+    ShardedFileDatabase,
+)
+from commanderbot_lib.database.backups import BackupPolicy
+from commanderbot_lib.database.changes import (
+    Change,
+    DeleteChange,
+    KeyPath,
+    SetChange,
+    apply_changes,
+    collapse_paths,
+    lookup_path,
+)
+from commanderbot_lib.database.codec_file_database import CodecFileDatabase
+from commanderbot_lib.database.codec_journaled_file_database import (
+    CodecJournaledFileDatabase,
+)
+from commanderbot_lib.database.codec_read_only_remote_file_database import (
+    CodecReadOnlyRemoteFileDatabase,
+)
+from commanderbot_lib.database.codec_sharded_file_database import (
+    CodecShardedFileDatabase,
+)
+from commanderbot_lib.database.codecs import Codec, get_codec_for_path
+from commanderbot_lib.database.file_io import Durability, FileState
 from commanderbot_lib.database.in_memory_dict_database import InMemoryDictDatabase
-from commanderbot_lib.database.json_file_database import JsonFileDatabase
-from commanderbot_lib.database.json_read_only_remote_file_database import (
-    JsonReadOnlyRemoteFileDatabase,
+from commanderbot_lib.database.redis_dict_database import (
+    REDIS_LOCATION_PREFIX,
+    RedisDictDatabase,
 )
-from commanderbot_lib.database.yaml_file_database import YamlFileDatabase
-from commanderbot_lib.database.yaml_read_only_remote_file_database import (
-    YamlReadOnlyRemoteFileDatabase,
+from commanderbot_lib.database.redis_pool import get_redis_pool
+from commanderbot_lib.database.sqlite_dict_database import (
+    SQLITE_LOCATION_PREFIX,
+    SqliteDictDatabase,
 )
+from commanderbot_lib.executors import ExecutorKind, get_executor, run_in_executor
+from commanderbot_lib.http_session import DEFAULT_TIMEOUT
+from commanderbot_lib.logging import get_logger
 from commanderbot_lib.options.abc.options_with_database import OptionsWithDatabase
+from commanderbot_lib.store import warm_start
 from commanderbot_lib.store.abc.cog_store import CogStore
+from commanderbot_lib.types import GuildID
+
+log = get_logger(__name__)
 
 OptionsType = TypeVar("OptionsType", bound=OptionsWithDatabase)
 DatabaseType = TypeVar("DatabaseType", bound=DictDatabase)
 CacheType = TypeVar("CacheType")
 
+# Stands in for an entry that is missing, when comparing entries with a snapshot.
+_MISSING = object()
+
+# The stores that have changes waiting to be written in the background.
+_stores_with_pending_writes: "WeakSet[CachedStore]" = WeakSet()
+
+# The stores that keep warm-start snapshots, to be saved again when the bot closes.
+_warm_start_stores: "WeakSet[CachedStore]" = WeakSet()
+
+
+@dataclass(eq=False)
+class StoreTransaction:
+    """
+    The state of a transaction that is open on a `CachedStore`. See `CachedStore.transaction()`.
+
+    Attributes
+    -----------
+    rollback_state: :class:`Any`
+        Whatever the store needs in order to roll back its cache, from `_begin_transaction()`.
+    dirty_paths: :class:`Set[KeyPath]`
+        The key paths marked as dirty within the transaction, to be persisted upon commit.
+    full_write: :class:`bool`
+        Whether `dirty()` was called within the transaction without any key paths, in which case
+        the entire cache is persisted upon commit.
+    concurrent_keys: :class:`Set[Hashable]`
+        The top-level keys of the paths that other tasks marked as dirty while the transaction was
+        open, which rolling back leaves alone.
+    """
+
+    rollback_state: Any
+    dirty_paths: Set[KeyPath] = field(default_factory=set)
+    full_write: bool = False
+    concurrent_keys: Set[Hashable] = field(default_factory=set)
+
+
+# The transactions that the current task is running within, on any number of stores.
+_active_transactions: ContextVar[Tuple[StoreTransaction, ...]] = ContextVar(
+    "active_transactions", default=()
+)
+
+
+@dataclass
+class WriteStats:
+    """
+    Counters of what a `CachedStore` has done to persist its changes.
+
+    Attributes
+    -----------
+    requests: :class:`int`
+        The number of times that `dirty()` has been called.
+    writes: :class:`int`
+        The number of writes made to the database. With `database_write_delay` set, several
+        requests are usually coalesced into a single write.
+    failures: :class:`int`
+        The number of writes that failed, whose changes were kept for the next write.
+    pending: :class:`int`
+        The number of requests that are still waiting to be written.
+    last_duration: :class:`float`
+        How long the last write took, in seconds.
+    last_latency: :class:`float`
+        How long the last write took to finish after the oldest request it covered, in seconds.
+    max_latency: :class:`float`
+        The longest that any write took to finish after the oldest request it covered, in seconds.
+    """
+
+    requests: int = 0
+    writes: int = 0
+    failures: int = 0
+    pending: int = 0
+    last_duration: float = 0.0
+    last_latency: float = 0.0
+    max_latency: float = 0.0
+
+    def record_write(self, duration: float, latency: float):
+        self.writes += 1
+        self.last_duration = duration
+        self.last_latency = latency
+        self.max_latency = max(self.max_latency, latency)
+
 
 class CachedStore(
     CogStore[OptionsType, DatabaseType], Generic[OptionsType, DatabaseType, CacheType]
@@ -42,9 +182,86 @@ class CachedStore(
         A set of static configuration options for the cog.
     """
 
+    # The kind of shared executor that file databases should do their I/O in. Stores with large,
+    # pure-Python serialization (such as YAML without libyaml) may prefer a process executor.
+    database_executor: ExecutorKind = ExecutorKind.THREAD
+
+    # How hard file databases should try to make sure that writes have reached the disk.
+    database_durability: Durability = Durability.FILE
+
+    # If set, local file databases will be journaled: small changes are appended to a journal that
+    # is periodically compacted, instead of rewriting the entire file every time.
+    database_journal: Optional[JournalOptions] = None
+
+    # The number of shards to hash keys into, for sharded file databases. By default, every key
+    # (usually a guild ID) gets its own shard.
+    database_shard_buckets: Optional[int] = None
+
+    # Whether sharded file databases should only load each shard once its guild is first accessed.
+    database_lazy_shards: bool = True
+
+    # Whether to gradually load any keys that the database has deferred, such as records with
+    # pending migrations, in the background after startup. Otherwise, they are loaded on demand.
+    database_load_deferred_keys: bool = True
+
+    # How long to wait between each deferred key loaded in the background, in seconds.
+    database_deferred_key_interval: float = 0.01
+
+    # How to back up file and SQLite databases, such as before migrating them. Defaults to keeping
+    # every distinct backup, compressed.
+    database_backups: Optional[BackupPolicy] = None
+
+    # Whether plain file databases should memory-map their file and only decode each top-level
+    # value once it is first accessed. Only supported for codecs with an index, such as JSON.
+    database_lazy_load: bool = False
+
+    # If set, check local file databases this often (in seconds) for changes made by something else,
+    # such as an operator editing the file by hand, and rebuild the cache when the file changes.
+    database_watch_interval: Optional[float] = None
+
+    # Whether local file databases should lock their file, so that several processes (such as bot
+    # shards, or a dashboard next to the bot) can share it without losing each other's changes.
+    # Changes marked with `mark_dirty()` are merged into the latest contents of the file, and the
+    # cache is refreshed after writing if another process has written the file in the meantime.
+    database_locking: bool = False
+
+    # If set, `dirty()` returns right away and changes are persisted by a background task this many
+    # seconds later instead, so that a burst of changes is coalesced into a single write. Anything
+    # still pending is flushed by `flush()`, which `CommanderBot.close()` calls for every store.
+    database_write_delay: Optional[float] = None
+
+    # A directory to keep copies of remote file databases in, so that unchanged files don't have to
+    # be downloaded again and so that the last copy can be used if the remote host is unreachable.
+    remote_database_cache_dir: Optional[str] = None
+
+    # How long to wait for remote file databases to download, in seconds.
+    remote_database_timeout: float = DEFAULT_TIMEOUT
+
+    # If set, a snapshot of the built cache is kept in this directory for local file databases,
+    # and loaded instead of reading the file and building the cache again for as long as the file
+    # hasn't changed. Snapshots are saved after building the cache, and when the bot closes. The
+    # cache must be picklable.
+    warm_start_dir: Optional[str] = None
+
+    # Change this whenever the cache changes shape, so that existing snapshots are ignored.
+    warm_start_version: int = 0
+
     def __init__(self, bot: Bot, cog: Cog, options: OptionsType):
         super().__init__(bot, cog, options)
         self._cache: CacheType = None
+        self._dirty_paths: Set[KeyPath] = set()
+        self._deferred_keys_task: Optional[asyncio.Task] = None
+        self._watch_task: Optional[asyncio.Task] = None
+        self.write_stats: WriteStats = WriteStats()
+        self._full_write_pending: bool = False
+        self._pending_since: float = 0.0
+        self._write_lock: asyncio.Lock = asyncio.Lock()
+        self._flush_task: Optional[asyncio.Task] = None
+        self._transaction: Optional[StoreTransaction] = None
+        self._transaction_lock: asyncio.Lock = asyncio.Lock()
+        # Whether the cache was loaded from a warm-start snapshot, and how long startup took.
+        self.warm_started: bool = False
+        self.startup_time: Optional[float] = None
 
     @abstractmethod
     async def _build_cache(self, data: dict) -> CacheType:
@@ -54,6 +271,117 @@ class CachedStore(
     async def serialize(self) -> dict:
         """ Convert the current cache into a JSON-serializable form. """
 
+    async def serialize_path(self, path: KeyPath) -> Any:
+        """
+        Return the JSON-serializable form of the value at `path`, raising a `KeyError` if there
+        isn't one.
+
+        The default implementation serializes the entire cache first; override this if the value
+        can be produced more cheaply.
+        """
+        return lookup_path(await self.serialize(), path)
+
+    @property
+    def database_stats(self) -> Optional[FileDatabaseStats]:
+        """ What the database has done with its file, if it is a local file database. """
+        if isinstance(self._database, FileDatabase):
+            return self._database.stats
+
+    async def _restore_cache(self, cache: CacheType):
+        """
+        Use a cache loaded from a warm-start snapshot, instead of one built with `_build_cache()`.
+        Override this to restore anything else that `_build_cache()` would have set up.
+        """
+        self._cache = cache
+
+    @property
+    def _warm_start_enabled(self) -> bool:
+        return (
+            (self.warm_start_dir is not None)
+            and isinstance(self._database, FileDatabase)
+            and self._database.supports_warm_start
+        )
+
+    def _warm_start_path(self) -> Path:
+        # Name the snapshot after the cog and its database, which may be shared by several cogs.
+        source = f"{self.cog.qualified_name}:{self.options.database}"
+        name = hashlib.sha1(source.encode("utf-8")).hexdigest()[:16]
+        assert self.warm_start_dir is not None
+        return Path(self.warm_start_dir) / f"{name}{warm_start.SNAPSHOT_SUFFIX}"
+
+    def _warm_start_key(self, state: FileState) -> str:
+        store_type = type(self)
+        return f"{state.content_hash}:{store_type.__module__}.{store_type.__qualname__}:{self.warm_start_version}"
+
+    async def _warm_start(self) -> bool:
+        """ Load the cache from a warm-start snapshot, if there is one for the current file. """
+        if not self._warm_start_enabled:
+            if self.warm_start_dir is not None:
+                self._log.warning(
+                    f"Cannot warm-start from a {type(self._database).__name__}; only plain local file databases are supported"
+                )
+            return False
+        assert isinstance(self._database, FileDatabase)
+        state = await self._database.read_state()
+        if state is None:
+            return False
+        path = self._warm_start_path()
+        try:
+            cache = await run_in_executor(
+                None, warm_start.read_snapshot, path, self._warm_start_key(state)
+            )
+        except:
+            self._log.exception(f"Failed to load warm-start snapshot: {path}")
+            return False
+        if cache is None:
+            self._log.info("No warm-start snapshot for the current database file")
+            return False
+        self._log.info(f"Loaded warm-start snapshot: {path}")
+        await self._restore_cache(cache)
+        return True
+
+    async def save_warm_start(self):
+        """
+        Save a snapshot of the cache to warm-start from, if enabled. Nothing is saved while there
+        are changes that haven't been written yet, since the file wouldn't match the cache.
+        """
+        if not self._warm_start_enabled:
+            return
+        assert isinstance(self._database, FileDatabase)
+        state = self._database.file_state
+        if (
+            self._dirty_paths
+            or self._full_write_pending
+            or self.write_stats.pending
+            or (state is None)
+            or (state.content_hash is None)
+        ):
+            return
+        path = self._warm_start_path()
+        try:
+            # Pickle here, on the event loop, so that the cache can't change underneath us.
+            payload = pickle.dumps(self._cache, protocol=pickle.HIGHEST_PROTOCOL)
+            await run_in_executor(
+                None,
+                warm_start.write_snapshot,
+                path,
+                self._warm_start_key(state),
+                payload,
+            )
+        except:
+            self._log.exception(f"Failed to save warm-start snapshot: {path}")
+            return
+        self._log.info(f"Saved warm-start snapshot: {path}")
+
+    async def _merge_cache(self, data: dict):
+        """
+        Merge lazily-loaded data into the current cache. This must be implemented in order to use
+        databases that don't return all of their data up front, such as lazy sharded databases.
+        """
+        raise NotImplementedError(
+            f"{type(self).__name__} does not support lazily-loaded data"
+        )
+
     # @implements CogStore
     async def _create_database(self) -> DatabaseType:
         db_options = self.options.database
@@ -64,7 +392,19 @@ class CachedStore(
         # If database is a dict, use it directly as the initial set of in-memory data.
         elif isinstance(db_options, dict):
             return await self._make_in_memory_database(db_options)
-        # If database is a string, use a file database.
+        # If database is an SQLite location, use an SQLite database.
+        elif isinstance(db_options, str) and db_options.startswith(
+            SQLITE_LOCATION_PREFIX
+        ):
+            return await self._make_sqlite_database(
+                db_options[len(SQLITE_LOCATION_PREFIX) :]
+            )
+        # If database is a Redis address, use a Redis database.
+        elif isinstance(db_options, str) and db_options.startswith(
+            REDIS_LOCATION_PREFIX
+        ):
+            return await self._make_redis_database(db_options)
+        # If database is any other string, use a file database.
         elif isinstance(db_options, str):
             return await self._make_file_database(db_options)
         # Otherwise, we've got a problem.
@@ -74,8 +414,95 @@ class CachedStore(
 
     # @overrides CachedStore
     async def _after_database_init(self):
-        initial_data = await self._database.read()
-        self._cache = await self._build_cache(initial_data)
+        started_at = time.perf_counter()
+        self.warm_started = await self._warm_start()
+        if not self.warm_started:
+            initial_data = await self._database.read()
+            self._cache = await self._build_cache(initial_data)
+        self.startup_time = time.perf_counter() - started_at
+        self._log.info(
+            f"{'Warm' if self.warm_started else 'Cold'} start took {self.startup_time:.3f} second(s)"
+        )
+        if self._warm_start_enabled:
+            _warm_start_stores.add(self)
+            if not self.warm_started:
+                await self.save_warm_start()
+        if self.database_load_deferred_keys and self._database.deferred_keys():
+            self._deferred_keys_task = asyncio.get_running_loop().create_task(
+                self._load_deferred_keys()
+            )
+        if self.database_watch_interval is not None:
+            self._start_watching(self.database_watch_interval)
+
+    # @overrides CogStore
+    async def load_guild(self, guild: Guild):
+        await self.load_key(self.guild_key(guild.id))
+
+    def guild_key(self, guild_id: GuildID) -> Hashable:
+        """ Return the top-level key that data for the given guild is stored under. """
+        return str(guild_id)
+
+    async def load_key(self, key: Hashable) -> bool:
+        """
+        Load any data for the given top-level key that the database hasn't returned yet, and return
+        whether there was any.
+        """
+        if data := await self._database.read_key(key):
+            await self._merge_cache(data)
+            return True
+        return False
+
+    async def _load_deferred_keys(self):
+        """
+        Load every key that the database has deferred, one at a time so as not to hog the event
+        loop, and then persist them.
+        """
+        keys = self._database.deferred_keys()
+        self._log.info(f"Loading {len(keys)} deferred key(s) in the background")
+        try:
+            loaded: List[KeyPath] = []
+            for key in keys:
+                if await self.load_key(key):
+                    loaded.append((key,))
+                await asyncio.sleep(self.database_deferred_key_interval)
+            if loaded:
+                await self.dirty(*loaded)
+        except:
+            self._log.exception("Failed to load deferred keys")
+        else:
+            self._log.info(f"Finished loading {len(keys)} deferred key(s)")
+
+    def _start_watching(self, interval: float):
+        if not isinstance(self._database, FileDatabase):
+            self._log.warning(
+                f"Cannot watch a {type(self._database).__name__} for changes; only local file databases can be watched"
+            )
+            return
+        self._log.info(
+            f"Watching the database file for changes every {interval} second(s)"
+        )
+        self._watch_task = asyncio.get_running_loop().create_task(
+            self._watch_database(self._database, interval)
+        )
+
+    async def _watch_database(self, database: FileDatabase, interval: float):
+        """ Rebuild the cache whenever the database file changes on disk. """
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self._reload_if_changed(database)
+            except:
+                self._log.exception("Failed to reload the database file")
+
+    async def _reload_if_changed(self, database: FileDatabase):
+        data = await database.read_if_changed()
+        if data is None:
+            return
+        # Keep any changes marked with `mark_dirty()` that haven't been persisted yet.
+        if self._dirty_paths:
+            apply_changes(data, await self._collect_changes(self._dirty_paths))
+        self._cache = await self._build_cache(data)
+        self._log.info("Rebuilt the cache from the changed database file")
 
     async def _make_in_memory_database(self, data: dict) -> InMemoryDictDatabase:
         self._log.info(
@@ -83,54 +510,390 @@ class CachedStore(
         )
         return InMemoryDictDatabase(self.bot, self.cog, data=data)
 
-    async def _make_file_database(self, location: str) -> FileDatabase:
+    async def _make_sqlite_database(self, path: str) -> SqliteDictDatabase:
+        self._log.info(f"Creating an SQLite database using the file at: {path}")
+        return SqliteDictDatabase(
+            self.bot,
+            self.cog,
+            path=path,
+            durability=self.database_durability,
+            backups=self.database_backups,
+        )
+
+    async def _make_redis_database(self, location: str) -> RedisDictDatabase:
+        # The fragment, if any, names the hash to use; the rest of the address picks the pool.
+        address, key = urldefrag(location)
+        key = key or f"commanderbot:{self.cog.qualified_name}"
+        self._log.info(f"Creating a Redis database using the hash {key} at: {address}")
+        return RedisDictDatabase(
+            self.bot, self.cog, pool=get_redis_pool(address), key=key
+        )
+
+    async def _make_file_database(self, location: str) -> DictDatabase:
         # If location is an HTTP address, use a read-only remote file database.
         if location.startswith(("http://", "https://")):
             return await self._make_remote_file_database(location)
         # If the location is any other string, assume it is a file path and use a local file database.
         return await self._make_local_file_database(location)
 
+    def _remote_cache_path(self, location: str) -> Optional[Path]:
+        if self.remote_database_cache_dir is None:
+            return None
+        # Name the cached copy after the address, but keep the extension for readability.
+        name = hashlib.sha1(location.encode("utf-8")).hexdigest()[:16]
+        suffix = PurePosixPath(urlsplit(location).path).suffix
+        return Path(self.remote_database_cache_dir) / f"{name}{suffix}"
+
+    def _get_codec(self, location: str, kind: str) -> Codec:
+        codec = get_codec_for_path(location)
+        if codec is None:
+            raise ValueError(
+                f"Unsupported file type for {kind} cog <{self.cog.qualified_name}>: {location}"
+            )
+        return codec
+
     async def _make_remote_file_database(
         self, location: str
     ) -> ReadOnlyRemoteFileDatabase:
-        # JSON
-        if location.endswith(".json"):
-            self._log.info(
-                f"Creating a remote JSON file database using the file at: {location}"
+        # Ignore any query string or fragment when looking at the file extension.
+        codec = self._get_codec(urlsplit(location).path, "remote file database")
+        # Remote files are downloaded and cached as text.
+        if codec.binary:
+            raise ValueError(
+                f"Binary file type {codec.name} is not supported for remote file database cog <{self.cog.qualified_name}>: {location}"
+            )
+        self._log.info(
+            f"Creating a remote {codec.name} file database using the file at: {location}"
+        )
+        return CodecReadOnlyRemoteFileDatabase(
+            self.bot,
+            self.cog,
+            codec=codec,
+            address=location,
+            cache_path=self._remote_cache_path(location),
+            timeout=self.remote_database_timeout,
+            executor=get_executor(self.database_executor),
+        )
+
+    async def _make_local_file_database(self, location: str) -> DictDatabase:
+        if self.database_locking and (
+            (SHARD_PLACEHOLDER in location) or (self.database_journal is not None)
+        ):
+            raise ValueError(
+                f"Sharded and journaled file databases do not support locking, for cog <{self.cog.qualified_name}>: {location}"
             )
-            return JsonReadOnlyRemoteFileDatabase(self.bot, self.cog, address=location)
-        # YAML
-        elif location.endswith((".yaml", ".yml")):
+        # If the file name contains a shard placeholder, use a sharded file database.
+        if SHARD_PLACEHOLDER in location:
+            return await self._make_sharded_file_database(location)
+        codec = self._get_codec(location, "file database")
+        options: Dict[str, Any] = dict(
+            codec=codec,
+            path=location,
+            executor=get_executor(self.database_executor),
+            durability=self.database_durability,
+            backups=self.database_backups,
+        )
+        if self.database_journal is not None:
             self._log.info(
-                f"Creating a remote file database using the file at: {location}"
+                f"Creating a journaled {codec.name} file database using the file at: {location}"
+            )
+            return CodecJournaledFileDatabase(
+                self.bot, self.cog, journal=self.database_journal, **options
             )
-            return YamlReadOnlyRemoteFileDatabase(self.bot, self.cog, address=location)
-        # Anything else is unsupported.
+        self._log.info(
+            f"Creating a {codec.name} file database using the file at: {location}"
+        )
+        return CodecFileDatabase(
+            self.bot,
+            self.cog,
+            lazy=self.database_lazy_load,
+            locking=self.database_locking,
+            **options,
+        )
+
+    async def _make_sharded_file_database(self, location: str) -> ShardedFileDatabase:
+        codec = self._get_codec(location, "sharded file database")
+        self._log.info(
+            f"Creating a sharded {codec.name} file database using the files at: {location}"
+        )
+        return CodecShardedFileDatabase(
+            self.bot,
+            self.cog,
+            codec=codec,
+            path=location,
+            executor=get_executor(self.database_executor),
+            durability=self.database_durability,
+            buckets=self.database_shard_buckets,
+            lazy=self.database_lazy_shards,
+        )
+
+    def mark_dirty(self, *path: Hashable):
+        """ Mark the value at the given key path as changed, to be persisted by `dirty()`. """
+        if not path:
+            raise ValueError("Cannot mark an empty key path as dirty")
+        if (transaction := self._current_transaction()) is not None:
+            transaction.dirty_paths.add(path)
+            return
+        if self._transaction is not None:
+            self._transaction.concurrent_keys.add(path[0])
+        self._dirty_paths.add(path)
+
+    async def dirty(self, *paths: KeyPath):
+        """
+        Persist changes to the cache.
+
+        If any key paths are given, then only the values at those paths (along with any that have
+        been marked with `mark_dirty()`) are persisted - if the database supports it. Otherwise,
+        the entire cache is serialized and written, since values may have been changed in place
+        without being marked.
+
+        If `database_write_delay` is set, this returns right away and the changes are persisted in
+        the background instead, along with any others made in the meantime.
+
+        Within a transaction, this does nothing until the transaction is committed.
+        """
+        if (transaction := self._current_transaction()) is not None:
+            if paths:
+                transaction.dirty_paths.update(paths)
+            else:
+                transaction.full_write = True
+            return
+        # Without any key paths, changes may have been made anywhere in the cache, including
+        # places that were never marked; so the entire cache has to be written.
+        if paths:
+            self._dirty_paths.update(paths)
+            if self._transaction is not None:
+                self._transaction.concurrent_keys.update(path[0] for path in paths)
         else:
-            raise ValueError(
-                f"Unsupported file type for remote file database for cog <{self.cog.qualified_name}>: {location}"
+            self._full_write_pending = True
+        if not self.write_stats.pending:
+            self._pending_since = time.perf_counter()
+        self.write_stats.requests += 1
+        self.write_stats.pending += 1
+        if self.database_write_delay is None:
+            await self.flush()
+        else:
+            self._schedule_flush(self.database_write_delay)
+
+    async def flush(self):
+        """ Persist any changes that are waiting to be written in the background, right away. """
+        # Changes made within a transaction are persisted upon commit.
+        if self._current_transaction() is not None:
+            return
+        async with self._write_lock:
+            await self._write_pending()
+
+    async def _write_pending(self):
+        """ Persist any pending changes. This is only called while holding the write lock. """
+        if not self.write_stats.pending:
+            return
+        dirty_paths = self._dirty_paths
+        full_write = self._full_write_pending
+        pending = self.write_stats.pending
+        pending_since = self._pending_since
+        self._dirty_paths = set()
+        self._full_write_pending = False
+        self.write_stats.pending = 0
+        if not self._database.persistent:
+            return
+        if not (dirty_paths or full_write):
+            return
+        started_at = time.perf_counter()
+        try:
+            if dirty_paths and (not full_write) and self._database.supports_changes:
+                changes = await self._collect_changes(dirty_paths)
+                await self._database.write_changes(changes)
+            else:
+                serialized = await self.serialize()
+                await self._database.write(serialized)
+        except:
+            # Keep everything around so that it's persisted next time.
+            self._dirty_paths.update(dirty_paths)
+            self._full_write_pending = self._full_write_pending or full_write
+            if not self.write_stats.pending:
+                self._pending_since = pending_since
+            self.write_stats.pending += pending
+            self.write_stats.failures += 1
+            raise
+        finished_at = time.perf_counter()
+        self.write_stats.record_write(
+            duration=finished_at - started_at, latency=finished_at - pending_since
+        )
+        # Pick up anything that other processes have written in the meantime.
+        if isinstance(self._database, FileDatabase) and self._database.locking:
+            await self._reload_if_changed(self._database)
+
+    def _schedule_flush(self, delay: float):
+        if self._flush_task is None:
+            self._flush_task = asyncio.get_running_loop().create_task(
+                self._flush_later(delay)
             )
+        _stores_with_pending_writes.add(self)
 
-    async def _make_local_file_database(self, location: str) -> FileDatabase:
-        # JSON
-        if location.endswith(".json"):
-            self._log.info(
-                f"Creating a JSON file database using the file at: {location}"
+    async def _flush_later(self, delay: float):
+        """ Wait for more changes to come in, and then persist all of them at once. """
+        await asyncio.sleep(delay)
+        self._flush_task = None
+        try:
+            await self.flush()
+        except:
+            self._log.exception("Failed to write changes in the background")
+        # Try again later if the write failed, or if more changes came in while writing.
+        if self.write_stats.pending:
+            self._schedule_flush(delay)
+        else:
+            _stores_with_pending_writes.discard(self)
+
+    @asynccontextmanager
+    async def transaction(self) -> AsyncIterator[None]:
+        """
+        Group every change made within the context into a single write, upon leaving it. If an
+        exception is raised within the context (or while committing), the changes made within it
+        are rolled back and nothing is persisted.
+
+        Only one transaction can be open on a store at once; others wait for it to finish. Nested
+        transactions on the same store are part of the outermost one. Changes made within a
+        transaction are still visible to other tasks before it is committed.
+
+        Other tasks can keep changing the store while a transaction is open. Rolling back only
+        restores the top-level entries that the transaction changed, so that changes made to other
+        entries in the meantime are kept. If anything was written while the transaction was open,
+        which may have included its changes, the restored entries are written again.
+        """
+        if self._current_transaction() is not None:
+            yield
+            return
+        async with self._transaction_lock:
+            transaction = StoreTransaction(
+                rollback_state=await self._begin_transaction()
             )
-            return JsonFileDatabase(self.bot, self.cog, path=location)
-        # YAML
-        elif location.endswith((".yaml", ".yml")):
-            self._log.info(
-                f"Creating a YAML file database using the file at: {location}"
+            self._transaction = transaction
+            writes = self.write_stats.writes
+            token = _active_transactions.set(
+                _active_transactions.get() + (transaction,)
             )
-            return YamlFileDatabase(self.bot, self.cog, path=location)
-        # Anything else is unsupported.
+            try:
+                yield
+            except:
+                _active_transactions.reset(token)
+                self._transaction = None
+                await self._roll_back(transaction, writes)
+                raise
+            _active_transactions.reset(token)
+            self._transaction = None
+            try:
+                if transaction.full_write:
+                    self._dirty_paths.update(transaction.dirty_paths)
+                    await self.dirty()
+                elif transaction.dirty_paths:
+                    await self.dirty(*transaction.dirty_paths)
+            except:
+                await self._roll_back(transaction, writes)
+                raise
+            await self._end_transaction(transaction, committed=True)
+
+    async def _roll_back(self, transaction: StoreTransaction, writes: int):
+        restored = await self._end_transaction(transaction, committed=False)
+        # Whatever was written since the transaction began may have included its changes.
+        if (not restored) or (self.write_stats.writes == writes):
+            return
+        try:
+            await self.dirty(*((key,) for key in restored))
+        except:
+            self._log.exception("Failed to write the entries restored by a rollback")
+
+    def _current_transaction(self) -> Optional[StoreTransaction]:
+        """ Return the transaction open on this store, if the current task is running within it. """
+        transaction = self._transaction
+        if (transaction is not None) and (transaction in _active_transactions.get()):
+            return transaction
+
+    async def _begin_transaction(self) -> Any:
+        """
+        Return whatever is needed to roll back the cache to how it is now, if the transaction being
+        started is not committed.
+
+        The default implementation pickles the entire serialized cache, from which rolling back
+        restores the top-level entries that were marked as dirty within the transaction; override
+        this (along with `_end_transaction()`) if changes can be rolled back more cheaply.
+        """
+        return pickle.dumps(await self.serialize(), protocol=pickle.HIGHEST_PROTOCOL)
+
+    async def _end_transaction(
+        self, transaction: StoreTransaction, committed: bool
+    ) -> Set[Hashable]:
+        """
+        Roll back the changes made within the transaction, unless it was committed, and return the
+        top-level keys of the entries that were restored.
+        """
+        if committed:
+            return set()
+        return await self._restore_snapshot(transaction, transaction.rollback_state)
+
+    async def _restore_snapshot(
+        self, transaction: StoreTransaction, snapshot_state: bytes
+    ) -> Set[Hashable]:
+        """
+        Restore the top-level entries that the transaction changed from a snapshot pickled by
+        `_begin_transaction()`, and return their keys.
+
+        If `dirty()` was called without any key paths within the transaction, then any entry may
+        have been changed in place; so every entry that differs from the snapshot is restored,
+        except for those that other tasks marked as dirty in the meantime.
+        """
+        snapshot: dict = pickle.loads(snapshot_state)
+        data = dict(await self.serialize())
+        if transaction.full_write:
+            keys = {
+                key
+                for key in set(snapshot).union(data)
+                if (key not in transaction.concurrent_keys)
+                and (snapshot.get(key, _MISSING) != data.get(key, _MISSING))
+            }
         else:
-            raise ValueError(
-                f"Unsupported file type for file database cog <{self.cog.qualified_name}>: {location}"
+            keys = {path[0] for path in transaction.dirty_paths}
+        if not keys:
+            return keys
+        for key in keys:
+            if key in snapshot:
+                data[key] = snapshot[key]
+            else:
+                data.pop(key, None)
+        self._cache = await self._build_cache(data)
+        return keys
+
+    async def _collect_changes(self, paths: Iterable[KeyPath]) -> List[Change]:
+        changes: List[Change] = []
+        for path in collapse_paths(paths):
+            try:
+                value = await self.serialize_path(path)
+                changes.append(SetChange(path=path, value=value))
+            except KeyError:
+                changes.append(DeleteChange(path=path))
+        return changes
+
+
+async def flush_pending_writes():
+    """ Flush every store that has changes waiting to be written in the background, concurrently. """
+    stores = list(_stores_with_pending_writes)
+    if not stores:
+        return
+    log.info(f"Flushing pending writes for {len(stores)} store(s)...")
+    results = await asyncio.gather(
+        *(store.flush() for store in stores), return_exceptions=True
+    )
+    for store, result in zip(stores, results):
+        if isinstance(result, Exception):
+            log.error(
+                f"Failed to flush pending writes for cog <{store.cog.qualified_name}>",
+                exc_info=result,
             )
 
-    async def dirty(self):
-        if self._database.persistent:
-            serialized = await self.serialize()
-            await self._database.write(serialized)
+
+async def save_warm_start_snapshots():
+    """ Save a warm-start snapshot for every store that keeps them, concurrently. """
+    stores = list(_warm_start_stores)
+    if not stores:
+        return
+    log.info(f"Saving warm-start snapshots for {len(stores)} store(s)...")
+    await asyncio.gather(*(store.save_warm_start() for store in stores))
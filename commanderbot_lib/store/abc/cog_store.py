@@ -1,6 +1,7 @@
 from abc import abstractmethod
 from typing import Generic, TypeVar
 
+from discord import Guild
 from discord.ext.commands import Bot, Cog
 
 from commanderbot_lib.database.abc.cog_database import CogDatabase
@@ -53,3 +54,9 @@ class CogStore(AsyncInitMixin, Generic[OptionsType, DatabaseType]):
 
     async def _after_database_init(self):
         """ Override this to do something after database initialization. """
+
+    async def load_guild(self, guild: Guild):
+        """
+        Override this to load any data for the given guild that wasn't loaded up front. This is
+        called before the cog's state for the guild is first initialized.
+        """
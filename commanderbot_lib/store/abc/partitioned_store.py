@@ -0,0 +1,282 @@
+import asyncio
+import pickle
+from abc import abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Generic, Hashable, Iterable, Optional, Set, TypeVar
+
+from discord.ext.commands import Bot, Cog
+
+from commanderbot_lib.database.abc.dict_database import DictDatabase
+from commanderbot_lib.database.changes import (
+    DeleteChange,
+    KeyPath,
+    SetChange,
+    collapse_paths,
+    lookup_path,
+)
+from commanderbot_lib.options.abc.options_with_database import OptionsWithDatabase
+from commanderbot_lib.store.abc.cached_store import CachedStore, StoreTransaction
+
+OptionsType = TypeVar("OptionsType", bound=OptionsWithDatabase)
+DatabaseType = TypeVar("DatabaseType", bound=DictDatabase)
+PartitionType = TypeVar("PartitionType")
+
+
+@dataclass
+class PartitionStats:
+    """
+    Counters of what a `PartitionedStore` has done with its partitions.
+
+    Attributes
+    -----------
+    hits: :class:`int`
+        The number of times a partition was already in memory when it was accessed.
+    misses: :class:`int`
+        The number of times a partition had to be loaded from the database.
+    evictions: :class:`int`
+        The number of partitions that have been dropped from memory to stay within budget.
+    flushes: :class:`int`
+        The number of evicted partitions whose changes had to be persisted first.
+    """
+
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    flushes: int = 0
+
+
+class PartitionedStore(
+    CachedStore[OptionsType, DatabaseType, "OrderedDict[Hashable, PartitionType]"],
+    Generic[OptionsType, DatabaseType, PartitionType],
+):
+    """
+    A variant of `CachedStore` that only keeps some of its data in memory, as a number of separate
+    partitions: one for each top-level key (usually a guild ID).
+
+    Nothing is read upon startup. Instead, each partition is read from the database the first time
+    it is accessed with `get_partition()`, and the least recently used partitions are evicted once
+    there are more than `partition_limit` of them, or once they add up to more than
+    `partition_memory_budget`. Any changes to a partition that have been marked with
+    `mark_dirty()` are persisted before it is evicted. Calling `dirty()` without any key paths
+    persists every partition that is currently in memory, including those that are evicted before
+    the write happens.
+
+    This requires a database that can both read and write individual keys, such as an in-memory,
+    SQLite, Redis or sharded file database.
+
+    Since a partition may be evicted whenever another one is loaded, references to a partition
+    should not be kept across awaits; look it up with `get_partition()` again instead. Changes
+    made to a partition after it has been evicted are lost.
+    """
+
+    # The maximum number of partitions to keep in memory at once, if any.
+    partition_limit: Optional[int] = 1000
+
+    # The maximum approximate size of the partitions to keep in memory at once, in bytes, if any.
+    # See `_estimate_partition_size()`.
+    partition_memory_budget: Optional[int] = None
+
+    def __init__(self, bot: Bot, cog: Cog, options: OptionsType):
+        super().__init__(bot, cog, options)
+        self.partition_stats: PartitionStats = PartitionStats()
+        self._cache: "OrderedDict[Hashable, PartitionType]" = OrderedDict()
+        self._partition_sizes: Dict[Hashable, int] = {}
+        # Partitions that are in the middle of being loaded or evicted.
+        self._pending: Dict[Hashable, asyncio.Future] = {}
+
+    @abstractmethod
+    async def _build_partition(
+        self, key: Hashable, data: Optional[Any]
+    ) -> PartitionType:
+        """
+        Return the partition for the given key, constructed from its data in the database, or from
+        `None` if there isn't any.
+        """
+
+    @abstractmethod
+    async def _serialize_partition(
+        self, key: Hashable, partition: PartitionType
+    ) -> Any:
+        """ Convert a partition into a JSON-serializable form. """
+
+    def _estimate_partition_size(self, key: Hashable, data: Optional[Any]) -> int:
+        """
+        Return the approximate size of a partition in memory, given its data in the database. Only
+        used if `partition_memory_budget` is set.
+
+        The default implementation uses the size of the pickled data, which is cheap to compute
+        and in proportion to the real size, but not equal to it.
+        """
+        return len(pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL))
+
+    @property
+    def resident_keys(self) -> Iterable[Hashable]:
+        """ The keys of the partitions currently in memory, from least to most recently used. """
+        return self._cache.keys()
+
+    @property
+    def resident_size(self) -> int:
+        """ The approximate size of the partitions currently in memory, in bytes. """
+        return sum(self._partition_sizes.values())
+
+    async def get_partition(self, key: Hashable) -> PartitionType:
+        """ Return the partition for the given key, loading it from the database if necessary. """
+        while True:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self.partition_stats.hits += 1
+                return self._cache[key]
+            # Wait for the partition to finish loading, or to finish being evicted.
+            pending = self._pending.get(key)
+            if pending is None:
+                break
+            await asyncio.shield(pending)
+        self.partition_stats.misses += 1
+        pending = asyncio.get_running_loop().create_future()
+        self._pending[key] = pending
+        try:
+            data = (await self._database.read_keys([key])).get(key)
+            partition = await self._build_partition(key, data)
+            self._cache[key] = partition
+            if self.partition_memory_budget is not None:
+                self._partition_sizes[key] = self._estimate_partition_size(key, data)
+        finally:
+            del self._pending[key]
+            pending.set_result(None)
+        await self._evict()
+        return partition
+
+    # @implements CachedStore
+    async def _build_cache(self, data: dict) -> "OrderedDict[Hashable, PartitionType]":
+        cache = OrderedDict()
+        for key, value in data.items():
+            cache[key] = await self._build_partition(key, value)
+        return cache
+
+    # @implements CachedStore
+    async def serialize(self) -> dict:
+        """ Convert the partitions that are currently in memory into a JSON-serializable form. """
+        return {
+            key: await self._serialize_partition(key, partition)
+            for key, partition in self._cache.items()
+        }
+
+    # @overrides CachedStore
+    async def serialize_path(self, path: KeyPath) -> Any:
+        key, *rest = path
+        serialized = await self._serialize_partition(key, self._cache[key])
+        return lookup_path(serialized, tuple(rest))
+
+    # @overrides CachedStore
+    async def _after_database_init(self):
+        if not (self._database.supports_key_reads and self._database.supports_changes):
+            raise ValueError(
+                f"Partitioned cog <{self.cog.qualified_name}> requires a database that can read and write individual keys, not a {type(self._database).__name__}"
+            )
+
+    # @overrides CachedStore
+    async def load_key(self, key: Hashable) -> bool:
+        await self.get_partition(key)
+        return True
+
+    # @overrides CachedStore
+    async def _write_pending(self):
+        # Never write the cache as a whole, since it only holds some of the data. Instead, write
+        # every partition that is currently in memory.
+        if self._full_write_pending:
+            self._full_write_pending = False
+            self._dirty_paths.update((key,) for key in self._cache)
+        await super()._write_pending()
+
+    # @overrides CachedStore
+    async def _end_transaction(
+        self, transaction: StoreTransaction, committed: bool
+    ) -> Set[Hashable]:
+        restored = await super()._end_transaction(transaction, committed)
+        # Rolling back drops any partitions that were loaded during the transaction, which are
+        # still in the database and mustn't be written as deleted.
+        for key in [key for key in self._partition_sizes if key not in self._cache]:
+            del self._partition_sizes[key]
+        await self._evict()
+        return {key for key in restored if key in self._cache}
+
+    async def delete_partition(self, key: Hashable):
+        """
+        Delete the partition for the given key, along with its data in the database. This is
+        persisted right away, so that the partition can't be loaded again in the meantime, even
+        within a transaction.
+        """
+        async with self._write_lock:
+            self._dirty_paths = {path for path in self._dirty_paths if path[0] != key}
+            self._cache.pop(key, None)
+            self._partition_sizes.pop(key, None)
+            pending = asyncio.get_running_loop().create_future()
+            self._pending[key] = pending
+            try:
+                if self._database.persistent:
+                    await self._database.write_changes([DeleteChange(path=(key,))])
+            finally:
+                del self._pending[key]
+                pending.set_result(None)
+
+    def _over_budget(self) -> bool:
+        if (self.partition_limit is not None) and (
+            len(self._cache) > self.partition_limit
+        ):
+            return True
+        if (self.partition_memory_budget is not None) and (
+            self.resident_size > self.partition_memory_budget
+        ):
+            return True
+        return False
+
+    async def _evict(self):
+        """ Evict the least recently used partitions until we're back within budget. """
+        # Partitions may have uncommitted changes during a transaction, so wait for it to end.
+        if self._transaction is not None:
+            return
+        async with self._write_lock:
+            # Always keep the most recently used partition, however large it is.
+            while self._over_budget() and (len(self._cache) > 1):
+                key = next(iter(self._cache))
+                if not await self._evict_partition(key):
+                    return
+
+    async def _evict_partition(self, key: Hashable) -> bool:
+        """ Persist any changes to the partition and then drop it, returning whether it worked. """
+        dirty_paths = {path for path in self._dirty_paths if path[0] == key}
+        self._dirty_paths.difference_update(dirty_paths)
+        # The partition may have been changed in place without being marked, if `dirty()` was
+        # called without any key paths since it was last written; so write all of it.
+        if self._full_write_pending:
+            dirty_paths = {(key,)}
+        partition = self._cache.pop(key)
+        # Make anyone who wants the partition in the meantime wait until it has been persisted.
+        pending = asyncio.get_running_loop().create_future()
+        self._pending[key] = pending
+        try:
+            if dirty_paths and self._database.persistent:
+                serialized = await self._serialize_partition(key, partition)
+                changes = []
+                for path in collapse_paths(dirty_paths):
+                    try:
+                        value = lookup_path(serialized, path[1:])
+                        changes.append(SetChange(path=path, value=value))
+                    except KeyError:
+                        changes.append(DeleteChange(path=path))
+                await self._database.write_changes(changes)
+                self.partition_stats.flushes += 1
+        except:
+            # Put it back, so that the changes are persisted next time.
+            self._log.exception(f"Failed to persist partition before evicting: {key}")
+            self._cache[key] = partition
+            self._cache.move_to_end(key, last=False)
+            self._dirty_paths.update(dirty_paths)
+            return False
+        finally:
+            del self._pending[key]
+            pending.set_result(None)
+        self._partition_sizes.pop(key, None)
+        self.partition_stats.evictions += 1
+        return True
@@ -6,14 +6,21 @@ from discord.ext.commands import Bot, Cog
 from commanderbot_lib.database.abc.dict_database import DictDatabase
 from commanderbot_lib.database.abc.versioned_file_database import (
     DataMigration,
+    RecordMigration,
     VersionedFileDatabase,
 )
-from commanderbot_lib.database.json_versioned_file_database import (
-    JsonVersionedFileDatabase,
+from commanderbot_lib.database.codec_versioned_file_database import (
+    CodecVersionedFileDatabase,
 )
-from commanderbot_lib.database.yaml_versioned_file_database import (
-    YamlVersionedFileDatabase,
+from commanderbot_lib.database.mixins.versioned_database_mixin import (
+    VersionedDatabaseMixin,
 )
+from commanderbot_lib.database.redis_dict_database import REDIS_LOCATION_PREFIX
+from commanderbot_lib.database.sqlite_dict_database import SQLITE_LOCATION_PREFIX
+from commanderbot_lib.database.versioned_sqlite_dict_database import (
+    VersionedSqliteDictDatabase,
+)
+from commanderbot_lib.executors import get_executor
 from commanderbot_lib.options.abc.options_with_database import OptionsWithDatabase
 from commanderbot_lib.store.abc.cached_store import CachedStore
 
@@ -30,10 +37,15 @@ class VersionedCachedStore(
     A variant of `CachedStore` that expects the underlying database to be versioned.
     """
 
+    # Whether to migrate top-level records (usually guilds) individually and lazily, using
+    # `_collect_record_migrations`, instead of migrating all of the data upon startup. Only file
+    # databases support this.
+    lazy_record_migrations: bool = False
+
     @abstractmethod
     def _collect_migrations(
         self,
-        database: VersionedFileDatabase,
+        database: VersionedDatabaseMixin,
         actual_version: int,
         expected_version: int,
     ) -> Iterable[DataMigration]:
@@ -47,45 +59,84 @@ class VersionedCachedStore(
     def data_version(self) -> int:
         """ Return the expected version of the underlying database. """
 
+    def _collect_record_migrations(
+        self,
+        database: VersionedFileDatabase,
+        actual_version: int,
+        expected_version: int,
+    ) -> Iterable[RecordMigration]:
+        """
+        Yield a series of `RecordMigration`, in order, to transform a single record from
+        `actual_version` into `expected_version`. Only used if `lazy_record_migrations` is set.
+        """
+        raise NotImplementedError(
+            f"{type(self).__name__} does not support lazy record migrations"
+        )
+
     # @implements CogStore
     async def _create_database(self) -> DatabaseType:
         db_options = self.options.database
-        # Currently, we only support VersionedFileDatabase.
-        if isinstance(db_options, str):
+        # If database is an SQLite location, use a versioned SQLite database.
+        if isinstance(db_options, str) and db_options.startswith(
+            SQLITE_LOCATION_PREFIX
+        ):
+            # SQLite databases always migrate all of their data upon startup.
+            if self.lazy_record_migrations:
+                raise ValueError(
+                    f"Lazy record migrations are not supported by SQLite databases for cog <{self.cog.qualified_name}>: {db_options}"
+                )
+            return await self._make_versioned_sqlite_database(
+                db_options[len(SQLITE_LOCATION_PREFIX) :]
+            )
+        # Redis databases aren't versioned (yet).
+        elif isinstance(db_options, str) and db_options.startswith(
+            REDIS_LOCATION_PREFIX
+        ):
+            raise ValueError(
+                f"Redis databases are not supported for versioned cog <{self.cog.qualified_name}>: {db_options}"
+            )
+        # If database is any other string, use a versioned file database.
+        elif isinstance(db_options, str):
             return await self._make_versioned_file_database(db_options)
         raise ValueError(
             f"Invalid database definition for cog <{self.cog.qualified_name}>: {db_options}"
         )
 
+    async def _make_versioned_sqlite_database(
+        self, path: str
+    ) -> VersionedSqliteDictDatabase:
+        self._log.info(
+            f"Creating a versioned SQLite database using the file at: {path}"
+        )
+        return VersionedSqliteDictDatabase(
+            self.bot,
+            self.cog,
+            path=path,
+            version=self.data_version,
+            migrate=self._collect_migrations,
+            durability=self.database_durability,
+            backups=self.database_backups,
+        )
+
     async def _make_versioned_file_database(
         self, location: str
     ) -> VersionedFileDatabase:
-        # JSON
-        if location.endswith(".json"):
-            self._log.info(
-                f"Creating a versioned JSON file database using the file at: {location}"
-            )
-            return JsonVersionedFileDatabase(
-                self.bot,
-                self.cog,
-                path=location,
-                version=self.data_version,
-                migrate=self._collect_migrations,
-            )
-        # YAML
-        elif location.endswith((".yaml", ".yml")):
-            self._log.info(
-                f"Creating a versioned YAML file database using the file at: {location}"
-            )
-            return YamlVersionedFileDatabase(
-                self.bot,
-                self.cog,
-                path=location,
-                version=self.data_version,
-                migrate=self._collect_migrations,
-            )
-        # Anything else is unsupported.
-        else:
-            raise ValueError(
-                f"Unsupported file type for versioned file database cog <{self.cog.qualified_name}>: {location}"
-            )
+        codec = self._get_codec(location, "versioned file database")
+        self._log.info(
+            f"Creating a versioned {codec.name} file database using the file at: {location}"
+        )
+        return CodecVersionedFileDatabase(
+            self.bot,
+            self.cog,
+            codec=codec,
+            path=location,
+            version=self.data_version,
+            migrate=self._collect_migrations,
+            executor=get_executor(self.database_executor),
+            durability=self.database_durability,
+            backups=self.database_backups,
+            migrate_record=(
+                self._collect_record_migrations if self.lazy_record_migrations else None
+            ),
+            locking=self.database_locking,
+        )
@@ -0,0 +1,169 @@
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Iterator, List, Mapping, Tuple
+
+from commanderbot_lib.database.changes import KeyPath
+
+
+class _AnyKey:
+    def __repr__(self) -> str:
+        return "ANY_KEY"
+
+
+# Matches any key at its position in a pattern of entry paths.
+ANY_KEY = _AnyKey()
+
+
+def matches_pattern(pattern: KeyPath, path: KeyPath) -> bool:
+    """ Whether the given path leads to (or towards) the paths matching `pattern`. """
+    return all((part is ANY_KEY) or (part == key) for part, key in zip(pattern, path))
+
+
+def iter_matching(
+    pattern: KeyPath, value: Any, path: KeyPath = ()
+) -> Iterator[Tuple[KeyPath, Any]]:
+    """
+    Yield the path and value of every entry within `value`, which is at `path`, whose path matches
+    `pattern`.
+    """
+    if len(path) >= len(pattern):
+        yield path, value
+        return
+    if not isinstance(value, Mapping):
+        return
+    part = pattern[len(path)]
+    if part is ANY_KEY:
+        for key, child in value.items():
+            yield from iter_matching(pattern, child, path + (key,))
+    elif part in value:
+        yield from iter_matching(pattern, value[part], path + (part,))
+
+
+class PathTree:
+    """
+    A set of key paths that are all the same length, nested by key, so that the paths under a
+    prefix (such as those of a single guild) can be found without looking at any others.
+    """
+
+    def __init__(self, depth: int):
+        self.depth: int = depth
+        # Nested by every key but the last, which maps to the path itself.
+        self._root: Dict[Any, Any] = {}
+
+    def add(self, path: KeyPath):
+        node = self._root
+        for key in path[:-1]:
+            child = node.get(key)
+            if child is None:
+                child = node[key] = {}
+            node = child
+        node[path[-1]] = path
+
+    def discard(self, path: KeyPath):
+        nodes = [self._root]
+        for key in path[:-1]:
+            node = nodes[-1].get(key)
+            if node is None:
+                return
+            nodes.append(node)
+        nodes[-1].pop(path[-1], None)
+        # Prune the nodes that are left empty.
+        for i in range(len(nodes) - 1, 0, -1):
+            if nodes[i]:
+                break
+            del nodes[i - 1][path[i - 1]]
+
+    def under(self, prefix: KeyPath) -> List[KeyPath]:
+        """ Return every path at or under `prefix`. """
+        prefix = prefix[: self.depth]
+        node = self._root
+        for key in prefix:
+            if key not in node:
+                return []
+            node = node[key]
+        if len(prefix) == self.depth:
+            return [prefix]
+        paths: List[KeyPath] = []
+        self._collect(node, self.depth - len(prefix), paths)
+        return paths
+
+    def _collect(self, node: Dict[Any, Any], depth: int, paths: List[KeyPath]):
+        if depth == 1:
+            paths.extend(node.values())
+            return
+        for child in node.values():
+            self._collect(child, depth - 1, paths)
+
+    def clear(self):
+        self._root.clear()
+
+
+class EntryTable(ABC):
+    """
+    Something that is kept up to date with the entries of a store whose paths match a pattern,
+    such as `(ANY_KEY, "entries", ANY_KEY)` for every value under `entries` in every guild.
+
+    The paths of the entries in the table are kept in a `PathTree`, so that the entries under a
+    prefix can be removed in time proportional to how many there are, rather than to the size of
+    the whole table.
+
+    Attributes
+    -----------
+    entries: :class:`KeyPath`
+        The pattern of entry paths, where `ANY_KEY` matches any key.
+    """
+
+    def __init__(self, entries: KeyPath):
+        if not entries:
+            raise ValueError("An entry table must have an entry path")
+        self.entries: KeyPath = entries
+        # Subclasses keep this up to date with the paths of the entries they hold.
+        self._paths: PathTree = PathTree(len(entries))
+
+    @abstractmethod
+    def add(self, path: KeyPath, entry: Any):
+        """ Add the entry at `path`, replacing anything that was there before. """
+
+    @abstractmethod
+    def remove(self, path: KeyPath):
+        """ Remove the entry at `path`, if it's there. """
+
+    def remove_under(self, prefix: KeyPath):
+        """ Remove every entry at or under `prefix`. """
+        for path in self._paths.under(prefix):
+            self.remove(path)
+
+    @abstractmethod
+    def clear(self):
+        """ Remove every entry. """
+
+    def matches(self, path: KeyPath) -> bool:
+        """ Whether the given path leads to (or towards) matching entries. """
+        return matches_pattern(self.entries, path)
+
+    def iter_entries(self, value: Any, path: KeyPath) -> Iterator[Tuple[KeyPath, Any]]:
+        """ Yield the path and value of every matching entry within `value`, which is at `path`. """
+        return iter_matching(self.entries, value, path)
+
+    def add_all(self, value: Any, path: KeyPath = ()):
+        """ Add every matching entry within `value`, which is at `path`. """
+        for entry_path, entry in self.iter_entries(value, path):
+            self.add(entry_path, entry)
+
+    def update(self, root: Mapping, path: KeyPath):
+        """ Update whatever entries may have been affected by a change at `path`. """
+        if not self.matches(path):
+            return
+        # A change within an entry only affects that entry, whereas a change above the entries
+        # may have replaced any of the entries underneath it.
+        size = len(self.entries)
+        prefix = path[:size]
+        if len(prefix) == size:
+            self.remove(prefix)
+        else:
+            self.remove_under(prefix)
+        value: Any = root
+        for key in prefix:
+            if not (isinstance(value, Mapping) and (key in value)):
+                return
+            value = value[key]
+        self.add_all(value, prefix)
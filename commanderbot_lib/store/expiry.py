@@ -0,0 +1,116 @@
+import heapq
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Mapping, Optional, Tuple
+
+from commanderbot_lib.database.changes import KeyPath
+from commanderbot_lib.store.entry_table import EntryTable
+
+# Called with the path and value of each entry that has expired.
+ExpiryCallback = Callable[[KeyPath, Any], Awaitable[None]]
+
+
+@dataclass(frozen=True)
+class ExpiryRule:
+    """
+    The declaration of entries in a store that expire, such as
+    `ExpiryRule(entries=(ANY_KEY, "mutes", ANY_KEY), field="expires_at")`.
+
+    Attributes
+    -----------
+    entries: :class:`KeyPath`
+        The key path of the entries that expire, where `ANY_KEY` matches any key.
+    field: :class:`Optional[str]`
+        The field of each entry that holds the time it expires at, as a Unix timestamp. Entries
+        without the field don't expire. If `None`, each entry is the timestamp itself, such as for
+        a mapping of cooldowns.
+    """
+
+    entries: KeyPath
+    field: Optional[str] = "expires_at"
+
+    def expires_at(self, entry: Any) -> Optional[float]:
+        """ Return when the given entry expires, if ever. """
+        if self.field is None:
+            value = entry
+        elif isinstance(entry, Mapping):
+            value = entry.get(self.field)
+        else:
+            value = None
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return float(value)
+
+
+class ExpiryTable(EntryTable):
+    """
+    When the entries of an `ExpiryRule` expire, kept in a min-heap so that the next one to expire
+    can always be found in constant time.
+
+    Entries that are changed or removed aren't taken out of the heap right away; their old heap
+    items are skipped once they reach the top instead, and cleared out whenever they start to
+    outnumber the live ones.
+    """
+
+    def __init__(self, rule: ExpiryRule):
+        super().__init__(rule.entries)
+        self.rule: ExpiryRule = rule
+        self._heap: List[Tuple[float, int, KeyPath]] = []
+        self._times: Dict[KeyPath, float] = {}
+        self._counter: int = 0
+
+    def __len__(self) -> int:
+        """ The number of entries that will expire. """
+        return len(self._times)
+
+    # @implements EntryTable
+    def add(self, path: KeyPath, entry: Any):
+        expires_at = self.rule.expires_at(entry)
+        if expires_at is None:
+            self.remove(path)
+        elif self._times.get(path) != expires_at:
+            self._times[path] = expires_at
+            self._paths.add(path)
+            # The counter breaks ties, so that paths never have to be compared.
+            self._counter += 1
+            heapq.heappush(self._heap, (expires_at, self._counter, path))
+            self._compact()
+
+    # @implements EntryTable
+    def remove(self, path: KeyPath):
+        if self._times.pop(path, None) is not None:
+            self._paths.discard(path)
+
+    # @implements EntryTable
+    def clear(self):
+        self._heap.clear()
+        self._times.clear()
+        self._paths.clear()
+
+    def next_expiry(self) -> Optional[float]:
+        """ Return when the next entry expires, if any will. """
+        self._skip_stale()
+        if self._heap:
+            return self._heap[0][0]
+
+    def pop_expired(self, now: Optional[float] = None) -> List[KeyPath]:
+        """ Remove and return the paths of every entry that has expired by `now`. """
+        now = time.time() if now is None else now
+        expired = []
+        while (expires_at := self.next_expiry()) is not None and expires_at <= now:
+            _, _, path = heapq.heappop(self._heap)
+            del self._times[path]
+            self._paths.discard(path)
+            expired.append(path)
+        return expired
+
+    def _skip_stale(self):
+        heap = self._heap
+        while heap and self._times.get(heap[0][2]) != heap[0][0]:
+            heapq.heappop(heap)
+
+    def _compact(self):
+        if len(self._heap) > 2 * len(self._times) + 64:
+            self._heap = [
+                item for item in self._heap if self._times.get(item[2]) == item[0]
+            ]
+            heapq.heapify(self._heap)
@@ -0,0 +1,154 @@
+import heapq
+from dataclasses import dataclass, field
+from itertools import islice
+from typing import Any, Callable, Iterator, List, Optional, Tuple
+
+from commanderbot_lib.database.changes import KeyPath
+
+# The path and value of an entry matched by a query.
+QueryResult = Tuple[KeyPath, Any]
+
+# Yields the cursor, path and value of each entry, optionally resuming after a given cursor.
+QuerySource = Callable[[Optional[Any]], Iterator[Tuple[Any, KeyPath, Any]]]
+
+# Either returns the (possibly mapped) value of an entry, or `_SKIP` to leave it out.
+_QueryStep = Callable[[KeyPath, Any], Any]
+
+_SKIP = object()
+
+
+@dataclass
+class QueryPage:
+    """
+    A page of results from `Query.page()`.
+
+    Attributes
+    -----------
+    results: :class:`List[QueryResult]`
+        The path and value of each entry on the page.
+    cursor: :class:`Optional[Any]`
+        The cursor to pass to `Query.page()` for the next page, or `None` if this is the last one.
+    """
+
+    results: List[QueryResult] = field(default_factory=list)
+    cursor: Optional[Any] = None
+
+
+class Query:
+    """
+    A lazy query over the entries of a store, such as those returned by `SimpleDictStore.query()`
+    and `SimpleDictStore.query_index()`.
+
+    Each of `where()`, `under()` and `map()` returns a new query, and nothing is evaluated until
+    the query is iterated, which yields the path and value of each result in turn. Results are
+    read straight from the store as they're yielded, so the store shouldn't be changed (nor
+    awaited on) until the iteration is done; `page()` can be used to resume from where a previous
+    page left off instead.
+
+    Attributes
+    -----------
+    ordered: :class:`bool`
+        Whether the results come in a well-defined order, in which case they can be paginated with
+        `page()`.
+    """
+
+    def __init__(
+        self,
+        source: QuerySource,
+        ordered: bool = False,
+        steps: Tuple[_QueryStep, ...] = (),
+    ):
+        self._source: QuerySource = source
+        self._steps: Tuple[_QueryStep, ...] = steps
+        self.ordered: bool = ordered
+
+    def __iter__(self) -> Iterator[QueryResult]:
+        for _, path, value in self._run(None):
+            yield path, value
+
+    def _then(self, step: _QueryStep) -> "Query":
+        return Query(self._source, self.ordered, self._steps + (step,))
+
+    def _run(self, after: Optional[Any]) -> Iterator[Tuple[Any, KeyPath, Any]]:
+        steps = self._steps
+        for cursor, path, value in self._source(after):
+            for step in steps:
+                value = step(path, value)
+                if value is _SKIP:
+                    break
+            else:
+                yield cursor, path, value
+
+    def where(self, predicate: Callable[[Any], bool]) -> "Query":
+        """ Only keep the entries for which `predicate` returns true. """
+        return self._then(lambda path, value: value if predicate(value) else _SKIP)
+
+    def under(self, prefix: KeyPath) -> "Query":
+        """ Only keep the entries at or under `prefix`, such as those of a single guild. """
+        size = len(prefix)
+        return self._then(lambda path, value: value if path[:size] == prefix else _SKIP)
+
+    def map(self, function: Callable[[Any], Any]) -> "Query":
+        """ Replace the value of each entry with what `function` returns for it. """
+        return self._then(lambda path, value: function(value))
+
+    def values(self) -> Iterator[Any]:
+        """ Yield only the value of each result. """
+        for _, value in self:
+            yield value
+
+    def first(self, default: Optional[QueryResult] = None) -> Optional[QueryResult]:
+        """ Return the first result, or `default` if there aren't any. """
+        return next(iter(self), default)
+
+    def take(self, count: int) -> List[QueryResult]:
+        """ Return up to `count` results, without evaluating the rest. """
+        return list(islice(self, count))
+
+    def count(self) -> int:
+        """ Return the number of results. """
+        return sum(1 for _ in self)
+
+    def top(
+        self, count: int, key: Optional[Callable[[Any], Any]] = None
+    ) -> List[QueryResult]:
+        """
+        Return the `count` results with the largest values (or the largest `key` of their values),
+        largest first. Only `count` results are kept at any time, rather than all of them.
+        """
+        return heapq.nlargest(count, self, key=self._result_key(key))
+
+    def bottom(
+        self, count: int, key: Optional[Callable[[Any], Any]] = None
+    ) -> List[QueryResult]:
+        """ Like `top()`, but for the smallest values, smallest first. """
+        return heapq.nsmallest(count, self, key=self._result_key(key))
+
+    def _result_key(
+        self, key: Optional[Callable[[Any], Any]]
+    ) -> Callable[[QueryResult], Any]:
+        if key is None:
+            return lambda result: result[1]
+        return lambda result: key(result[1])
+
+    def page(self, limit: int, after: Optional[Any] = None) -> QueryPage:
+        """
+        Return up to `limit` results following the given cursor, or from the start if there isn't
+        one, along with the cursor of the next page. Only ordered queries can be paginated.
+
+        Cursors stay valid as the store changes: the next page starts after where the previous
+        one ended in the query's order, even if that entry has since been changed or removed.
+        """
+        if not self.ordered:
+            raise ValueError(
+                "Only ordered queries can be paginated, such as those of an ordered index"
+            )
+        page = QueryPage()
+        last_cursor = after
+        for cursor, path, value in self._run(after):
+            if len(page.results) == limit:
+                page.cursor = last_cursor
+                break
+            page.results.append((path, value))
+            last_cursor = cursor
+        return page
@@ -0,0 +1,304 @@
+from abc import ABCMeta
+from dataclasses import dataclass
+from typing import (
+    Any,
+    ClassVar,
+    Dict,
+    Iterator,
+    Mapping,
+    MutableMapping,
+    Optional,
+    Tuple,
+    Type,
+    Union,
+    get_args,
+    get_origin,
+)
+
+from commanderbot_lib.database.changes import KeyPath
+from commanderbot_lib.store.entry_table import ANY_KEY, matches_pattern
+
+# Values that can't contain records, which `to_data()` can return right away.
+_PLAIN_TYPES = frozenset((str, int, float, bool, type(None)))
+
+
+def _record_type(field_type: Any) -> Optional[Type["Record"]]:
+    """ Return the type of record that a field holds, if any, including an optional one. """
+    if get_origin(field_type) is Union:
+        args = [arg for arg in get_args(field_type) if arg is not type(None)]
+        if len(args) == 1:
+            field_type = args[0]
+    if isinstance(field_type, type) and issubclass(field_type, Record):
+        return field_type
+
+
+class RecordMeta(ABCMeta):
+    """
+    Turns the annotated fields of a `Record` subclass into slots. Default values are kept aside in
+    `_field_defaults`, since a slot can't share its name with a class attribute.
+    """
+
+    # The name and slot descriptor of each field, set on every class that this creates.
+    _field_slots: Tuple[Tuple[str, Any], ...]
+
+    def __new__(mcs, name: str, bases: Tuple[type, ...], namespace: dict, **kwargs):
+        # The base `Record` declares its own slots.
+        if "__slots__" in namespace:
+            return super().__new__(mcs, name, bases, namespace, **kwargs)
+        field_types: Dict[str, Any] = {}
+        field_defaults: Dict[str, Any] = {}
+        for base in reversed(bases):
+            field_types.update(getattr(base, "_field_types", {}))
+            field_defaults.update(getattr(base, "_field_defaults", {}))
+        slots = []
+        for field, field_type in namespace.get("__annotations__", {}).items():
+            if field.startswith("_") or (get_origin(field_type) is ClassVar):
+                continue
+            if field not in field_types:
+                slots.append(field)
+            field_types[field] = field_type
+            if field in namespace:
+                default = namespace.pop(field)
+                if isinstance(default, (list, dict, set)):
+                    raise ValueError(
+                        f"Mutable default {type(default).__name__} for field {name}.{field} is not allowed"
+                    )
+                field_defaults[field] = default
+        namespace["__slots__"] = tuple(slots)
+        namespace["_field_types"] = field_types
+        namespace["_field_defaults"] = field_defaults
+        namespace["_record_fields"] = {
+            field: record_type
+            for field, field_type in field_types.items()
+            if (record_type := _record_type(field_type)) is not None
+        }
+        cls = super().__new__(mcs, name, bases, namespace, **kwargs)
+        # Reading the slots directly skips `__getattr__`, which would fill in defaults.
+        cls._field_slots = tuple((field, getattr(cls, field)) for field in field_types)
+        return cls
+
+
+class Record(MutableMapping, metaclass=RecordMeta):
+    """
+    A compact alternative to a `dict` for the small, uniform entries that make up most of a store,
+    such as:
+
+    ```
+    class Mute(Record):
+        user_id: int
+        reason: str = ""
+        expires_at: Optional[float] = None
+    ```
+
+    Each annotated field is kept in a slot instead of a per-instance `dict`, which takes a fraction
+    of the memory. Fields can be accessed as attributes or as items, and records behave like any
+    other mapping, so that indexes, expiry and key paths work with them as they do with `dict`.
+
+    A field that is missing from the data is left out of the record, so that converting the
+    record back into a `dict` with `to_data()` gives back exactly what went in; reading it as an
+    attribute returns its default instead, if it has one. Keys that aren't fields are kept in a
+    separate `dict`, which is only created if there are any.
+
+    Field types aren't checked, except that a field whose type is itself a `Record` subclass (or an
+    optional one) is built from a mapping.
+    """
+
+    __slots__ = ("_extra",)
+
+    # The type of each field, by name, including those of base records.
+    _field_types: ClassVar[Dict[str, Any]] = {}
+
+    # The default value of each field that has one, by name.
+    _field_defaults: ClassVar[Dict[str, Any]] = {}
+
+    # The type of each field whose type is itself a `Record` subclass, by name.
+    _record_fields: ClassVar[Dict[str, Type["Record"]]] = {}
+
+    # The name and slot descriptor of each field.
+    _field_slots: ClassVar[Tuple[Tuple[str, Any], ...]] = ()
+
+    def __init__(self, **values: Any):
+        self._extra: Optional[Dict[Any, Any]] = None
+        for key, value in values.items():
+            self[key] = value
+
+    @classmethod
+    def from_data(cls, data: Mapping) -> "Record":
+        """ Build a record from a mapping of its fields, such as a `dict` from the database. """
+        record = cls.__new__(cls)
+        record._extra = None
+        field_types = cls._field_types
+        record_fields = cls._record_fields
+        for key, value in data.items():
+            if key not in field_types:
+                if record._extra is None:
+                    record._extra = {}
+                record._extra[key] = value
+                continue
+            if (
+                (key in record_fields)
+                and isinstance(value, Mapping)
+                and not isinstance(value, Record)
+            ):
+                value = record_fields[key].from_data(value)
+            setattr(record, key, value)
+        return record
+
+    def to_data(self) -> dict:
+        """ Convert the record back into a plain `dict`, along with any records within it. """
+        data = {}
+        for field, slot in self._field_slots:
+            try:
+                value = slot.__get__(self)
+            except AttributeError:
+                continue
+            data[field] = value if type(value) in _PLAIN_TYPES else to_data(value)
+        if self._extra:
+            for key, value in self._extra.items():
+                data[key] = to_data(value)
+        return data
+
+    def _items(self) -> Iterator[Tuple[Any, Any]]:
+        for field, slot in self._field_slots:
+            try:
+                yield field, slot.__get__(self)
+            except AttributeError:
+                pass
+        if self._extra:
+            yield from self._extra.items()
+
+    def __getattr__(self, name: str) -> Any:
+        # Only called for fields that aren't set, which read as their default.
+        try:
+            return type(self)._field_defaults[name]
+        except KeyError:
+            raise AttributeError(
+                f"{type(self).__name__} has no value for: {name}"
+            ) from None
+
+    # @implements MutableMapping
+    def __getitem__(self, key: Any) -> Any:
+        if isinstance(key, str) and (key in self._field_types):
+            try:
+                return object.__getattribute__(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        if self._extra is None:
+            raise KeyError(key)
+        return self._extra[key]
+
+    # @implements MutableMapping
+    def __setitem__(self, key: Any, value: Any):
+        if isinstance(key, str) and (key in self._field_types):
+            setattr(self, key, value)
+            return
+        if self._extra is None:
+            self._extra = {}
+        self._extra[key] = value
+
+    # @implements MutableMapping
+    def __delitem__(self, key: Any):
+        if isinstance(key, str) and (key in self._field_types):
+            try:
+                object.__delattr__(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+            return
+        if self._extra is None:
+            raise KeyError(key)
+        del self._extra[key]
+        if not self._extra:
+            self._extra = None
+
+    # @implements MutableMapping
+    def __iter__(self) -> Iterator[Any]:
+        for key, _ in self._items():
+            yield key
+
+    # @implements MutableMapping
+    def __len__(self) -> int:
+        return sum(1 for _ in self._items())
+
+    def __repr__(self) -> str:
+        values = ", ".join(f"{key}={value!r}" for key, value in self._items())
+        return f"{type(self).__name__}({values})"
+
+    def __getstate__(self) -> Tuple[Dict[str, Any], Optional[Dict[Any, Any]]]:
+        # The default state of a slotted object would fill in the defaults of missing fields.
+        fields = {
+            key: value for key, value in self._items() if key in self._field_types
+        }
+        return fields, self._extra
+
+    def __setstate__(self, state: Tuple[Dict[str, Any], Optional[Dict[Any, Any]]]):
+        fields, self._extra = state
+        for key, value in fields.items():
+            setattr(self, key, value)
+
+
+def to_data(value: Any) -> Any:
+    """
+    Return `value` with every record within it converted back into a plain `dict`. Any mappings
+    and lists containing records are copied, rather than changed in-place.
+    """
+    value_type = type(value)
+    if value_type in _PLAIN_TYPES:
+        return value
+    if value_type is dict:
+        return {key: to_data(child) for key, child in value.items()}
+    # Checking the type's metaclass is much quicker than an `isinstance()` check against an ABC.
+    if isinstance(value_type, RecordMeta):
+        return value.to_data()
+    if isinstance(value, Mapping):
+        return {key: to_data(child) for key, child in value.items()}
+    if isinstance(value, list):
+        return [to_data(child) for child in value]
+    return value
+
+
+@dataclass(frozen=True)
+class RecordSchema:
+    """
+    The declaration of entries in a store that are kept as records instead of `dict`, such as
+    `RecordSchema(entries=(ANY_KEY, "mutes", ANY_KEY), record_type=Mute)`.
+
+    Attributes
+    -----------
+    entries: :class:`KeyPath`
+        The key path of the entries to keep as records, where `ANY_KEY` matches any key.
+    record_type: :class:`Type[Record]`
+        The type of record to build from each entry.
+    """
+
+    entries: KeyPath
+    record_type: Type[Record]
+
+    def __post_init__(self):
+        if not self.entries:
+            raise ValueError("A record schema must have an entry path")
+
+    def applies_to(self, path: KeyPath) -> bool:
+        """ Whether a value at `path` is, or may contain, entries to keep as records. """
+        return (len(path) <= len(self.entries)) and matches_pattern(self.entries, path)
+
+    def build(self, value: Any, path: KeyPath = ()) -> Any:
+        """
+        Return `value`, which is at `path`, with every matching entry within it converted into a
+        record. Mappings containing matching entries are changed in-place.
+        """
+        if len(path) >= len(self.entries):
+            if isinstance(value, Mapping) and not isinstance(value, Record):
+                return self.record_type.from_data(value)
+            return value
+        if not isinstance(value, MutableMapping):
+            return value
+        part = self.entries[len(path)]
+        if part is ANY_KEY:
+            keys = list(value)
+        elif part in value:
+            keys = [part]
+        else:
+            keys = []
+        for key in keys:
+            value[key] = self.build(value[key], path + (key,))
+        return value
@@ -0,0 +1,205 @@
+from bisect import bisect_left, bisect_right, insort
+from dataclasses import dataclass
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Set,
+    Tuple,
+)
+
+from commanderbot_lib.database.changes import KeyPath
+from commanderbot_lib.store.entry_table import ANY_KEY, EntryTable
+
+
+@dataclass(frozen=True)
+class SecondaryIndex:
+    """
+    The declaration of a secondary index over the entries of a store, such as
+    `SecondaryIndex("by_owner", entries=(ANY_KEY, "entries", ANY_KEY), field="owner")`.
+
+    Attributes
+    -----------
+    name: :class:`str`
+        The name to look the index up by.
+    entries: :class:`KeyPath`
+        The key path of the entries to index, where `ANY_KEY` matches any key. For example,
+        `(ANY_KEY, "entries", ANY_KEY)` indexes every value under `entries` in every guild.
+    field: :class:`Optional[str]`
+        The field of each entry to index it by. Entries without the field aren't indexed.
+    key: :class:`Optional[Callable[[Any], Any]]`
+        A function that computes what to index each entry by, instead of `field`. Entries for
+        which it returns `None` aren't indexed.
+    multi: :class:`bool`
+        Whether the field or key is a collection of values (such as tags), each of which the
+        entry should be indexed by.
+    ordered: :class:`bool`
+        Whether to keep the indexed entries sorted by value, so that the index supports range
+        queries and ordered queries. The values must then be comparable with each other; entries
+        with the same value are sorted by path.
+    """
+
+    name: str
+    entries: KeyPath
+    field: Optional[str] = None
+    key: Optional[Callable[[Any], Any]] = None
+    multi: bool = False
+    ordered: bool = False
+
+    def __post_init__(self):
+        if (self.field is None) == (self.key is None):
+            raise ValueError(
+                f"Secondary index {self.name} must have exactly one of a field or a key"
+            )
+
+    def values_for(self, entry: Any) -> Tuple[Any, ...]:
+        """ Return the values to index the given entry by. """
+        if self.key is not None:
+            value = self.key(entry)
+        elif isinstance(entry, Mapping):
+            value = entry.get(self.field)
+        else:
+            value = None
+        if value is None:
+            return ()
+        if self.multi:
+            return tuple(set(value))
+        return (value,)
+
+
+class IndexTable(EntryTable):
+    """
+    The contents of a `SecondaryIndex`: the paths of the entries indexed by each value.
+
+    Looking up a single value takes constant time. If the index is ordered, every entry is also
+    kept in a list sorted by value and path, which is updated as entries change, so that a range of
+    values (or the entries after a cursor) can be found with a binary search and then walked in
+    either direction without sorting anything.
+    """
+
+    def __init__(self, index: SecondaryIndex):
+        super().__init__(index.entries)
+        self.index: SecondaryIndex = index
+        self._paths_by_value: Dict[Any, Set[KeyPath]] = {}
+        self._values_by_path: Dict[KeyPath, Tuple[Any, ...]] = {}
+        self._sorted_entries: List[Tuple[Any, KeyPath]] = []
+
+    def __len__(self) -> int:
+        """ The number of entries in the index. """
+        return len(self._values_by_path)
+
+    # @implements EntryTable
+    def add(self, path: KeyPath, entry: Any):
+        """ Index the entry at `path`, replacing anything it was indexed by before. """
+        values = self._add_unsorted(path, entry)
+        if self.index.ordered:
+            for value in values:
+                insort(self._sorted_entries, (value, path))
+
+    # @overrides EntryTable
+    def add_all(self, value: Any, path: KeyPath = ()):
+        """ Index every matching entry within `value`, which is at `path`. """
+        if not self.index.ordered:
+            super().add_all(value, path)
+            return
+        added: List[Tuple[Any, KeyPath]] = []
+        for entry_path, entry in self.iter_entries(value, path):
+            for entry_value in self._add_unsorted(entry_path, entry):
+                added.append((entry_value, entry_path))
+        entries = self._sorted_entries
+        # Inserting each entry moves everything after it, which adds up when building the index;
+        # merging a sorted batch into the list only takes a single pass over it.
+        if len(added) > len(entries) // 8:
+            added.sort()
+            entries.extend(added)
+            entries.sort()
+        else:
+            for item in added:
+                insort(entries, item)
+
+    def _add_unsorted(self, path: KeyPath, entry: Any) -> Tuple[Any, ...]:
+        """ Index the entry at `path` by value, leaving the sorted entries to the caller. """
+        self.remove(path)
+        values = self.index.values_for(entry)
+        if not values:
+            return ()
+        self._values_by_path[path] = values
+        self._paths.add(path)
+        for value in values:
+            paths = self._paths_by_value.get(value)
+            if paths is None:
+                paths = self._paths_by_value[value] = set()
+            paths.add(path)
+        return values
+
+    # @implements EntryTable
+    def remove(self, path: KeyPath):
+        """ Remove the entry at `path` from the index, if it's there. """
+        values = self._values_by_path.pop(path, None)
+        if values is None:
+            return
+        self._paths.discard(path)
+        for value in values:
+            paths = self._paths_by_value[value]
+            paths.discard(path)
+            if not paths:
+                del self._paths_by_value[value]
+            if self.index.ordered:
+                entries = self._sorted_entries
+                del entries[bisect_left(entries, (value, path))]
+
+    # @implements EntryTable
+    def clear(self):
+        self._paths_by_value.clear()
+        self._values_by_path.clear()
+        self._sorted_entries.clear()
+        self._paths.clear()
+
+    def find(self, value: Any) -> Set[KeyPath]:
+        """ Return the paths of the entries indexed by `value`. """
+        return set(self._paths_by_value.get(value, ()))
+
+    def find_range(
+        self, start: Optional[Any] = None, stop: Optional[Any] = None
+    ) -> Iterable[KeyPath]:
+        """
+        Yield the paths of the entries indexed by values from `start` (inclusive) to `stop`
+        (exclusive), in order of their values. Either end can be left open with `None`.
+        """
+        for _, path in self.iter_ordered(start, stop):
+            yield path
+
+    def iter_ordered(
+        self,
+        start: Optional[Any] = None,
+        stop: Optional[Any] = None,
+        reverse: bool = False,
+        after: Optional[Tuple[Any, KeyPath]] = None,
+    ) -> Iterator[Tuple[Any, KeyPath]]:
+        """
+        Yield the value and path of each entry indexed by values from `start` (inclusive) to
+        `stop` (exclusive), in order of their values and then their paths, or in reverse. If
+        `after` is given, only the entries that come after that value and path are yielded.
+
+        The entries are read from the index as they're yielded, so the store shouldn't be changed
+        until the iteration is done.
+        """
+        if not self.index.ordered:
+            raise ValueError(
+                f"Secondary index {self.index.name} is not ordered, and does not support range queries"
+            )
+        entries = self._sorted_entries
+        # A 1-tuple sorts before every entry with the same value.
+        lo = 0 if start is None else bisect_left(entries, (start,))
+        hi = len(entries) if stop is None else bisect_left(entries, (stop,))
+        if (after is not None) and reverse:
+            hi = min(hi, bisect_left(entries, after))
+        elif after is not None:
+            lo = max(lo, bisect_right(entries, after))
+        for i in range(hi - 1, lo - 1, -1) if reverse else range(lo, hi):
+            yield entries[i]
@@ -1,13 +1,430 @@
+import asyncio
+import copy
+import time
+from typing import (
+    Any,
+    Dict,
+    Hashable,
+    Iterable,
+    Iterator,
+    List,
+    MutableMapping,
+    Optional,
+    Set,
+    Tuple,
+)
+
 from commanderbot_lib.database.abc.dict_database import DictDatabase
+from commanderbot_lib.database.changes import KeyPath, lookup_path
 from commanderbot_lib.options.abc.options_with_database import OptionsWithDatabase
-from commanderbot_lib.store.abc.cached_store import CachedStore
+from commanderbot_lib.store.abc.cached_store import CachedStore, StoreTransaction
+from commanderbot_lib.store.entry_table import (
+    EntryTable,
+    iter_matching,
+    matches_pattern,
+)
+from commanderbot_lib.store.expiry import ExpiryCallback, ExpiryRule, ExpiryTable
+from commanderbot_lib.store.query import Query
+from commanderbot_lib.store.records import RecordSchema, to_data
+from commanderbot_lib.store.secondary_index import IndexTable, SecondaryIndex
+
+# Stands in for a value that didn't exist, in the undo log of a transaction.
+_MISSING = object()
 
 
 class SimpleDictStore(CachedStore[OptionsWithDatabase, DictDatabase, dict]):
+    """
+    A `CachedStore` whose cache is simply the data itself.
+
+    Values can be changed with `set()` and `delete()`, which keep track of what changed so that
+    `dirty()` only has to persist those values, if the database supports it - as long as it's given
+    the key paths that were changed. Calling `dirty()` without any persists the entire cache.
+
+    Secondary indexes can be declared with `indexes`, and are then kept up to date as values are
+    changed with `set()`, `delete()` or `mark_dirty()`. Values that are changed in place must be
+    marked with `mark_dirty()` for the indexes to notice.
+
+    Entries that expire can be declared with `expiry`, and are removed once they do - all at once,
+    with a single call to `dirty()` - by a timer that is always set for the next entry to expire.
+    Cogs can be notified of expired entries with `on_expired()`.
+
+    Entries can be kept as compact `Record` objects instead of `dict` by declaring them with
+    `records`. They're converted upon loading and whenever they're set, and converted back into
+    plain values by `serialize()`.
+
+    Entries can be queried lazily with `query()`, or in order of an ordered index with
+    `query_index()`, which can also be paginated.
+
+    Within a transaction, `set()` and `delete()` remember the values they replace, and each
+    top-level entry is copied the first time it's read (with `get()`, `find()`, `query()` and so
+    on), so that rolling back only has to undo those changes - including changes made in place to
+    the values that were read. Changes that other tasks make to other top-level entries in the
+    meantime are kept.
+    """
+
+    # The secondary indexes to maintain over the data, which can be queried with `find()` and
+    # `find_range()`. Indexing decodes every value, even with `database_lazy_load`.
+    indexes: Tuple[SecondaryIndex, ...] = ()
+
+    # The entries to keep as records, and the type of record for each. Like indexing, this decodes
+    # every value, even with `database_lazy_load`.
+    records: Tuple[RecordSchema, ...] = ()
+
+    # The entries that expire, and where to find the time they expire at.
+    expiry: Tuple[ExpiryRule, ...] = ()
+
+    # How long to wait after an entry expires for others to expire along with it, in seconds, so
+    # that they're all removed in a single write.
+    expiry_batch_window: float = 0.1
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._index_tables: Dict[str, IndexTable] = {
+            index.name: IndexTable(index) for index in self.indexes
+        }
+        self._expiry_tables: List[ExpiryTable] = [
+            ExpiryTable(rule) for rule in self.expiry
+        ]
+        self._entry_tables: List[EntryTable] = [
+            *self._index_tables.values(),
+            *self._expiry_tables,
+        ]
+        self._expiry_callbacks: List[ExpiryCallback] = []
+        self._expiry_timer: Optional[asyncio.TimerHandle] = None
+        self._expiry_due: Optional[float] = None
+        self._expiry_task: Optional[asyncio.Task] = None
+        # The values replaced within the current transaction, if any, in order.
+        self._undo_log: Optional[List[Tuple[KeyPath, Any]]] = None
+        # The top-level keys whose entries have been copied into the undo log.
+        self._copied_keys: Set[Hashable] = set()
+
     # @implements CachedStore
     async def _build_cache(self, data: dict) -> dict:
+        data = self._build_records((), data)
+        self._rebuild_tables(data)
         return data
 
+    # @overrides CachedStore
+    async def _restore_cache(self, cache: dict):
+        self._cache = cache
+        self._rebuild_tables(cache)
+
     # @implements CachedStore
     async def serialize(self) -> dict:
+        if self.records:
+            return to_data(self._cache)
         return self._cache
+
+    # @overrides CachedStore
+    async def serialize_path(self, path: KeyPath) -> Any:
+        value = lookup_path(self._cache, path)
+        if self.records:
+            return to_data(value)
+        return value
+
+    # @overrides CachedStore
+    async def _merge_cache(self, data: dict):
+        # Anything already in the cache is newer than what was on disk.
+        for key, value in data.items():
+            if key not in self._cache:
+                self._cache[key] = self._build_records((key,), value)
+                self._update_tables((key,))
+
+    # @overrides CachedStore
+    def mark_dirty(self, *path: Hashable):
+        super().mark_dirty(*path)
+        self._update_tables(path)
+
+    # @overrides CachedStore
+    async def dirty(self, *paths: KeyPath):
+        # Entries may have been given an expiry time outside of the event loop.
+        self._schedule_expiry()
+        await super().dirty(*paths)
+
+    # @overrides CachedStore
+    async def _begin_transaction(self) -> Any:
+        self._undo_log = []
+        self._copied_keys = set()
+        # Changes made to the cache directly can only be undone from a snapshot.
+        return self._undo_log, await super()._begin_transaction()
+
+    # @overrides CachedStore
+    async def _end_transaction(
+        self, transaction: StoreTransaction, committed: bool
+    ) -> Set[Hashable]:
+        self._undo_log = None
+        self._copied_keys = set()
+        if committed:
+            return set()
+        undo_log, snapshot_state = transaction.rollback_state
+        if transaction.full_write:
+            return await self._restore_snapshot(transaction, snapshot_state)
+        # Undoing in reverse means that the oldest value at each path is the one that's left.
+        for path, value in reversed(undo_log):
+            if value is _MISSING:
+                self._remove(path)
+            else:
+                self._put(path, value)
+            self._update_tables(path)
+        return {path[0] for path, _ in undo_log}
+
+    def on_expired(self, callback: ExpiryCallback):
+        """ Call `callback` with the path and value of every entry that expires from now on. """
+        self._expiry_callbacks.append(callback)
+
+    def find(self, index: str, value: Any, prefix: KeyPath = ()) -> Dict[KeyPath, Any]:
+        """
+        Return the entries indexed by `value` in the given index, by path, optionally only those
+        under `prefix` (such as a single guild).
+        """
+        paths = self._index_tables[index].find(value)
+        return self._entries_at(paths, prefix)
+
+    def find_range(
+        self,
+        index: str,
+        start: Optional[Any] = None,
+        stop: Optional[Any] = None,
+        prefix: KeyPath = (),
+    ) -> Dict[KeyPath, Any]:
+        """
+        Return the entries indexed by values from `start` (inclusive) to `stop` (exclusive) in the
+        given ordered index, by path and in order of their values, optionally only those under
+        `prefix`.
+        """
+        paths = self._index_tables[index].find_range(start, stop)
+        return self._entries_at(paths, prefix)
+
+    def query(self, entries: KeyPath, prefix: KeyPath = ()) -> Query:
+        """
+        Return a lazy query over the entries whose paths match `entries`, where `ANY_KEY` matches
+        any key, optionally only those under `prefix`. The results are in no particular order.
+        """
+        if (len(prefix) > len(entries)) or not matches_pattern(entries, prefix):
+            raise ValueError(f"Prefix {prefix} does not match the entries {entries}")
+
+        def source(after: Any) -> Iterator[Tuple[Any, KeyPath, Any]]:
+            try:
+                value = lookup_path(self._cache, prefix)
+            except KeyError:
+                return
+            for path, entry in iter_matching(entries, value, prefix):
+                self._copy_for_undo(path)
+                yield path, path, entry
+
+        return Query(source)
+
+    def query_index(
+        self,
+        index: str,
+        start: Optional[Any] = None,
+        stop: Optional[Any] = None,
+        reverse: bool = False,
+        prefix: KeyPath = (),
+    ) -> Query:
+        """
+        Return a lazy query over the entries indexed by values from `start` (inclusive) to `stop`
+        (exclusive) in the given ordered index, in order of their values (largest first if
+        `reverse`), optionally only those under `prefix`.
+
+        The results can be paginated with `Query.page()`, and the first few can be read without
+        looking at the rest, such as `query_index("by_score", reverse=True).take(10)` for the 10
+        entries with the highest scores.
+        """
+        table = self._index_tables[index]
+        size = len(prefix)
+
+        def source(after: Any) -> Iterator[Tuple[Any, KeyPath, Any]]:
+            for value, path in table.iter_ordered(start, stop, reverse, after):
+                if path[:size] == prefix:
+                    self._copy_for_undo(path)
+                    yield (value, path), path, lookup_path(self._cache, path)
+
+        return Query(source, ordered=True)
+
+    def _entries_at(
+        self, paths: Iterable[KeyPath], prefix: KeyPath
+    ) -> Dict[KeyPath, Any]:
+        size = len(prefix)
+        entries = {}
+        for path in paths:
+            if path[:size] == prefix:
+                self._copy_for_undo(path)
+                entries[path] = lookup_path(self._cache, path)
+        return entries
+
+    def get(self, path: KeyPath, default: Any = None) -> Any:
+        """ Return the value at `path`, or `default` if there isn't one. """
+        self._copy_for_undo(path)
+        try:
+            return lookup_path(self._cache, path)
+        except KeyError:
+            return default
+
+    def set(self, path: KeyPath, value: Any, ttl: Optional[float] = None):
+        """
+        Set the value at `path`, creating any missing parents, and mark it as dirty. Any entries
+        within the value that are declared in `records` are converted into records in-place.
+
+        If `ttl` is given, the value expires after that many seconds; its expiry time is filled in
+        according to the `ExpiryRule` for `path`.
+        """
+        if ttl is not None:
+            value = self._with_expiry(path, value, time.time() + ttl)
+        self._remember(path)
+        self._put(path, value)
+        self.mark_dirty(*path)
+
+    def delete(self, path: KeyPath):
+        """ Delete the value at `path`, if there is one, and mark it as dirty. """
+        self._remember(path)
+        if self._remove(path):
+            self.mark_dirty(*path)
+
+    def _put(self, path: KeyPath, value: Any):
+        *parent_path, key = path
+        parent = self._cache
+        for part in parent_path:
+            parent = parent.setdefault(part, {})
+        parent[key] = self._build_records(path, value)
+
+    def _remove(self, path: KeyPath) -> bool:
+        *parent_path, key = path
+        try:
+            parent = lookup_path(self._cache, tuple(parent_path))
+        except KeyError:
+            return False
+        if isinstance(parent, MutableMapping) and (key in parent):
+            del parent[key]
+            return True
+        return False
+
+    def _remember(self, path: KeyPath):
+        """ Add the value at `path` to the undo log, if we're within a transaction. """
+        if (self._undo_log is None) or (self._current_transaction() is None):
+            return
+        # If a parent is missing, then undoing means removing that parent.
+        value: Any = self._cache
+        for i, key in enumerate(path):
+            if not (isinstance(value, MutableMapping) and (key in value)):
+                self._undo_log.append((path[: i + 1], _MISSING))
+                return
+            value = value[key]
+        self._undo_log.append((path, value))
+
+    def _copy_for_undo(self, path: KeyPath):
+        """
+        Add a copy of the top-level entry that `path` is under to the undo log, the first time it's
+        read within a transaction, so that changes made to it in place can be rolled back.
+        """
+        if (self._undo_log is None) or (not path) or (path[0] in self._copied_keys):
+            return
+        if self._current_transaction() is None:
+            return
+        key = path[0]
+        self._copied_keys.add(key)
+        if key in self._cache:
+            self._undo_log.append(((key,), copy.deepcopy(self._cache[key])))
+
+    def _build_records(self, path: KeyPath, value: Any) -> Any:
+        for schema in self.records:
+            if schema.applies_to(path):
+                value = schema.build(value, path)
+        return value
+
+    def _rebuild_tables(self, data: dict):
+        for table in self._entry_tables:
+            table.clear()
+            table.add_all(data)
+        self._schedule_expiry()
+
+    def _update_tables(self, path: KeyPath):
+        for table in self._entry_tables:
+            table.update(self._cache, path)
+        self._schedule_expiry()
+
+    def _with_expiry(self, path: KeyPath, value: Any, expires_at: float) -> Any:
+        for table in self._expiry_tables:
+            if (len(path) == len(table.entries)) and table.matches(path):
+                if table.rule.field is None:
+                    return expires_at
+                if not isinstance(value, MutableMapping):
+                    raise ValueError(
+                        f"Cannot set the expiry time of a non-mapping value at: {path}"
+                    )
+                value[table.rule.field] = expires_at
+                return value
+        raise ValueError(f"No expiry rule matches the path: {path}")
+
+    def _schedule_expiry(self):
+        """
+        Set the timer for the next entry to expire, if it has changed. Outside of the event loop,
+        this is left until the next call to `dirty()`.
+        """
+        # Once the current batch of expired entries is done, it sets the timer itself.
+        if (not self._expiry_tables) or (self._expiry_task is not None):
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        due = min(
+            (
+                expires_at
+                for table in self._expiry_tables
+                if (expires_at := table.next_expiry()) is not None
+            ),
+            default=None,
+        )
+        if due == self._expiry_due:
+            return
+        if self._expiry_timer is not None:
+            self._expiry_timer.cancel()
+            self._expiry_timer = None
+        self._expiry_due = due
+        if due is not None:
+            # The timer runs on the loop's clock, whereas expiry times are wall-clock times.
+            self._expiry_timer = loop.call_at(
+                loop.time() + max(0.0, due - time.time()) + self.expiry_batch_window,
+                self._start_expiring,
+            )
+
+    def _start_expiring(self):
+        self._expiry_timer = None
+        self._expiry_due = None
+        self._expiry_task = asyncio.get_running_loop().create_task(
+            self._expire_entries()
+        )
+
+    async def _expire_entries(self):
+        """ Remove every entry that has expired, persist that, and then run the callbacks. """
+        try:
+            now = time.time()
+            expired: List[Tuple[KeyPath, Any]] = []
+            for table in self._expiry_tables:
+                for path in table.pop_expired(now):
+                    try:
+                        entry = lookup_path(self._cache, path)
+                    except KeyError:
+                        continue
+                    # The entry may have been changed in place without being marked as dirty.
+                    expires_at = table.rule.expires_at(entry)
+                    if (expires_at is not None) and (expires_at > now):
+                        table.add(path, entry)
+                        continue
+                    expired.append((path, entry))
+                    self.delete(path)
+            if expired:
+                self._log.info(f"Removing {len(expired)} expired entries")
+                await self.dirty(*(path for path, _ in expired))
+            for path, entry in expired:
+                for callback in self._expiry_callbacks:
+                    try:
+                        await callback(path, entry)
+                    except:
+                        self._log.exception(f"Expiry callback failed for: {path}")
+        except:
+            self._log.exception("Failed to remove expired entries")
+        finally:
+            self._expiry_task = None
+            self._schedule_expiry()
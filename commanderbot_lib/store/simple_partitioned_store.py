@@ -0,0 +1,67 @@
+from typing import Any, Hashable, MutableMapping, Optional
+
+from commanderbot_lib.database.abc.dict_database import DictDatabase
+from commanderbot_lib.database.changes import KeyPath, lookup_path
+from commanderbot_lib.options.abc.options_with_database import OptionsWithDatabase
+from commanderbot_lib.store.abc.partitioned_store import PartitionedStore
+
+
+class SimplePartitionedStore(PartitionedStore[OptionsWithDatabase, DictDatabase, dict]):
+    """
+    A `PartitionedStore` whose partitions are simply the data under each top-level key.
+
+    Like those of `SimpleDictStore`, values can be changed with `set()` and `delete()`, which keep
+    track of what changed. The first part of every key path picks the partition, and partitions
+    without any data are empty dicts.
+    """
+
+    # @implements PartitionedStore
+    async def _build_partition(self, key: Hashable, data: Optional[Any]) -> dict:
+        return data if data is not None else {}
+
+    # @implements PartitionedStore
+    async def _serialize_partition(self, key: Hashable, partition: dict) -> Any:
+        return partition
+
+    # @overrides CachedStore
+    async def serialize_path(self, path: KeyPath) -> Any:
+        return lookup_path(self._cache, path)
+
+    async def get(self, path: KeyPath, default: Any = None) -> Any:
+        """ Return the value at `path`, or `default` if there isn't one. """
+        key, *rest = path
+        try:
+            return lookup_path(await self.get_partition(key), tuple(rest))
+        except KeyError:
+            return default
+
+    async def set(self, path: KeyPath, value: Any):
+        """ Set the value at `path`, creating any missing parents, and mark it as dirty. """
+        key, *rest = path
+        if not rest:
+            self._cache[key] = value
+            self._cache.move_to_end(key)
+            self.mark_dirty(key)
+            await self._evict()
+            return
+        *parent_path, last = rest
+        parent = await self.get_partition(key)
+        for part in parent_path:
+            parent = parent.setdefault(part, {})
+        parent[last] = value
+        self.mark_dirty(*path)
+
+    async def delete(self, path: KeyPath):
+        """ Delete the value at `path`, if there is one, and mark it as dirty. """
+        key, *rest = path
+        if not rest:
+            await self.delete_partition(key)
+            return
+        *parent_path, last = rest
+        try:
+            parent = lookup_path(await self.get_partition(key), tuple(parent_path))
+        except KeyError:
+            return
+        if isinstance(parent, MutableMapping) and (last in parent):
+            del parent[last]
+            self.mark_dirty(*path)
@@ -0,0 +1,34 @@
+# NOTE Like those in `file_io`, these functions do blocking file I/O and are meant to be run inside
+# of an executor.
+#
+# A warm-start snapshot is a pickled key followed by a pickled cache. The key identifies the source
+# file contents and the store that built the cache, and is checked before unpickling the (much
+# larger) cache, so that stale snapshots are cheap to reject.
+
+import pickle
+from pathlib import Path
+from typing import Any, Optional
+
+from commanderbot_lib.database import file_io
+from commanderbot_lib.database.file_io import Durability
+
+SNAPSHOT_SUFFIX = ".pickle"
+
+
+def read_snapshot(path: Path, key: str) -> Optional[Any]:
+    """ Return the cache from the snapshot at `path`, or `None` if there isn't one for `key`. """
+    try:
+        with open(path, "rb") as file:
+            if pickle.load(file) != key:
+                return None
+            return pickle.load(file)
+    except FileNotFoundError:
+        return None
+
+
+def write_snapshot(path: Path, key: str, payload: bytes):
+    """ Write a snapshot of an already-pickled cache, replacing any other snapshot at `path`. """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    header = pickle.dumps(key, protocol=pickle.HIGHEST_PROTOCOL)
+    # Snapshots can always be rebuilt, so they aren't worth syncing to disk.
+    file_io.write_bytes(path, header + payload, Durability.NONE)
@@ -0,0 +1,40 @@
+import asyncio
+from typing import Any, Coroutine, Type, TypeVar, cast
+
+from discord.ext.commands import Bot, Cog
+
+from commanderbot_lib.options.abc.options_with_database import OptionsWithDatabase
+from commanderbot_lib.store.abc.cached_store import CachedStore
+
+StoreType = TypeVar("StoreType", bound=CachedStore)
+
+T = TypeVar("T")
+
+
+# Databases and stores only pass the bot along, so tests go without one.
+NO_BOT = cast(Bot, None)
+
+
+class FakeCog(Cog, name="tests"):
+    pass
+
+
+class DatabaseOptions(OptionsWithDatabase):
+    def __init__(self, database: Any):
+        self._database = database
+
+    @property
+    def database(self) -> Any:
+        return self._database
+
+
+def run(coroutine: Coroutine[Any, Any, T]) -> T:
+    """ Run a coroutine to completion on a fresh event loop. """
+    return asyncio.run(coroutine)
+
+
+async def make_store(store_type: Type[StoreType], database: Any) -> StoreType:
+    """ Create and initialize a store of the given type, using the given database options. """
+    store = store_type(NO_BOT, FakeCog(), DatabaseOptions(database))
+    await store.async_init()
+    return store
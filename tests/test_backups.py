@@ -0,0 +1,124 @@
+import gzip
+import json
+
+import pytest
+
+from commanderbot_lib.database import backups
+from commanderbot_lib.database.backups import BackupPolicy
+from commanderbot_lib.database.codec_file_database import CodecFileDatabase
+from commanderbot_lib.database.codecs import get_codec
+from commanderbot_lib.database.file_io import Durability
+from tests.helpers import NO_BOT, FakeCog, run
+
+OLD_HASH = "0123456789abcdef"
+
+
+def _backup(path, policy: BackupPolicy, data: dict) -> backups.Backup:
+    path.write_text(json.dumps(data))
+    return backups.create_backup(path, policy, Durability.FILE)
+
+
+def _read(backup: backups.Backup) -> dict:
+    opener = gzip.open if backup.compressed else open
+    with opener(backup.path, "rt") as file:
+        return json.load(file)
+
+
+def test_backups_are_kept_by_default(tmp_path):
+    path = tmp_path / "db.json"
+    for i in range(15):
+        _backup(path, BackupPolicy(), {"n": i})
+    assert len(backups.list_backups(path)) == 15
+
+
+def test_keep_count_deletes_the_oldest_backups(tmp_path):
+    path = tmp_path / "db.json"
+    policy = BackupPolicy(keep_count=3)
+    created = [_backup(path, policy, {"n": i}) for i in range(5)]
+    assert backups.list_backups(path) == created[-3:]
+    assert [_read(backup) for backup in created[-3:]] == [{"n": 2}, {"n": 3}, {"n": 4}]
+
+
+def test_keep_for_deletes_old_backups_but_not_the_newest(tmp_path):
+    path = tmp_path / "db.json"
+    path.write_text("{}")
+    old = tmp_path / f"db.backup.2000-01-01-00-00-00-000000.{OLD_HASH}.json.gz"
+    old.write_bytes(gzip.compress(b"{}"))
+    # The only backup is kept, no matter how old it is.
+    assert backups.prune_backups(path, BackupPolicy(keep_for=60.0)) == []
+    backup = _backup(path, BackupPolicy(keep_for=60.0), {"new": True})
+    assert backups.list_backups(path) == [backup]
+
+
+def test_legacy_backups_are_never_pruned(tmp_path):
+    path = tmp_path / "db.json"
+    legacy = tmp_path / "db.backup.2000-01-01-00-00-00-000000.json"
+    legacy.write_text('{"legacy": true}')
+    policy = BackupPolicy(keep_count=1, keep_for=60.0)
+    for i in range(3):
+        backup = _backup(path, policy, {"n": i})
+    assert [b.path for b in backups.list_backups(path)] == [legacy, backup.path]
+
+
+def test_unchanged_files_are_not_backed_up_again(tmp_path):
+    path = tmp_path / "db.json"
+    first = _backup(path, BackupPolicy(), {"n": 1})
+    assert _backup(path, BackupPolicy(), {"n": 1}) == first
+    second = _backup(path, BackupPolicy(), {"n": 2})
+    assert second != first
+    # Going back to earlier contents creates a new backup, since it differs from the last one.
+    assert _backup(path, BackupPolicy(), {"n": 1}) not in (first, second)
+    assert len(backups.list_backups(path)) == 3
+    # Without deduplication, every backup is kept.
+    _backup(path, BackupPolicy(deduplicate=False), {"n": 1})
+    assert len(backups.list_backups(path)) == 4
+
+
+@pytest.mark.parametrize("compress", [True, False])
+def test_compression(tmp_path, compress):
+    path = tmp_path / "db.json"
+    backup = _backup(path, BackupPolicy(compress=compress), {"n": 1})
+    assert backup.compressed == compress
+    assert backup.path.name.endswith(".json.gz" if compress else ".json")
+    assert backup.content_hash == backups.hash_file(path)
+    assert _read(backup) == {"n": 1}
+
+
+def test_identical_files_compress_the_same(tmp_path):
+    first = tmp_path / "first.json"
+    second = tmp_path / "second.json"
+    first_backup = _backup(first, BackupPolicy(), {"n": 1})
+    second_backup = _backup(second, BackupPolicy(), {"n": 1})
+    assert first_backup.path.read_bytes() == second_backup.path.read_bytes()
+
+
+def test_restore_backs_up_the_current_file_first(tmp_path):
+    path = tmp_path / "db.json"
+
+    async def main():
+        database = CodecFileDatabase(
+            NO_BOT, FakeCog(), codec=get_codec("json"), path=path
+        )
+        await database.write({"version": 1})
+        first = await database.backup()
+        await database.write({"version": 2})
+        await database.restore()
+        assert await database.read() == {"version": 1}
+        # The restore can be undone, since the file it replaced was backed up.
+        existing = await database.list_backups()
+        assert existing[0] == first
+        await database.restore(existing[-1])
+        assert await database.read() == {"version": 2}
+
+    run(main())
+
+
+def test_restore_without_backups(tmp_path):
+    async def main():
+        database = CodecFileDatabase(
+            NO_BOT, FakeCog(), codec=get_codec("json"), path=tmp_path / "db.json"
+        )
+        with pytest.raises(FileNotFoundError):
+            await database.restore()
+
+    run(main())
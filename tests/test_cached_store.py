@@ -0,0 +1,45 @@
+from commanderbot_lib.store.simple_dict_store import SimpleDictStore
+from tests.helpers import make_store, run
+
+
+def test_dirty_without_paths_persists_unmarked_changes(tmp_path):
+    async def main():
+        database = f"sqlite:{tmp_path / 'db.sqlite3'}"
+        store = await make_store(SimpleDictStore, database)
+        store.set(("a",), {"b": 1})
+        await store.dirty(("a",))
+        # Changed in place, without being marked, next to a change that was.
+        store._cache["new"] = {"c": 3}
+        store.set(("a", "b"), 2)
+        await store.dirty()
+        reloaded = await make_store(SimpleDictStore, database)
+        return await reloaded.serialize()
+
+    assert run(main()) == {"a": {"b": 2}, "new": {"c": 3}}
+
+
+def test_dirty_with_paths_only_persists_those(tmp_path):
+    async def main():
+        database = f"sqlite:{tmp_path / 'db.sqlite3'}"
+        store = await make_store(SimpleDictStore, database)
+        store._cache["unmarked"] = 1
+        store.set(("a",), 1)
+        await store.dirty(("a",))
+        reloaded = await make_store(SimpleDictStore, database)
+        return await reloaded.serialize()
+
+    assert run(main()) == {"a": 1}
+
+
+def test_dirty_without_paths_in_transaction_persists_everything(tmp_path):
+    async def main():
+        database = f"sqlite:{tmp_path / 'db.sqlite3'}"
+        store = await make_store(SimpleDictStore, database)
+        async with store.transaction():
+            store._cache["unmarked"] = 1
+            store.set(("a",), 1)
+            await store.dirty()
+        reloaded = await make_store(SimpleDictStore, database)
+        return await reloaded.serialize()
+
+    assert run(main()) == {"a": 1, "unmarked": 1}
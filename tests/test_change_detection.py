@@ -0,0 +1,117 @@
+import asyncio
+import json
+import os
+
+import pytest
+
+from commanderbot_lib.database.codec_file_database import CodecFileDatabase
+from commanderbot_lib.database.codecs import get_codec
+from commanderbot_lib.store.simple_dict_store import SimpleDictStore
+from tests.helpers import NO_BOT, FakeCog, make_store, run
+
+
+class WatchedStore(SimpleDictStore):
+    database_watch_interval = 0.01
+
+
+def _database(path) -> CodecFileDatabase:
+    return CodecFileDatabase(NO_BOT, FakeCog(), codec=get_codec("json"), path=path)
+
+
+def _replace(path, data: dict):
+    """ Replace the file the way that an editor would, with a new file. """
+    temp_path = path.with_name(path.name + ".tmp")
+    temp_path.write_text(json.dumps(data))
+    os.replace(temp_path, path)
+
+
+def test_writing_the_same_data_again_is_skipped(tmp_path):
+    path = tmp_path / "db.json"
+
+    async def main():
+        database = _database(path)
+        await database.write({"a": 1})
+        await database.write({"a": 1})
+        assert (database.stats.writes, database.stats.skipped_writes) == (1, 1)
+        # Changes made on disk are overwritten, even if the data itself is the same.
+        path.write_text("{}")
+        await database.write({"a": 1})
+        assert (database.stats.writes, database.stats.skipped_writes) == (2, 1)
+
+    run(main())
+    assert json.loads(path.read_text()) == {"a": 1}
+
+
+def test_read_if_changed_only_reads_changed_files(tmp_path):
+    path = tmp_path / "db.json"
+
+    async def main():
+        database = _database(path)
+        await database.write({"a": 1})
+        # Our own writes don't count as changes.
+        assert await database.read_if_changed() is None
+        _replace(path, {"a": 2})
+        assert await database.read_if_changed() == {"a": 2}
+        assert await database.read_if_changed() is None
+        # Files edited in place are picked up too.
+        path.write_text(json.dumps({"a": 3, "b": 4}))
+        assert await database.read_if_changed() == {"a": 3, "b": 4}
+        assert database.stats.reloads == 2
+        path.unlink()
+        assert await database.read_if_changed() is None
+
+    run(main())
+
+
+def test_unreadable_changes_are_only_tried_once(tmp_path):
+    path = tmp_path / "db.json"
+
+    async def main():
+        database = _database(path)
+        await database.write({"a": 1})
+        path.write_text("{not json")
+        with pytest.raises(ValueError):
+            await database.read_if_changed()
+        assert await database.read_if_changed() is None
+        _replace(path, {"a": 2})
+        assert await database.read_if_changed() == {"a": 2}
+
+    run(main())
+
+
+def test_watched_store_rebuilds_its_cache(tmp_path):
+    path = tmp_path / "db.json"
+    path.write_text(json.dumps({"a": {"n": 1}}))
+
+    async def main():
+        store = await make_store(WatchedStore, str(path))
+        watch_task = store._watch_task
+        stats = store.database_stats
+        assert (watch_task is not None) and (stats is not None)
+        try:
+            # Changes that haven't been persisted yet are kept.
+            store.set(("b",), {"n": 1})
+            _replace(path, {"a": {"n": 2}})
+            for _ in range(100):
+                if store.get(("a", "n")) == 2:
+                    break
+                await asyncio.sleep(0.01)
+            assert store._cache == {"a": {"n": 2}, "b": {"n": 1}}
+            await store.dirty(("b",))
+            # Our own writes don't cause a reload.
+            reloads = stats.reloads
+            await asyncio.sleep(0.05)
+            assert stats.reloads == reloads
+        finally:
+            watch_task.cancel()
+
+    run(main())
+    assert json.loads(path.read_text()) == {"a": {"n": 2}, "b": {"n": 1}}
+
+
+def test_only_file_databases_can_be_watched():
+    async def main():
+        store = await make_store(WatchedStore, {"a": 1})
+        assert store._watch_task is None
+
+    run(main())
@@ -0,0 +1,84 @@
+import io
+import json
+from typing import Optional
+
+import pytest
+
+from commanderbot_lib.database import codecs
+from commanderbot_lib.database.codecs import (
+    Codec,
+    get_codec,
+    get_codec_for_path,
+    register_codec,
+    registered_codecs,
+)
+
+DATA = {"1": {"name": "a", "tags": ["x", "}"], "score": 1.5, "on": True, "none": None}}
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    """ Let tests register codecs without affecting the shared registry. """
+    monkeypatch.setattr(codecs, "_codecs_by_name", dict(codecs._codecs_by_name))
+    monkeypatch.setattr(
+        codecs, "_codecs_by_extension", dict(codecs._codecs_by_extension)
+    )
+
+
+def _text_codec(name: str, *extensions: str) -> Codec:
+    return Codec(
+        name=name,
+        extensions=extensions,
+        load=json.load,
+        dump=json.dump,
+        loads=json.loads,
+    )
+
+
+@pytest.mark.parametrize("codec", registered_codecs(), ids=lambda codec: codec.name)
+def test_codec_round_trips(codec):
+    file = io.TextIOWrapper(io.BytesIO(), encoding="utf-8")
+    codec.dump(DATA, file)
+    file.flush()
+    raw = file.buffer.getvalue()
+    file.seek(0)
+    assert codec.load(file) == DATA
+    assert codec.loads(raw if codec.binary else raw.decode("utf-8")) == DATA
+
+
+def _codec_name(path: str) -> Optional[str]:
+    codec = get_codec_for_path(path)
+    return None if codec is None else codec.name
+
+
+def test_codecs_are_found_by_extension():
+    assert _codec_name("data/cog.json") == "json"
+    assert _codec_name("https://example.com/cog.json") == "json"
+    assert _codec_name("data/cog.txt") is None
+
+
+def test_longer_extensions_take_precedence(registry):
+    register_codec(_text_codec("custom", ".cog.json"))
+    assert _codec_name("data/my.cog.json") == "custom"
+    assert _codec_name("data/my.json") == "json"
+
+
+def test_registering_a_taken_name_or_extension_fails(registry):
+    with pytest.raises(ValueError):
+        register_codec(_text_codec("json", ".other"))
+    with pytest.raises(ValueError):
+        register_codec(_text_codec("other", ".json"))
+    register_codec(_text_codec("json", ".json"), replace=True)
+    assert get_codec("json").load is json.load
+
+
+def test_json_index_finds_top_level_values():
+    codec = get_codec("json")
+    raw = json.dumps({"a": {"b": ["{", "]"]}, "c": 2, "d": "}"}, indent=2).encode()
+    assert codec.index is not None
+    index = codec.index(raw)
+    assert {key: json.loads(raw[start:end]) for key, (start, end) in index.items()} == {
+        "a": {"b": ["{", "]"]},
+        "c": 2,
+        "d": "}",
+    }
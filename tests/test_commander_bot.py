@@ -0,0 +1,13 @@
+from commanderbot_lib.bot.commander_bot import CommanderBot
+from tests.helpers import run
+
+
+def test_close_stops_the_event_loop_monitor():
+    async def main():
+        bot = CommanderBot({"command_prefix": "!"})
+        await bot.on_connect()
+        started = bot.event_loop_monitor.running
+        await bot.close()
+        return started, bot.event_loop_monitor.running
+
+    assert run(main()) == (True, False)
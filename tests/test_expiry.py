@@ -0,0 +1,115 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+from commanderbot_lib.store.entry_table import ANY_KEY
+from commanderbot_lib.store.expiry import ExpiryRule, ExpiryTable
+from commanderbot_lib.store.simple_dict_store import SimpleDictStore
+from tests.helpers import make_store, run
+
+MUTES = (ANY_KEY, "mutes", ANY_KEY)
+
+
+class MuteStore(SimpleDictStore):
+    expiry = (
+        ExpiryRule(entries=MUTES),
+        ExpiryRule(entries=("cooldowns", ANY_KEY), field=None),
+    )
+    expiry_batch_window = 0.05
+
+
+def test_entries_expire_in_order():
+    table = ExpiryTable(ExpiryRule(entries=(ANY_KEY,), field=None))
+    table.add_all({"c": 3, "a": 1, "b": 2, "never": "soon"})
+    assert (len(table), table.next_expiry()) == (3, 1.0)
+    assert table.pop_expired(now=2) == [("a",), ("b",)]
+    assert table.pop_expired(now=2) == []
+    assert table.next_expiry() == 3.0
+
+
+def test_changed_and_removed_entries_are_skipped():
+    table = ExpiryTable(ExpiryRule(entries=(ANY_KEY,), field=None))
+    table.add_all({"a": 1, "b": 2, "c": 3})
+    table.add(("a",), 10)
+    table.remove(("b",))
+    assert table.next_expiry() == 3.0
+    assert table.pop_expired(now=10) == [("c",), ("a",)]
+    assert len(table) == 0
+
+
+def test_stale_heap_items_are_cleared_out():
+    table = ExpiryTable(ExpiryRule(entries=(ANY_KEY,), field=None))
+    for i in range(1000):
+        table.add(("a",), i)
+    assert len(table._heap) <= 2 * len(table) + 65
+    assert table.pop_expired(now=1000) == [("a",)]
+
+
+def test_entries_are_removed_once_they_expire(tmp_path):
+    path = tmp_path / "db.json"
+    path.write_text(json.dumps({"guild": {"mutes": {"old": {"expires_at": 1}}}}))
+    expired = []
+
+    async def on_expired(path, entry):
+        expired.append((path, entry))
+
+    async def main():
+        store = await make_store(MuteStore, str(path))
+        store.on_expired(on_expired)
+        store.set(("guild", "mutes", "a"), {}, ttl=0.01)
+        store.set(("guild", "mutes", "b"), {}, ttl=0.02)
+        store.set(("guild", "mutes", "kept"), {}, ttl=60.0)
+        store.set(("cooldowns", "user"), None, ttl=0.01)
+        await store.dirty()
+        writes = store.write_stats.writes
+        while len(expired) < 4:
+            await asyncio.sleep(0.01)
+        # Everything that expired close together was removed in a single write.
+        assert store.write_stats.writes == writes + 1
+        return store.get(("guild", "mutes"))
+
+    assert list(run(main())) == ["kept"]
+    assert sorted(str(path[-1]) for path, _ in expired) == ["a", "b", "old", "user"]
+    data = json.loads(path.read_text())
+    assert list(data["guild"]["mutes"]) == ["kept"]
+    assert data["cooldowns"] == {}
+
+
+def test_entries_extended_in_place_are_kept():
+    async def main():
+        store = await make_store(MuteStore, {})
+        store.set(("guild", "mutes", "a"), {}, ttl=0.01)
+        store.get(("guild", "mutes", "a"))["expires_at"] = time.time() + 60.0
+        await store.dirty()
+        await asyncio.sleep(0.1)
+        assert store.get(("guild", "mutes", "a")) is not None
+        assert store._expiry_due is not None
+
+    run(main())
+
+
+def test_ttl_can_be_set_outside_the_event_loop():
+    store = run(make_store(MuteStore, {}))
+    store.set(("guild", "mutes", "a"), {}, ttl=0.01)
+    assert store._expiry_timer is None
+
+    async def main():
+        await store.dirty()
+        assert store._expiry_timer is not None
+        await asyncio.sleep(0.1)
+        assert store.get(("guild", "mutes", "a")) is None
+
+    run(main())
+
+
+def test_ttl_needs_an_expiry_rule():
+    async def main():
+        store = await make_store(MuteStore, {})
+        with pytest.raises(ValueError, match="No expiry rule"):
+            store.set(("guild", "bans", "a"), {}, ttl=1.0)
+        with pytest.raises(ValueError, match="non-mapping"):
+            store.set(("guild", "mutes", "a"), 1, ttl=1.0)
+
+    run(main())
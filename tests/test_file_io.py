@@ -0,0 +1,59 @@
+import json
+import os
+import stat
+
+import pytest
+
+from commanderbot_lib.database import file_io
+from commanderbot_lib.database.codecs import get_codec
+from commanderbot_lib.database.file_io import Durability
+
+
+def _dump_json(data, file):
+    get_codec("json").dump(data, file)
+
+
+def _dump_half_then_fail(data, file):
+    file.write('{"new": ')
+    raise RuntimeError("Crashed while dumping")
+
+
+@pytest.mark.parametrize("durability", list(Durability))
+def test_write_replaces_file(tmp_path, durability):
+    path = tmp_path / "db.json"
+    path.write_text('{"old": 1}')
+    file_io.write_data(path, {"new": 2}, _dump_json, durability)
+    assert json.loads(path.read_text()) == {"new": 2}
+    assert list(tmp_path.iterdir()) == [path]
+
+
+def test_failed_write_leaves_file_intact(tmp_path):
+    path = tmp_path / "db.json"
+    path.write_text('{"old": 1}')
+    with pytest.raises(RuntimeError):
+        file_io.write_data(path, {"new": 2}, _dump_half_then_fail, Durability.FILE)
+    assert json.loads(path.read_text()) == {"old": 1}
+    # The temporary file is cleaned up too.
+    assert list(tmp_path.iterdir()) == [path]
+
+
+@pytest.mark.skipif(os.name == "nt", reason="POSIX permissions")
+def test_write_keeps_permissions(tmp_path):
+    path = tmp_path / "db.json"
+    path.write_text("{}")
+    os.chmod(path, 0o640)
+    file_io.write_data(path, {"new": 2}, _dump_json, Durability.FILE)
+    assert stat.S_IMODE(path.stat().st_mode) == 0o640
+
+
+def test_write_file_skips_unchanged_content(tmp_path):
+    path = tmp_path / "db.json"
+    dump = get_codec("json").dump
+    snapshot = file_io.snapshot_data({"a": 1})
+    state = file_io.write_file(path, snapshot, dump, Durability.FILE)
+    assert state is not None
+    assert file_io.write_file(path, snapshot, dump, Durability.FILE, state) is None
+    # Anything else touching the file means that it has to be written again.
+    path.write_text('{"a": 2}')
+    assert file_io.write_file(path, snapshot, dump, Durability.FILE, state) is not None
+    assert json.loads(path.read_text()) == {"a": 1}
@@ -0,0 +1,84 @@
+import json
+import multiprocessing
+
+import pytest
+
+from commanderbot_lib.database import file_locking
+from commanderbot_lib.database.abc.file_database import FileDatabase
+from commanderbot_lib.store.simple_dict_store import SimpleDictStore
+from tests.helpers import make_store, run
+
+pytestmark = pytest.mark.skipif(
+    not file_locking.locking_supported(),
+    reason="File locking is not supported on this platform",
+)
+
+
+class LockedStore(SimpleDictStore):
+    database_locking = True
+
+
+def _write_keys(path: str, name: str, keys: int):
+    async def main():
+        store = await make_store(LockedStore, path)
+        for key in range(keys):
+            store.set((name, str(key)), key)
+            await store.dirty((name, str(key)))
+
+    run(main())
+
+
+def test_stores_sharing_a_file_keep_each_others_changes(tmp_path):
+    path = tmp_path / "db.json"
+    path.write_text("{}")
+
+    async def main():
+        first = await make_store(LockedStore, str(path))
+        second = await make_store(LockedStore, str(path))
+        first.set(("first",), 1)
+        await first.dirty(("first",))
+        second.set(("second",), 2)
+        await second.dirty(("second",))
+        # The first store picks up the second store's write on its next write.
+        first.set(("third",), 3)
+        await first.dirty(("third",))
+        return first.get(("second",))
+
+    assert run(main()) == 2
+    assert json.loads(path.read_text()) == {"first": 1, "second": 2, "third": 3}
+
+
+def test_read_if_changed_detects_other_writers(tmp_path):
+    path = tmp_path / "db.json"
+    path.write_text("{}")
+
+    async def main():
+        first = await make_store(LockedStore, str(path))
+        second = await make_store(LockedStore, str(path))
+        database = first._database
+        assert isinstance(database, FileDatabase)
+        assert await database.read_if_changed() is None
+        second.set(("second",), 2)
+        await second.dirty(("second",))
+        return await database.read_if_changed()
+
+    assert run(main()) == {"second": 2}
+
+
+def test_concurrent_processes_lose_no_changes(tmp_path):
+    path = tmp_path / "db.json"
+    path.write_text("{}")
+    # Forking could copy locks held by the threads of the earlier tests' databases.
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(target=_write_keys, args=(str(path), f"process-{index}", 20))
+        for index in range(4)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    data = json.loads(path.read_text())
+    assert {name: len(values) for name, values in data.items()} == {
+        f"process-{index}": 20 for index in range(4)
+    }
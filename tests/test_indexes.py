@@ -0,0 +1,99 @@
+from commanderbot_lib.store.entry_table import ANY_KEY, PathTree
+from commanderbot_lib.store.expiry import ExpiryRule, ExpiryTable
+from commanderbot_lib.store.secondary_index import (
+    IndexTable,
+    SecondaryIndex,
+)
+from commanderbot_lib.store.simple_dict_store import SimpleDictStore
+from tests.helpers import make_store, run
+
+ENTRIES = (ANY_KEY, "entries", ANY_KEY)
+
+
+def _data():
+    return {
+        guild: {"entries": {name: {"owner": name % 3} for name in range(5)}}
+        for guild in ("a", "b")
+    }
+
+
+def test_path_tree_finds_paths_under_prefix():
+    tree = PathTree(3)
+    for path in [("a", "x", 1), ("a", "x", 2), ("a", "y", 1), ("b", "x", 1)]:
+        tree.add(path)
+    tree.discard(("a", "y", 1))
+    tree.discard(("c", "x", 1))
+    assert sorted(tree.under(("a",))) == [("a", "x", 1), ("a", "x", 2)]
+    assert tree.under(("a", "y")) == []
+    assert tree.under(("b", "x", 1)) == [("b", "x", 1)]
+    assert tree.under(("b", "x", 2)) == []
+    assert len(tree.under(())) == 3
+
+
+def test_index_update_only_replaces_entries_under_prefix():
+    table = IndexTable(SecondaryIndex("owner", entries=ENTRIES, field="owner"))
+    data: dict = _data()
+    table.add_all(data)
+    data["a"] = {"entries": {"new": {"owner": 0}}}
+    table.update(data, ("a",))
+    assert table.find(0) == {
+        ("a", "entries", "new"),
+        ("b", "entries", 0),
+        ("b", "entries", 3),
+    }
+    assert len(table) == 6
+    table.remove_under(("b", "entries"))
+    assert table.find(0) == {("a", "entries", "new")}
+    assert table.find(1) == set()
+
+
+def test_ordered_index_stays_sorted_after_removing_prefix():
+    table = IndexTable(
+        SecondaryIndex("owner", entries=ENTRIES, field="owner", ordered=True)
+    )
+    table.add_all(_data())
+    table.remove_under(("a",))
+    assert list(table.find_range(1, 3)) == [
+        ("b", "entries", 1),
+        ("b", "entries", 4),
+        ("b", "entries", 2),
+    ]
+
+
+def test_expiry_table_removes_entries_under_prefix():
+    table = ExpiryTable(ExpiryRule(entries=(ANY_KEY, ANY_KEY)))
+    table.add_all({"a": {"x": {"expires_at": 1}}, "b": {"x": {"expires_at": 2}}})
+    table.remove_under(("a",))
+    assert len(table) == 1
+    assert table.pop_expired(now=3) == [("b", "x")]
+    assert table.next_expiry() is None
+
+
+def test_store_indexes_follow_set_and_delete():
+    class OwnedStore(SimpleDictStore):
+        indexes = (SecondaryIndex("owner", entries=ENTRIES, field="owner"),)
+
+    async def main():
+        store = await make_store(OwnedStore, _data())
+        store.set(("a",), {"entries": {"x": {"owner": 1}}})
+        store.delete(("b", "entries", 1))
+        return store.find("owner", 1)
+
+    assert run(main()) == {
+        ("a", "entries", "x"): {"owner": 1},
+        ("b", "entries", 4): {"owner": 1},
+    }
+
+
+def test_ordered_index_merges_batches_in_order():
+    table = IndexTable(
+        SecondaryIndex("owner", entries=(ANY_KEY, ANY_KEY), field="owner", ordered=True)
+    )
+    data: dict = {"a": {name: {"owner": name % 7} for name in range(100)}}
+    table.add_all(data)
+    # A small batch is inserted entry by entry, rather than merged.
+    data["b"] = {"x": {"owner": 3}, "y": {"owner": 0}}
+    table.update(data, ("b",))
+    values = list(table.iter_ordered())
+    assert values == sorted(values)
+    assert len(values) == 102
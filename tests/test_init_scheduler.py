@@ -0,0 +1,156 @@
+import asyncio
+
+from commanderbot_lib.bot.commander_bot import CommanderBot
+from commanderbot_lib.init_scheduler import InitScheduler
+from commanderbot_lib.mixins.async_init_mixin import AsyncInitMixin
+from commanderbot_lib.state.abc.cog_state import CogState
+from commanderbot_lib.store.simple_dict_store import SimpleDictStore
+from tests.helpers import DatabaseOptions, FakeCog, run
+
+
+class Component(AsyncInitMixin):
+    def __init__(self, log: list, name: str, seconds: float = 0.0, fail: bool = False):
+        self.log = log
+        self.name = name
+        self.seconds = seconds
+        self.fail = fail
+        self.part = Part()
+
+    async def _async_init(self):
+        self.log.append(("start", self.name))
+        await asyncio.sleep(self.seconds)
+        await self.part.async_init()
+        if self.fail:
+            raise RuntimeError("Failed")
+        self.log.append(("end", self.name))
+
+
+class Part(AsyncInitMixin):
+    pass
+
+
+class Counter(AsyncInitMixin):
+    def __init__(self):
+        self.calls = 0
+
+    async def _async_init(self):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+
+
+def test_concurrency_is_capped():
+    active = []
+    peak = []
+
+    class Tracked(AsyncInitMixin):
+        async def _async_init(self):
+            active.append(self)
+            peak.append(len(active))
+            await asyncio.sleep(0.01)
+            active.remove(self)
+
+    scheduler = InitScheduler(concurrency=2)
+    for i in range(6):
+        scheduler.add(f"component-{i}", Tracked())
+    report = run(scheduler.run())
+    assert max(peak) == 2
+    assert not report.failures
+
+
+def test_dependencies_initialize_first():
+    log = []
+    scheduler = InitScheduler()
+    scheduler.add("b", Component(log, "b"), depends_on=["a"])
+    scheduler.add("a", Component(log, "a", seconds=0.01))
+    scheduler.add("c", Component(log, "c"))
+    run(scheduler.run())
+    assert log.index(("end", "a")) < log.index(("start", "b"))
+    assert log.index(("start", "c")) < log.index(("end", "a"))
+
+
+def test_failed_dependency_skips_dependents():
+    log = []
+    scheduler = InitScheduler()
+    scheduler.add("a", Component(log, "a", fail=True))
+    scheduler.add("b", Component(log, "b"), depends_on=["a"])
+    report = run(scheduler.run())
+    assert ("start", "b") not in log
+    assert {
+        record.name: record.error for record in report.failures if record.depth == 0
+    } == {
+        "a": "RuntimeError: Failed",
+        "b": "Dependencies failed to initialize: a",
+    }
+
+
+def test_timeout_fails_the_component():
+    log = []
+    scheduler = InitScheduler(timeout=0.01)
+    scheduler.add("slow", Component(log, "slow", seconds=1.0))
+    scheduler.add("quick", Component(log, "quick"), timeout=1.0)
+    report = run(scheduler.run())
+    assert [(record.name, record.error) for record in report.failures] == [
+        ("slow", "Timed out after 0.01s"),
+        ("slow / Component", "CancelledError"),
+    ]
+    assert ("end", "quick") in log
+
+
+def test_report_lists_components_and_their_parts():
+    scheduler = InitScheduler()
+    scheduler.add("a", Component([], "a", seconds=0.01))
+    report = run(scheduler.run())
+    assert [(record.name, record.depth) for record in report.records] == [
+        ("a", 0),
+        ("a / Component", 1),
+        ("a / Component / Part", 2),
+    ]
+    assert all(record.duration is not None for record in report.records)
+    assert report.format().startswith("Initialized 1 components")
+
+
+def test_components_initialize_only_once():
+    counter = Counter()
+    scheduler = InitScheduler()
+    scheduler.add("counter", counter)
+
+    async def main():
+        await asyncio.gather(scheduler.run(), counter.async_init())
+        await counter.async_init()
+
+    run(main())
+    assert counter.calls == 1
+
+
+def test_cog_states_add_themselves_to_the_bot():
+    class State(CogState):
+        store_class = SimpleDictStore
+
+    async def main():
+        bot = CommanderBot({"command_prefix": "!"})
+        state = State(bot, FakeCog(), DatabaseOptions({"a": 1}))
+        report = await bot.init_scheduler.run()
+        return report, state.store.get(("a",))
+
+    report, value = run(main())
+    assert not report.failures
+    assert [record.name for record in report.records][:2] == [
+        "tests",
+        "tests / State",
+    ]
+    assert value == 1
+
+
+def test_finished_components_can_be_replaced():
+    log = []
+    scheduler = InitScheduler()
+    scheduler.add("a", Component(log, "first"))
+
+    async def main():
+        await scheduler.run()
+        # Such as when an extension is reloaded after startup.
+        scheduler.add("a", Component(log, "second"))
+        await scheduler.run()
+
+    run(main())
+    assert [name for event, name in log if event == "end"] == ["first", "second"]
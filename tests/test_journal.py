@@ -0,0 +1,110 @@
+import json
+
+import pytest
+
+from commanderbot_lib.database import file_io
+from commanderbot_lib.database.abc.journaled_file_database import (
+    JournaledFileDatabase,
+    JournalOptions,
+)
+from commanderbot_lib.database.changes import SetChange
+from commanderbot_lib.database.file_io import Durability
+from commanderbot_lib.store.simple_dict_store import SimpleDictStore
+from tests.helpers import make_store, run
+
+
+class JournaledStore(SimpleDictStore):
+    database_journal = JournalOptions(max_size=None, max_age=None)
+
+
+def _record(path, value) -> str:
+    return json.dumps({"set": path, "value": value}) + "\n"
+
+
+def test_replay_ignores_torn_last_record(tmp_path):
+    journal = tmp_path / "db.journal.1.jsonl"
+    journal.write_text(_record(["a"], 1) + '{"set": ["b"], "va')
+    assert list(file_io.iter_journal(journal)) == [{"set": ["a"], "value": 1}]
+
+
+def test_replay_rejects_torn_record_in_the_middle(tmp_path):
+    journal = tmp_path / "db.journal.1.jsonl"
+    journal.write_text('{"set": ["b"], "va\n' + _record(["a"], 1))
+    with pytest.raises(ValueError):
+        list(file_io.iter_journal(journal))
+
+
+def test_failed_append_is_cut_back(tmp_path, monkeypatch):
+    journal = tmp_path / "db.journal.1.jsonl"
+    file_io.append_journal(journal, _record(["a"], 1), Durability.FILE)
+
+    def fail(fd):
+        raise OSError("Disk full")
+
+    monkeypatch.setattr(file_io.os, "fsync", fail)
+    with pytest.raises(OSError):
+        file_io.append_journal(journal, _record(["b"], 2), Durability.FILE)
+    monkeypatch.undo()
+    file_io.append_journal(journal, _record(["c"], 3), Durability.FILE)
+    assert [record["set"] for record in file_io.iter_journal(journal)] == [
+        ["a"],
+        ["c"],
+    ]
+
+
+def test_failed_append_moves_on_to_a_new_segment(tmp_path, monkeypatch):
+    path = tmp_path / "db.json"
+    path.write_text("{}")
+
+    def append_torn(path, raw, durability):
+        with open(path, "a", encoding="utf-8") as file:
+            file.write(raw[: len(raw) // 2])
+        raise OSError("Disk full")
+
+    async def main():
+        store = await make_store(JournaledStore, str(path))
+        store.set(("a",), 1)
+        await store.dirty(("a",))
+        with monkeypatch.context() as patch:
+            patch.setattr(file_io, "append_journal", append_torn)
+            store.set(("b",), 2)
+            with pytest.raises(OSError):
+                await store.dirty(("b",))
+        store.set(("c",), 3)
+        await store.dirty(("c",))
+        reloaded = await make_store(JournaledStore, str(path))
+        return await reloaded.serialize()
+
+    assert run(main()) == {"a": 1, "b": 2, "c": 3}
+
+
+def test_replayed_key_paths_match_json_keys(tmp_path):
+    path = tmp_path / "db.json"
+    path.write_text(json.dumps({"123": {"old": 1}}))
+
+    async def main():
+        store = await make_store(JournaledStore, str(path))
+        await store._database.write_changes([SetChange(path=(123, "new"), value=2)])
+        reloaded = await make_store(JournaledStore, str(path))
+        data = await reloaded.serialize()
+        assert isinstance(reloaded._database, JournaledFileDatabase)
+        await reloaded._database.compact()
+        return data, json.loads(path.read_text())
+
+    data, compacted = run(main())
+    assert data == {"123": {"old": 1, "new": 2}}
+    assert compacted == data
+
+
+def test_replayed_key_paths_keep_yaml_keys(tmp_path):
+    pytest.importorskip("yaml")
+    path = tmp_path / "db.yaml"
+    path.write_text("123:\n  old: 1\n")
+
+    async def main():
+        store = await make_store(JournaledStore, str(path))
+        await store._database.write_changes([SetChange(path=(123, "new"), value=2)])
+        reloaded = await make_store(JournaledStore, str(path))
+        return await reloaded.serialize()
+
+    assert run(main()) == {123: {"old": 1, "new": 2}}
@@ -0,0 +1,133 @@
+import json
+import pickle
+from dataclasses import replace
+
+import pytest
+
+from commanderbot_lib.database.codec_file_database import CodecFileDatabase
+from commanderbot_lib.database.codecs import get_codec
+from commanderbot_lib.database.lazy_mapping import LazyMapping
+from commanderbot_lib.store.simple_dict_store import SimpleDictStore
+from tests.helpers import NO_BOT, FakeCog, make_store, run
+
+DATA = {"a": {"n": 1}, "b": [1, "]}"], "c": "x"}
+
+
+class Buffer(bytes):
+    """ Bytes that remember whether they were closed, like a memory map. """
+
+    closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class LazyStore(SimpleDictStore):
+    database_lazy_load = True
+
+
+def _mapping(data: dict = DATA):
+    raw = Buffer(json.dumps(data).encode("utf-8"))
+    decoded = []
+
+    def loads(value: bytes):
+        decoded.append(bytes(value))
+        return json.loads(value)
+
+    index = get_codec("json").index
+    assert index is not None
+    return LazyMapping(raw, index(raw), loads), raw, decoded
+
+
+def test_values_are_decoded_once_when_accessed():
+    mapping, _, decoded = _mapping()
+    assert (len(mapping), mapping.undecoded_count) == (3, 3)
+    assert "a" in mapping and list(mapping) == ["a", "b", "c"]
+    assert decoded == []
+    assert mapping["a"] == {"n": 1}
+    assert mapping["a"] is mapping["a"]
+    assert (len(decoded), mapping.undecoded_count) == (1, 2)
+
+
+def test_buffer_is_released_once_everything_is_decoded():
+    mapping, buffer, _ = _mapping()
+    assert dict(mapping) == DATA
+    assert mapping.undecoded_count == 0
+    assert buffer.closed
+
+
+def test_replacing_or_deleting_values_skips_decoding_them():
+    mapping, buffer, decoded = _mapping()
+    mapping["a"] = "replaced"
+    del mapping["b"]
+    mapping["d"] = "added"
+    assert decoded == []
+    assert mapping.undecoded_count == 1
+    assert dict(mapping) == {"a": "replaced", "c": "x", "d": "added"}
+    assert buffer.closed
+
+
+def test_empty_mappings_release_the_buffer_right_away():
+    mapping, buffer, _ = _mapping({})
+    assert len(mapping) == 0
+    assert buffer.closed
+
+
+def test_pickling_produces_a_plain_dict():
+    mapping, _, _ = _mapping()
+    snapshot = pickle.loads(pickle.dumps(mapping))
+    assert type(snapshot) is dict
+    assert snapshot == DATA
+
+
+def test_lazy_database_keeps_reading_the_file_it_mapped(tmp_path):
+    path = tmp_path / "db.json"
+    path.write_text(json.dumps(DATA))
+
+    async def main():
+        database = CodecFileDatabase(
+            NO_BOT, FakeCog(), codec=get_codec("json"), path=path, lazy=True
+        )
+        data = await database.read()
+        assert isinstance(data, LazyMapping)
+        assert data.undecoded_count == 3
+        # The file is only ever replaced, so the mapping keeps referring to the old one.
+        await database.write({"new": True})
+        assert dict(data) == DATA
+        assert await database.read() == {"new": True}
+
+    run(main())
+
+
+def test_lazy_loading_needs_an_index_and_no_locking(tmp_path):
+    with pytest.raises(ValueError, match="does not support lazy loading"):
+        CodecFileDatabase(
+            NO_BOT,
+            FakeCog(),
+            codec=replace(get_codec("json"), index=None),
+            path=tmp_path / "db.json",
+            lazy=True,
+        )
+    with pytest.raises(ValueError, match="cannot be combined with locking"):
+        CodecFileDatabase(
+            NO_BOT,
+            FakeCog(),
+            codec=get_codec("json"),
+            path=tmp_path / "db.json",
+            lazy=True,
+            locking=True,
+        )
+
+
+def test_lazy_store_reads_and_writes_back(tmp_path):
+    path = tmp_path / "db.json"
+    path.write_text(json.dumps(DATA))
+
+    async def main():
+        store = await make_store(LazyStore, str(path))
+        assert store.get(("a", "n")) == 1
+        store.set(("a", "n"), 2)
+        await store.dirty()
+
+    run(main())
+    assert json.loads(path.read_text()) == dict(DATA, a={"n": 2})
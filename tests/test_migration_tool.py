@@ -0,0 +1,84 @@
+import json
+
+from commanderbot_lib.database.migration_tool import discover_files, main, migrate_file
+
+COLLECTOR = "tests.test_migration_tool:collect"
+
+
+async def add_owner(database, data: dict):
+    for entry in data.values():
+        entry.setdefault("owner", database.cog.qualified_name)
+
+
+def collect(database, from_version: int, to_version: int):
+    if from_version < 1 <= to_version:
+        yield add_owner
+
+
+def _write(path, data) -> str:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(data))
+    return str(path)
+
+
+def test_discovery_skips_backups_journals_and_metadata(tmp_path):
+    for name in (
+        "db.json",
+        "db.json.backup.20210101",
+        "db.journal.1.json",
+        "cache.json.meta.json",
+        ".db.json.tmp",
+        "notes.txt",
+    ):
+        _write(tmp_path / "data" / name, {})
+    explicit = _write(tmp_path / "config.json", {})
+    assert discover_files([str(tmp_path / "data"), explicit]) == [
+        (tmp_path / "data" / "db.json", False),
+        (tmp_path / "config.json", True),
+    ]
+
+
+def test_versioned_file_is_migrated(tmp_path):
+    path = _write(tmp_path / "db.json", {"version": 0, "data": {"a": {}}})
+    result = migrate_file(path, COLLECTOR, 1, unversioned=False)
+    assert (result.error, result.changed) == (None, True)
+    assert json.loads((tmp_path / "db.json").read_text()) == {
+        "version": 1,
+        "data": {"a": {"owner": "migrate:db.json"}},
+    }
+
+
+def test_dry_run_writes_nothing(tmp_path):
+    data = {"version": 0, "data": {"a": {}}}
+    path = _write(tmp_path / "db.json", data)
+    assert migrate_file(path, COLLECTOR, 1, dry_run=True).changed
+    assert json.loads((tmp_path / "db.json").read_text()) == data
+
+
+def test_unversioned_file_is_only_migrated_if_given(tmp_path):
+    data = {"a": {}}
+    path = _write(tmp_path / "config.json", data)
+    result = migrate_file(path, COLLECTOR, 1, unversioned=False)
+    assert (result.skipped, result.changed) == (True, False)
+    assert json.loads((tmp_path / "config.json").read_text()) == data
+    assert migrate_file(path, COLLECTOR, 1).changed
+    assert json.loads((tmp_path / "config.json").read_text()) == {
+        "version": 1,
+        "data": data,
+    }
+
+
+def test_directories_only_migrate_versioned_files(tmp_path, capsys):
+    _write(tmp_path / "data" / "db.json", {"version": 0, "data": {"a": {}}})
+    _write(tmp_path / "data" / "config.json", {"a": {}})
+    _write(tmp_path / "data" / "shards" / "123.json", {"123": {}})
+    main(
+        ["--migrations", COLLECTOR, "--version", "1", "--workers", "2"]
+        + [str(tmp_path / "data")]
+    )
+    assert json.loads((tmp_path / "data" / "config.json").read_text()) == {"a": {}}
+    assert json.loads((tmp_path / "data" / "shards" / "123.json").read_text()) == {
+        "123": {}
+    }
+    assert json.loads((tmp_path / "data" / "db.json").read_text())["version"] == 1
+    assert "1 migrated, 0 up-to-date, 2 skipped, 0 failed" in capsys.readouterr().out
@@ -0,0 +1,39 @@
+from commanderbot_lib.store.simple_partitioned_store import SimplePartitionedStore
+from tests.helpers import make_store, run
+
+
+class DelayedPartitionedStore(SimplePartitionedStore):
+    partition_limit = 1
+    database_write_delay = 60
+
+
+def test_evicting_persists_unmarked_changes_after_dirty(tmp_path):
+    async def main():
+        database = f"sqlite:{tmp_path / 'db.sqlite3'}"
+        store = await make_store(DelayedPartitionedStore, database)
+        await store.set(("a", "marked"), 1)
+        partition = await store.get_partition("a")
+        partition["unmarked"] = 2
+        await store.dirty()
+        # Loading another partition evicts the first one before the delayed write happens.
+        await store.get_partition("b")
+        reloaded = await make_store(SimplePartitionedStore, database)
+        result = await reloaded.get(("a",))
+        await store.flush()
+        return result
+
+    assert run(main()) == {"marked": 1, "unmarked": 2}
+
+
+def test_evicting_persists_only_marked_changes_otherwise(tmp_path):
+    async def main():
+        database = f"sqlite:{tmp_path / 'db.sqlite3'}"
+        store = await make_store(DelayedPartitionedStore, database)
+        await store.set(("a", "marked"), 1)
+        partition = await store.get_partition("a")
+        partition["unmarked"] = 2
+        await store.get_partition("b")
+        reloaded = await make_store(SimplePartitionedStore, database)
+        return await reloaded.get(("a",))
+
+    assert run(main()) == {"marked": 1}
@@ -0,0 +1,135 @@
+import json
+
+import pytest
+
+from commanderbot_lib.database.abc.versioned_file_database import (
+    FailedMigrationError,
+)
+from commanderbot_lib.store.abc.versioned_cached_store import VersionedCachedStore
+from commanderbot_lib.store.simple_dict_store import SimpleDictStore
+from tests.helpers import make_store, run
+
+
+async def add_owner(database, key, record: dict) -> dict:
+    if record.get("broken"):
+        raise ValueError("Cannot migrate this record")
+    return dict(record, owner=key)
+
+
+class RecordStore(VersionedCachedStore, SimpleDictStore):
+    lazy_record_migrations = True
+    database_load_deferred_keys = False
+
+    @property
+    def data_version(self) -> int:
+        return 1
+
+    def _collect_migrations(self, database, actual_version, expected_version):
+        raise AssertionError("The whole file should never be migrated")
+
+    def _collect_record_migrations(self, database, actual_version, expected_version):
+        if actual_version < 1 <= expected_version:
+            yield add_owner
+
+
+class BackgroundRecordStore(RecordStore):
+    database_load_deferred_keys = True
+    database_deferred_key_interval = 0.0
+
+
+def _write(path, data: dict) -> str:
+    path.write_text(json.dumps(data))
+    return str(path)
+
+
+def _read(path) -> dict:
+    return json.loads(path.read_text())
+
+
+def test_outdated_records_are_deferred(tmp_path):
+    path = tmp_path / "db.json"
+    data = {"version": 1, "data": {"a": {}}, "record_versions": {"a": 0}}
+    data["data"]["b"] = {"owner": "b"}
+
+    async def main():
+        store = await make_store(RecordStore, _write(path, data))
+        assert store._cache == {"b": {"owner": "b"}}
+        assert store._database.deferred_keys() == ["a"]
+
+    run(main())
+    # Nothing is written until a deferred record is loaded, apart from a backup.
+    assert _read(path) == data
+    assert len(list(tmp_path.glob("db.backup.*"))) == 1
+
+
+def test_records_are_migrated_as_they_are_loaded(tmp_path):
+    path = tmp_path / "db.json"
+
+    async def main():
+        store = await make_store(
+            RecordStore, _write(path, {"version": 0, "data": {"a": {}, "b": {}}})
+        )
+        assert await store.load_key("a")
+        assert store.get(("a",)) == {"owner": "a"}
+        # Loading a key again, or one that doesn't exist, does nothing.
+        assert not await store.load_key("a")
+        assert not await store.load_key("c")
+        assert store._database.deferred_keys() == ["b"]
+        await store.dirty(("a",))
+
+    run(main())
+    # Records that haven't been loaded yet are written back as they were, along with their version.
+    assert _read(path) == {
+        "version": 1,
+        "data": {"a": {"owner": "a"}, "b": {}},
+        "record_versions": {"b": 0},
+    }
+
+    async def restart():
+        store = await make_store(RecordStore, str(path))
+        assert store._cache == {"a": {"owner": "a"}}
+        assert store._database.deferred_keys() == ["b"]
+
+    run(restart())
+
+
+def test_failed_record_migrations_stay_deferred(tmp_path):
+    path = tmp_path / "db.json"
+
+    async def main():
+        store = await make_store(
+            RecordStore, _write(path, {"version": 0, "data": {"a": {"broken": True}}})
+        )
+        with pytest.raises(FailedMigrationError):
+            await store.load_key("a")
+        assert store._database.deferred_keys() == ["a"]
+        assert store.get(("a",)) is None
+
+    run(main())
+
+
+def test_deferred_records_are_migrated_in_the_background(tmp_path):
+    path = tmp_path / "db.json"
+
+    async def main():
+        store = await make_store(
+            BackgroundRecordStore,
+            _write(path, {"version": 0, "data": {"a": {}, "b": {}}}),
+        )
+        assert store._deferred_keys_task is not None
+        await store._deferred_keys_task
+        assert store._database.deferred_keys() == []
+
+    run(main())
+    assert _read(path) == {
+        "version": 1,
+        "data": {"a": {"owner": "a"}, "b": {"owner": "b"}},
+    }
+
+
+def test_sqlite_databases_refuse_lazy_record_migrations(tmp_path):
+    async def main():
+        with pytest.raises(ValueError, match="not supported by SQLite"):
+            await make_store(RecordStore, f"sqlite:{tmp_path / 'db.sqlite3'}")
+
+    run(main())
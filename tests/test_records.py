@@ -0,0 +1,113 @@
+import copy
+import pickle
+from typing import Optional
+
+import pytest
+
+from commanderbot_lib.store.entry_table import ANY_KEY
+from commanderbot_lib.store.records import Record, RecordSchema, to_data
+from commanderbot_lib.store.secondary_index import SecondaryIndex
+from commanderbot_lib.store.simple_dict_store import SimpleDictStore
+from tests.helpers import make_store, run
+
+
+class Point(Record):
+    x: int = 0
+    y: int = 0
+
+
+class Entry(Record):
+    owner: int
+    name: str = ""
+    position: Optional[Point] = None
+
+
+class RecordStore(SimpleDictStore):
+    records = (RecordSchema(entries=(ANY_KEY, "entries", ANY_KEY), record_type=Entry),)
+    indexes = (
+        SecondaryIndex("owner", entries=(ANY_KEY, "entries", ANY_KEY), field="owner"),
+    )
+
+
+DATA = {
+    "1": {
+        "entries": {
+            "a": {"owner": 10, "position": {"x": 1}},
+            "b": {"owner": 20, "name": "b", "unknown": [1, 2]},
+        },
+        "settings": {"prefix": "!"},
+    },
+}
+
+
+def test_round_trip_keeps_data_unchanged():
+    data = {"owner": 1, "position": {"x": 3}, "unknown": {"nested": True}}
+    entry = Entry.from_data(data)
+    assert isinstance(entry.position, Point)
+    assert entry.to_data() == data
+    assert to_data([entry]) == [data]
+
+
+def test_missing_fields_read_as_defaults():
+    entry = Entry.from_data({"owner": 1, "position": {}})
+    assert (entry.name, entry.position.x) == ("", 0)
+    assert "name" not in entry
+    with pytest.raises(KeyError):
+        entry["name"]
+
+
+def test_unknown_keys_are_kept_aside():
+    entry = Entry(owner=1)
+    assert entry._extra is None
+    entry["unknown"] = 2
+    assert (entry._extra, list(entry), len(entry)) == (
+        {"unknown": 2},
+        ["owner", "unknown"],
+        2,
+    )
+    del entry["unknown"]
+    assert entry._extra is None
+    with pytest.raises(AttributeError):
+        setattr(entry, "unknown", 3)
+
+
+def test_pickle_and_deepcopy_keep_missing_fields_missing():
+    entry = Entry.from_data({"owner": 1, "unknown": 2})
+    for copied in (pickle.loads(pickle.dumps(entry)), copy.deepcopy(entry)):
+        assert copied == entry
+        assert "name" not in copied
+
+
+def test_mutable_default_is_rejected():
+    with pytest.raises(ValueError):
+
+        class Invalid(Record):
+            tags: list = []
+
+
+def test_store_keeps_entries_as_records():
+    async def main():
+        store = await make_store(RecordStore, copy.deepcopy(DATA))
+        store.set(("2",), {"entries": {"c": {"owner": 10}}})
+        return store
+
+    store = run(main())
+    assert isinstance(store.get(("1", "entries", "a")), Entry)
+    assert isinstance(store.get(("2", "entries", "c")), Entry)
+    assert not isinstance(store.get(("1", "settings")), Record)
+    serialized = run(store.serialize())
+    assert type(serialized["1"]["entries"]["a"]) is dict
+    assert serialized == {**DATA, "2": {"entries": {"c": {"owner": 10}}}}
+
+
+def test_indexes_work_on_records():
+    async def main():
+        store = await make_store(RecordStore, copy.deepcopy(DATA))
+        store.set(("1", "entries", "b", "owner"), 10)
+        return store
+
+    store = run(main())
+    found = store.find("owner", 10)
+    assert not store.find("owner", 20)
+    assert sorted(found) == [("1", "entries", "a"), ("1", "entries", "b")]
+    assert all(isinstance(entry, Entry) for entry in found.values())
@@ -0,0 +1,336 @@
+import asyncio
+import json
+from typing import Any, Dict, List, Optional
+
+import pytest
+
+from commanderbot_lib.database import redis_dict_database
+from commanderbot_lib.database.changes import DeleteChange, SetChange
+from commanderbot_lib.database.redis_connection import RedisError
+from commanderbot_lib.database.redis_dict_database import RedisDictDatabase
+from commanderbot_lib.database.redis_pool import RedisPool, close_redis_pools
+from commanderbot_lib.store.simple_dict_store import SimpleDictStore
+from tests.helpers import NO_BOT, FakeCog, make_store, run
+
+KEY = "commanderbot:tests"
+
+
+class StandInServer:
+    """
+    Just enough of a server that speaks the Redis protocol to test against: hashes, transactions
+    and optimistic locking, with one version counter per key.
+
+    Attributes
+    -----------
+    hashes: :class:`Dict[bytes, Dict[bytes, bytes]]`
+        The hashes stored on the server, by key.
+    interfere: :class:`int`
+        How many more times to change a watched key right after it is watched, as if another
+        client had changed it in the meantime.
+    latency: :class:`float`
+        How long to wait before replying to each command, in seconds.
+    connections: :class:`int`
+        The number of currently open connections.
+    max_connections: :class:`int`
+        The highest number of connections that were open at once.
+    transactions: :class:`int`
+        The number of transactions that were executed successfully.
+    aborted: :class:`int`
+        The number of transactions that failed because a watched key changed.
+    """
+
+    def __init__(self):
+        self.hashes: Dict[bytes, Dict[bytes, bytes]] = {}
+        self.interfere: int = 0
+        self.latency: float = 0.0
+        self.connections: int = 0
+        self.max_connections: int = 0
+        self.transactions: int = 0
+        self.aborted: int = 0
+        self._versions: Dict[bytes, int] = {}
+        self._server: Optional[asyncio.base_events.Server] = None
+
+    @property
+    def url(self) -> str:
+        assert self._server is not None
+        port = self._server.sockets[0].getsockname()[1]
+        return f"redis://127.0.0.1:{port}/0"
+
+    def pool(self, **kwargs) -> RedisPool:
+        return RedisPool.from_url(self.url, **kwargs)
+
+    def fields(self, key: str = KEY) -> Dict[Any, Any]:
+        """ Return the decoded fields of the given hash. """
+        return {
+            json.loads(field): json.loads(value)
+            for field, value in self.hashes.get(key.encode(), {}).items()
+        }
+
+    async def start(self) -> "StandInServer":
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        return self
+
+    async def close(self):
+        assert self._server is not None
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        self.max_connections = max(self.max_connections, self.connections)
+        queued: Optional[List[List[bytes]]] = None
+        watched: Dict[bytes, int] = {}
+        try:
+            while True:
+                command = await self._read_command(reader)
+                if command is None:
+                    break
+                if self.latency:
+                    await asyncio.sleep(self.latency)
+                name = command[0].upper()
+                if name == b"WATCH":
+                    for key in command[1:]:
+                        watched[key] = self._versions.get(key, 0)
+                        if self.interfere:
+                            self.interfere -= 1
+                            self._changed(key)
+                    reply: Any = "OK"
+                elif name == b"UNWATCH":
+                    watched = {}
+                    reply = "OK"
+                elif name == b"MULTI":
+                    queued = []
+                    reply = "OK"
+                elif name == b"EXEC":
+                    assert queued is not None
+                    if all(self._versions.get(k, 0) == v for k, v in watched.items()):
+                        reply = [
+                            self._execute(queued_command) for queued_command in queued
+                        ]
+                        self.transactions += 1
+                    else:
+                        reply = None
+                        self.aborted += 1
+                    queued = None
+                    watched = {}
+                elif queued is not None:
+                    queued.append(command)
+                    reply = "QUEUED"
+                else:
+                    reply = self._execute(command)
+                writer.write(_encode_reply(reply))
+                await writer.drain()
+        finally:
+            self.connections -= 1
+            writer.close()
+
+    async def _read_command(
+        self, reader: asyncio.StreamReader
+    ) -> Optional[List[bytes]]:
+        line = await reader.readline()
+        if not line:
+            return None
+        command = []
+        for _ in range(int(line[1:])):
+            length = int((await reader.readline())[1:])
+            command.append((await reader.readexactly(length + 2))[:-2])
+        return command
+
+    def _changed(self, key: bytes):
+        self._versions[key] = self._versions.get(key, 0) + 1
+
+    def _execute(self, command: List[bytes]) -> Any:
+        name, args = command[0].upper(), command[1:]
+        if name in (b"AUTH", b"SELECT"):
+            return "OK"
+        if name == b"HGETALL":
+            fields = self.hashes.get(args[0], {})
+            return [part for field in fields.items() for part in field]
+        if name == b"HMGET":
+            fields = self.hashes.get(args[0], {})
+            return [fields.get(field) for field in args[1:]]
+        if name == b"HSET":
+            if len(args) < 3 or len(args) % 2 == 0:
+                return RedisError("ERR wrong number of arguments for 'hset' command")
+            fields = self.hashes.setdefault(args[0], {})
+            added = 0
+            for i in range(1, len(args), 2):
+                added += args[i] not in fields
+                fields[args[i]] = args[i + 1]
+            self._changed(args[0])
+            return added
+        if name == b"HDEL":
+            fields = self.hashes.get(args[0], {})
+            removed = sum(fields.pop(field, None) is not None for field in args[1:])
+            if not fields:
+                self.hashes.pop(args[0], None)
+            self._changed(args[0])
+            return removed
+        if name == b"DEL":
+            removed = sum(self.hashes.pop(key, None) is not None for key in args)
+            for key in args:
+                self._changed(key)
+            return removed
+        return RedisError(f"ERR unknown command '{name.decode()}'")
+
+
+def _encode_reply(reply: Any) -> bytes:
+    if reply is None:
+        return b"*-1\r\n"
+    if isinstance(reply, RedisError):
+        return b"-%s\r\n" % str(reply).encode()
+    if isinstance(reply, str):
+        return b"+%s\r\n" % reply.encode()
+    if isinstance(reply, int):
+        return b":%d\r\n" % reply
+    if isinstance(reply, bytes):
+        return b"$%d\r\n%s\r\n" % (len(reply), reply)
+    return b"*%d\r\n" % len(reply) + b"".join(
+        b"$-1\r\n" if item is None else _encode_reply(item) for item in reply
+    )
+
+
+def _database(pool: RedisPool) -> RedisDictDatabase:
+    return RedisDictDatabase(NO_BOT, FakeCog(), pool=pool, key=KEY)
+
+
+def test_full_write_replaces_the_hash_in_batches(monkeypatch):
+    monkeypatch.setattr(redis_dict_database, "WRITE_BATCH_SIZE", 3)
+
+    async def main():
+        server = await StandInServer().start()
+        pool = server.pool()
+        try:
+            database = _database(pool)
+            await database.write({"stale": True})
+            data = {str(i): {"n": i} for i in range(10)}
+            await database.write(data)
+            assert server.fields() == data
+            assert await database.read() == data
+            assert await database.read_keys(["3", "missing"]) == {"3": {"n": 3}}
+            assert server.transactions == 2
+        finally:
+            await pool.close()
+            await server.close()
+
+    run(main())
+
+
+def test_top_level_changes_skip_the_watch():
+    async def main():
+        server = await StandInServer().start()
+        pool = server.pool()
+        try:
+            database = _database(pool)
+            await database.write({"a": 1, "b": 2})
+            # Any interference would abort a watched transaction.
+            server.interfere = 1
+            await database.write_changes(
+                [SetChange(("a",), {"x": 1}), DeleteChange(("b",))]
+            )
+            assert server.fields() == {"a": {"x": 1}}
+            assert server.aborted == 0
+        finally:
+            await pool.close()
+            await server.close()
+
+    run(main())
+
+
+def test_nested_changes_retry_when_the_hash_changes(monkeypatch):
+    monkeypatch.setattr(redis_dict_database, "RETRY_DELAY", 0.0)
+
+    async def main():
+        server = await StandInServer().start()
+        pool = server.pool()
+        try:
+            database = _database(pool)
+            await database.write({"guild": {"users": {"u1": 1}}})
+            server.interfere = 2
+            await database.write_changes([SetChange(("guild", "users", "u2"), 2)])
+            assert server.aborted == 2
+            assert server.fields() == {"guild": {"users": {"u1": 1, "u2": 2}}}
+            # The connection must not be left watching the hash.
+            await pool.execute("HSET", KEY, json.dumps("other"), "1")
+        finally:
+            await pool.close()
+            await server.close()
+
+    run(main())
+
+
+def test_nested_changes_give_up_after_too_many_attempts(monkeypatch):
+    monkeypatch.setattr(redis_dict_database, "RETRY_DELAY", 0.0)
+
+    async def main():
+        server = await StandInServer().start()
+        pool = server.pool()
+        try:
+            database = _database(pool)
+            await database.write({"guild": {}})
+            server.interfere = redis_dict_database.MAX_WRITE_ATTEMPTS
+            with pytest.raises(RuntimeError, match="gave up"):
+                await database.write_changes([SetChange(("guild", "name"), "x")])
+            assert server.fields() == {"guild": {}}
+        finally:
+            await pool.close()
+            await server.close()
+
+    run(main())
+
+
+def test_concurrent_nested_writers_keep_each_others_changes(monkeypatch):
+    monkeypatch.setattr(redis_dict_database, "RETRY_DELAY", 0.001)
+
+    async def main():
+        server = await StandInServer().start()
+        server.latency = 0.001
+        try:
+            first = await make_store(SimpleDictStore, server.url)
+            second = await make_store(SimpleDictStore, server.url)
+            # Both stores share the same pool, and so the same server and hash.
+            assert isinstance(first._database, RedisDictDatabase)
+            assert isinstance(second._database, RedisDictDatabase)
+            assert first._database.pool is second._database.pool
+            await first.dirty()
+
+            async def write(store: SimpleDictStore, name: str):
+                for i in range(10):
+                    path = ("guild", name, str(i))
+                    store.set(path, i)
+                    await store.dirty(path)
+
+            await asyncio.gather(write(first, "first"), write(second, "second"))
+            record = server.fields()["guild"]
+            assert {name: len(values) for name, values in record.items()} == {
+                "first": 10,
+                "second": 10,
+            }
+        finally:
+            await close_redis_pools()
+            await server.close()
+
+    run(main())
+
+
+def test_pool_bounds_connections_and_reuses_them():
+    async def main():
+        server = await StandInServer().start()
+        server.latency = 0.002
+        pool = server.pool(max_connections=3)
+        try:
+            await asyncio.gather(*(pool.execute("HGETALL", KEY) for _ in range(30)))
+            assert server.max_connections == 3
+            assert pool.idle_count == 3
+            # Error replies leave the connection in sync, so it goes back to the pool.
+            with pytest.raises(RedisError, match="unknown command"):
+                await pool.execute("BOGUS")
+            assert pool.idle_count == 3
+        finally:
+            await pool.close()
+            await server.close()
+        assert pool.idle_count == 0
+        with pytest.raises(RuntimeError):
+            await pool.execute("HGETALL", KEY)
+
+    run(main())
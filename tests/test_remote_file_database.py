@@ -0,0 +1,126 @@
+import gzip
+import json
+from typing import List
+
+import aiohttp
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from commanderbot_lib.database.codec_read_only_remote_file_database import (
+    CodecReadOnlyRemoteFileDatabase,
+)
+from commanderbot_lib.database.codecs import get_codec
+from commanderbot_lib.http_session import close_http_session
+from tests.helpers import NO_BOT, FakeCog, run
+
+ETAG = '"v1"'
+LAST_MODIFIED = "Fri, 01 Jan 2021 00:00:00 GMT"
+
+
+class RemoteFile:
+    """ Serves a JSON file from a local HTTP server, and records every request for it. """
+
+    def __init__(self, data: dict):
+        self.data: dict = data
+        self.status: int = 200
+        self.requests: List[web.Request] = []
+
+    async def handle(self, request: web.Request) -> web.Response:
+        self.requests.append(request)
+        if self.status != 200:
+            return web.Response(status=self.status)
+        if (request.headers.get("If-None-Match") == ETAG) or (
+            request.headers.get("If-Modified-Since") == LAST_MODIFIED
+        ):
+            return web.Response(status=304)
+        body = json.dumps(self.data).encode("utf-8")
+        headers = {"ETag": ETAG, "Last-Modified": LAST_MODIFIED}
+        if "gzip" in request.headers.get("Accept-Encoding", ""):
+            body = gzip.compress(body)
+            headers["Content-Encoding"] = "gzip"
+        return web.Response(body=body, headers=headers, content_type="application/json")
+
+
+async def _serve(remote: RemoteFile) -> TestServer:
+    app = web.Application()
+    app.router.add_get("/data.json", remote.handle)
+    server = TestServer(app, host="127.0.0.1")
+    await server.start_server()
+    return server
+
+
+def _database(address: str, cache_path=None) -> CodecReadOnlyRemoteFileDatabase:
+    return CodecReadOnlyRemoteFileDatabase(
+        NO_BOT,
+        FakeCog(),
+        codec=get_codec("json"),
+        address=address,
+        cache_path=cache_path,
+        timeout=5.0,
+    )
+
+
+def _read(remote: RemoteFile, cache_path=None, stop_server: bool = False):
+    """ Read the remote file through a fresh database, as a cog would upon starting. """
+
+    async def main():
+        server = await _serve(remote)
+        address = str(server.make_url("/data.json"))
+        try:
+            if stop_server:
+                await server.close()
+            return await _database(address, cache_path).read()
+        finally:
+            await server.close()
+            await close_http_session()
+
+    return run(main())
+
+
+def test_downloads_compressed_file():
+    remote = RemoteFile({"a": 1})
+    assert _read(remote) == {"a": 1}
+    assert "gzip" in remote.requests[0].headers["Accept-Encoding"]
+
+
+def test_unchanged_file_is_revalidated_from_cache(tmp_path):
+    remote = RemoteFile({"a": 1})
+    cache_path = tmp_path / "cache.json"
+    assert _read(remote, cache_path) == {"a": 1}
+    assert json.loads(cache_path.read_text()) == {"a": 1}
+    # The cached copy is used when the server says that nothing has changed.
+    remote.data = {"a": 2}
+    assert _read(remote, cache_path) == {"a": 1}
+    headers = remote.requests[1].headers
+    assert (headers["If-None-Match"], headers["If-Modified-Since"]) == (
+        ETAG,
+        LAST_MODIFIED,
+    )
+
+
+def test_changed_file_replaces_cache(tmp_path):
+    remote = RemoteFile({"a": 1})
+    cache_path = tmp_path / "cache.json"
+    _read(remote, cache_path)
+    (tmp_path / "cache.json.meta.json").write_text(json.dumps({"etag": '"v0"'}))
+    remote.data = {"a": 2}
+    assert _read(remote, cache_path) == {"a": 2}
+    assert json.loads(cache_path.read_text()) == {"a": 2}
+
+
+@pytest.mark.parametrize("stop_server", [False, True])
+def test_falls_back_to_cache_on_error(tmp_path, stop_server):
+    remote = RemoteFile({"a": 1})
+    cache_path = tmp_path / "cache.json"
+    _read(remote, cache_path)
+    remote.data = {"a": 2}
+    remote.status = 500
+    assert _read(remote, cache_path, stop_server=stop_server) == {"a": 1}
+
+
+def test_error_without_cache_raises():
+    remote = RemoteFile({"a": 1})
+    remote.status = 500
+    with pytest.raises(aiohttp.ClientResponseError):
+        _read(remote)
@@ -0,0 +1,147 @@
+import json
+
+import pytest
+
+from commanderbot_lib.database import file_io
+from commanderbot_lib.database.changes import DeleteChange, SetChange
+from commanderbot_lib.database.codec_sharded_file_database import (
+    CodecShardedFileDatabase,
+)
+from commanderbot_lib.database.codecs import get_codec
+from commanderbot_lib.store.simple_dict_store import SimpleDictStore
+from tests.helpers import NO_BOT, FakeCog, make_store, run
+
+
+def _database(tmp_path, **kwargs) -> CodecShardedFileDatabase:
+    return CodecShardedFileDatabase(
+        NO_BOT,
+        FakeCog(),
+        codec=get_codec("json"),
+        path=tmp_path / "{shard}.json",
+        **kwargs
+    )
+
+
+def _shards(tmp_path) -> dict:
+    return {path.name: json.loads(path.read_text()) for path in tmp_path.glob("*.json")}
+
+
+def test_path_needs_a_shard_placeholder(tmp_path):
+    with pytest.raises(ValueError, match="{shard}"):
+        CodecShardedFileDatabase(
+            NO_BOT, FakeCog(), codec=get_codec("json"), path=tmp_path / "data.json"
+        )
+
+
+def test_each_key_gets_its_own_shard(tmp_path):
+    async def main():
+        database = _database(tmp_path, lazy=False)
+        await database.write({"1": {"n": 1}, "a/b": {"n": 2}})
+        return await _database(tmp_path, lazy=False).read()
+
+    assert run(main()) == {"1": {"n": 1}, "a/b": {"n": 2}}
+    assert _shards(tmp_path) == {
+        "1.json": {"1": {"n": 1}},
+        "a%2Fb.json": {"a/b": {"n": 2}},
+    }
+
+
+def test_keys_are_hashed_into_buckets(tmp_path):
+    data = {str(i): {"n": i} for i in range(20)}
+
+    async def main():
+        database = _database(tmp_path, buckets=4, lazy=False)
+        await database.write(data)
+        assert await database.read_keys(["3", "7", "missing"]) == {
+            "3": {"n": 3},
+            "7": {"n": 7},
+        }
+        return await _database(tmp_path, buckets=4, lazy=False).read()
+
+    assert run(main()) == data
+    shards = _shards(tmp_path)
+    assert 1 < len(shards) <= 4
+    assert sum(len(shard) for shard in shards.values()) == 20
+
+
+def test_lazy_shards_are_loaded_once(tmp_path):
+    (tmp_path / "a.json").write_text('{"a": {"n": 1}}')
+
+    async def main():
+        database = _database(tmp_path)
+        assert await database.read() == {}
+        assert await database.read_key("a") == {"a": {"n": 1}}
+        assert await database.read_key("a") == {}
+        assert await database.read_key("missing") == {}
+
+    run(main())
+
+
+def test_full_writes_keep_keys_that_were_never_loaded(tmp_path):
+    (tmp_path / "0.json").write_text('{"old": 1}')
+
+    async def main():
+        database = _database(tmp_path, buckets=1)
+        await database.write({"new": 2})
+
+    run(main())
+    assert _shards(tmp_path) == {"0.json": {"old": 1, "new": 2}}
+
+
+def test_unchanged_shards_are_not_rewritten(tmp_path, monkeypatch):
+    written = []
+    write_shard = file_io.write_shard
+
+    def _write_shard(path, *args):
+        written.append(path.name)
+        write_shard(path, *args)
+
+    monkeypatch.setattr(file_io, "write_shard", _write_shard)
+
+    (tmp_path / "a.json").write_text('{"a": {"n": 1}}')
+    (tmp_path / "b.json").write_text('{"b": {"n": 1}}')
+
+    async def main():
+        database = _database(tmp_path, lazy=False)
+        data = await database.read()
+        await database.write(data)
+        data["a"]["n"] = 2
+        await database.write(data)
+        await database.write(data)
+
+    run(main())
+    # Once written, shards are only written again if their contents change.
+    assert sorted(written[:2]) == ["a.json", "b.json"]
+    assert written[2:] == ["a.json"]
+
+
+def test_changes_only_touch_their_shards(tmp_path):
+    async def main():
+        database = _database(tmp_path, lazy=False)
+        await database.write({"a": {"n": 1}, "b": {"n": 1}, "c": {"n": 1}})
+        untouched = (tmp_path / "c.json").stat().st_mtime_ns
+        await database.write_changes([SetChange(("a", "n"), 2), DeleteChange(("b",))])
+        assert (tmp_path / "c.json").stat().st_mtime_ns == untouched
+
+    run(main())
+    # Shards that end up empty are deleted.
+    assert _shards(tmp_path) == {"a.json": {"a": {"n": 2}}, "c.json": {"c": {"n": 1}}}
+
+
+def test_store_loads_shards_as_keys_are_requested(tmp_path):
+    (tmp_path / "1.json").write_text('{"1": {"name": "one"}}')
+    (tmp_path / "2.json").write_text('{"2": {"name": "two"}}')
+
+    async def main():
+        store = await make_store(SimpleDictStore, str(tmp_path / "{shard}.json"))
+        assert store._cache == {}
+        assert await store.load_key("1")
+        store.set(("1", "name"), "uno")
+        await store.dirty(("1", "name"))
+        assert store._cache == {"1": {"name": "uno"}}
+
+    run(main())
+    assert _shards(tmp_path) == {
+        "1.json": {"1": {"name": "uno"}},
+        "2.json": {"2": {"name": "two"}},
+    }
@@ -0,0 +1,88 @@
+import threading
+
+import pytest
+
+from commanderbot_lib.database.file_io import Durability
+from commanderbot_lib.database.sqlite_dict_database import (
+    SqliteDictDatabase,
+    close_sqlite_databases,
+)
+from tests.helpers import NO_BOT, FakeCog, run
+
+# The values that SQLite reports for each `synchronous` setting.
+SYNCHRONOUS_FULL = 2
+SYNCHRONOUS_EXTRA = 3
+
+
+async def _open(path, **kwargs) -> SqliteDictDatabase:
+    database = SqliteDictDatabase(NO_BOT, FakeCog(), path=path, **kwargs)
+    await database.async_init()
+    return database
+
+
+async def _synchronous(database: SqliteDictDatabase) -> int:
+    def synchronous() -> int:
+        assert database._connection is not None
+        return database._connection.execute("PRAGMA synchronous").fetchone()[0]
+
+    return await database._run(synchronous)
+
+
+@pytest.mark.parametrize(
+    "durability, expected",
+    [(Durability.FILE, SYNCHRONOUS_FULL), (Durability.DIRECTORY, SYNCHRONOUS_EXTRA)],
+)
+def test_durability_syncs_every_commit(tmp_path, durability, expected):
+    async def main():
+        database = await _open(tmp_path / "db.sqlite3", durability=durability)
+        try:
+            return await _synchronous(database)
+        finally:
+            await database.close()
+
+    assert run(main()) == expected
+
+
+def test_close_closes_every_open_database(tmp_path):
+    async def main():
+        first = await _open(tmp_path / "first.sqlite3")
+        second = await _open(tmp_path / "second.sqlite3")
+        await first.write({"a": 1})
+        await close_sqlite_databases()
+        reopened = await _open(tmp_path / "first.sqlite3")
+        try:
+            return first, second, await reopened.read()
+        finally:
+            await reopened.close()
+
+    first, second, data = run(main())
+    assert data == {"a": 1}
+    for database in (first, second):
+        assert database._connection is None
+        assert database._executor._shutdown
+
+
+def test_full_writes_are_serialized_on_the_database_thread(tmp_path, monkeypatch):
+    threads = []
+    dumps = SqliteDictDatabase._dumps
+
+    def _dumps(self, key, value):
+        threads.append(threading.current_thread().name)
+        return dumps(self, key, value)
+
+    monkeypatch.setattr(SqliteDictDatabase, "_dumps", _dumps)
+
+    async def main():
+        database = await _open(tmp_path / "db.sqlite3")
+        try:
+            data = {"a": {"n": 1}, "b": {"n": 2}}
+            await database.write(data)
+            # The database has its own copy of the data, which later changes don't affect.
+            data["a"]["n"] = 3
+            return await database.read()
+        finally:
+            await database.close()
+
+    assert run(main()) == {"a": {"n": 1}, "b": {"n": 2}}
+    assert len(threads) == 2
+    assert all(name.startswith("commanderbot-sqlite") for name in threads)
@@ -0,0 +1,200 @@
+import asyncio
+
+import pytest
+
+from commanderbot_lib.store.abc.cached_store import CachedStore
+from commanderbot_lib.store.secondary_index import ANY_KEY, SecondaryIndex
+from commanderbot_lib.store.simple_dict_store import SimpleDictStore
+from tests.helpers import make_store, run
+
+
+class CountersStore(CachedStore):
+    """ A store that copies its data, so it only has the generic transaction fallback. """
+
+    async def _build_cache(self, data: dict) -> dict:
+        return {key: dict(value) for key, value in data.items()}
+
+    async def serialize(self) -> dict:
+        return {key: dict(value) for key, value in self._cache.items()}
+
+    async def _create_database(self):
+        return await super()._create_database()
+
+
+class OwnedStore(SimpleDictStore):
+    indexes = (SecondaryIndex("owner", entries=(ANY_KEY, ANY_KEY), field="owner"),)
+
+
+async def _fail_while(store: CachedStore, change, during):
+    """ Make `change` within a transaction, let `during` run, and then fail. """
+    changed = asyncio.Event()
+    resume = asyncio.Event()
+
+    async def transaction():
+        with pytest.raises(RuntimeError):
+            async with store.transaction():
+                await change()
+                changed.set()
+                await resume.wait()
+                raise RuntimeError("Rolled back")
+
+    async def writer():
+        await changed.wait()
+        await during()
+        resume.set()
+
+    await asyncio.gather(transaction(), writer())
+
+
+def test_rollback_undoes_changes_made_in_place():
+    async def main():
+        store = await make_store(OwnedStore, {"a": {"x": {"owner": 1}}})
+        with pytest.raises(RuntimeError):
+            async with store.transaction():
+                entry = store.get(("a", "x"))
+                entry["owner"] = 2
+                store.mark_dirty("a", "x")
+                store.set(("a", "y"), {"owner": 2})
+                raise RuntimeError("Rolled back")
+        return await store.serialize(), store.find("owner", 1), store.find("owner", 2)
+
+    data, first, second = run(main())
+    assert data == {"a": {"x": {"owner": 1}}}
+    assert first == {("a", "x"): {"owner": 1}}
+    assert second == {}
+
+
+def test_rollback_keeps_changes_made_by_other_tasks(tmp_path):
+    async def main():
+        database = f"sqlite:{tmp_path / 'db.sqlite3'}"
+        store = await make_store(OwnedStore, database)
+        store.set(("a",), {"x": {"owner": 1}})
+        await store.dirty(("a",))
+
+        async def change():
+            store.get(("a", "x"))["owner"] = 2
+            store.mark_dirty("a", "x")
+
+        async def during():
+            store.set(("b",), {"y": {"owner": 2}})
+            await store.dirty(("b",))
+
+        await _fail_while(store, change, during)
+        reloaded = await make_store(OwnedStore, database)
+        return (
+            await store.serialize(),
+            await reloaded.serialize(),
+            store.find("owner", 2),
+        )
+
+    data, persisted, owned = run(main())
+    expected = {"a": {"x": {"owner": 1}}, "b": {"y": {"owner": 2}}}
+    assert data == expected
+    assert persisted == expected
+    assert owned == {("b", "y"): {"owner": 2}}
+
+
+def test_commit_persists_changes_in_a_single_write(tmp_path):
+    async def main():
+        database = f"sqlite:{tmp_path / 'db.sqlite3'}"
+        store = await make_store(SimpleDictStore, database)
+        async with store.transaction():
+            store.set(("a",), 1)
+            await store.dirty(("a",))
+            store.set(("b",), 2)
+            await store.dirty(("b",))
+        reloaded = await make_store(SimpleDictStore, database)
+        return store.write_stats.writes, await reloaded.serialize()
+
+    writes, persisted = run(main())
+    assert writes == 1
+    assert persisted == {"a": 1, "b": 2}
+
+
+def test_generic_rollback_keeps_changes_made_by_other_tasks():
+    async def main():
+        store = await make_store(CountersStore, {"a": {"n": 1}, "b": {"n": 1}})
+
+        async def change():
+            store._cache["a"]["n"] = 2
+            store.mark_dirty("a", "n")
+
+        async def during():
+            store._cache["b"]["n"] = 2
+            await store.dirty(("b", "n"))
+
+        await _fail_while(store, change, during)
+        return await store.serialize()
+
+    assert run(main()) == {"a": {"n": 1}, "b": {"n": 2}}
+
+
+def test_generic_rollback_of_full_write_restores_everything():
+    async def main():
+        store = await make_store(CountersStore, {"a": {"n": 1}})
+        with pytest.raises(RuntimeError):
+            async with store.transaction():
+                store._cache["a"]["n"] = 2
+                store._cache["b"] = {"n": 2}
+                await store.dirty()
+                raise RuntimeError("Rolled back")
+        return await store.serialize()
+
+    assert run(main()) == {"a": {"n": 1}}
+
+
+def test_rollback_undoes_changes_made_to_the_cache_directly():
+    async def main():
+        store = await make_store(OwnedStore, {"a": {"x": {"owner": 1}}})
+        with pytest.raises(RuntimeError):
+            async with store.transaction():
+                store._cache["a"]["x"]["owner"] = 2
+                store._cache["b"] = {"y": {"owner": 2}}
+                await store.dirty()
+                raise RuntimeError("Rolled back")
+        return await store.serialize(), store.find("owner", 2)
+
+    data, owned = run(main())
+    assert data == {"a": {"x": {"owner": 1}}}
+    assert owned == {}
+
+
+def test_rollback_rewrites_entries_written_by_other_tasks(tmp_path):
+    async def main():
+        database = f"sqlite:{tmp_path / 'db.sqlite3'}"
+        store = await make_store(OwnedStore, database)
+        store.set(("a",), {"x": {"owner": 1}})
+        await store.dirty(("a",))
+
+        async def change():
+            store.set(("a", "x", "owner"), 2)
+
+        async def during():
+            # Writes the whole cache, including the transaction's change.
+            await store.dirty()
+
+        await _fail_while(store, change, during)
+        reloaded = await make_store(OwnedStore, database)
+        return await store.serialize(), await reloaded.serialize()
+
+    data, persisted = run(main())
+    assert data == {"a": {"x": {"owner": 1}}}
+    assert persisted == data
+
+
+def test_generic_rollback_of_full_write_keeps_changes_made_by_other_tasks():
+    async def main():
+        store = await make_store(CountersStore, {"a": {"n": 1}, "b": {"n": 1}})
+
+        async def change():
+            store._cache["a"]["n"] = 2
+            await store.dirty()
+
+        async def during():
+            store._cache["b"]["n"] = 2
+            await store.dirty(("b", "n"))
+
+        await _fail_while(store, change, during)
+        return await store.serialize()
+
+    assert run(main()) == {"a": {"n": 1}, "b": {"n": 2}}
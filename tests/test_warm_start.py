@@ -0,0 +1,105 @@
+import json
+
+import pytest
+
+from commanderbot_lib.store.abc.cached_store import save_warm_start_snapshots
+from commanderbot_lib.store.entry_table import ANY_KEY
+from commanderbot_lib.store.secondary_index import SecondaryIndex
+from commanderbot_lib.store.simple_dict_store import SimpleDictStore
+from tests.helpers import make_store, run
+
+DATA = {
+    "1": {"entries": {"a": {"owner": 10}, "b": {"owner": 20}}},
+    "2": {"entries": {"c": {"owner": 10}}},
+}
+
+
+class WarmStore(SimpleDictStore):
+    indexes = (
+        SecondaryIndex("owner", entries=(ANY_KEY, "entries", ANY_KEY), field="owner"),
+    )
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    monkeypatch.setattr(WarmStore, "warm_start_dir", str(tmp_path / "warm"))
+    path = tmp_path / "db.json"
+    path.write_text(json.dumps(DATA))
+    return path
+
+
+def test_unchanged_file_starts_warm(database):
+    async def main():
+        cold = await make_store(WarmStore, str(database))
+        warm = await make_store(WarmStore, str(database))
+        return cold, warm
+
+    cold, warm = run(main())
+    assert not cold.warm_started
+    assert warm.warm_started
+    assert run(warm.serialize()) == DATA
+    assert sorted(warm.find("owner", 10)) == [
+        ("1", "entries", "a"),
+        ("2", "entries", "c"),
+    ]
+
+
+def test_edited_file_starts_cold(database):
+    async def main():
+        await make_store(WarmStore, str(database))
+        database.write_text(json.dumps({"3": {"entries": {}}}))
+        return await make_store(WarmStore, str(database))
+
+    store = run(main())
+    assert not store.warm_started
+    assert run(store.serialize()) == {"3": {"entries": {}}}
+
+
+def test_version_bump_starts_cold(database, monkeypatch):
+    async def main():
+        await make_store(WarmStore, str(database))
+        monkeypatch.setattr(WarmStore, "warm_start_version", 1)
+        return await make_store(WarmStore, str(database))
+
+    assert not run(main()).warm_started
+
+
+def test_unsupported_database_starts_cold(tmp_path, monkeypatch):
+    monkeypatch.setattr(WarmStore, "warm_start_dir", str(tmp_path / "warm"))
+
+    async def main():
+        database = f"sqlite:{tmp_path / 'db.sqlite3'}"
+        await make_store(WarmStore, database)
+        return await make_store(WarmStore, database)
+
+    assert not run(main()).warm_started
+
+
+def test_snapshot_saved_after_a_write(database):
+    async def main():
+        store = await make_store(WarmStore, str(database))
+        store.set(("2", "entries", "d"), {"owner": 20})
+        await store.dirty(("2", "entries", "d"))
+        # The snapshot from the cold start no longer matches the file.
+        stale = await make_store(WarmStore, str(database))
+        await save_warm_start_snapshots()
+        warm = await make_store(WarmStore, str(database))
+        return stale, warm
+
+    stale, warm = run(main())
+    assert not stale.warm_started
+    assert warm.warm_started
+    assert warm.get(("2", "entries", "d")) == {"owner": 20}
+
+
+def test_unwritten_changes_are_not_snapshotted(database):
+    async def main():
+        store = await make_store(WarmStore, str(database))
+        store._cache.clear()
+        store.set(("unwritten",), 1)
+        await save_warm_start_snapshots()
+        return await make_store(WarmStore, str(database))
+
+    store = run(main())
+    assert store.warm_started
+    assert run(store.serialize()) == DATA
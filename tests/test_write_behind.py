@@ -0,0 +1,116 @@
+import asyncio
+import json
+
+from commanderbot_lib.store.abc.cached_store import (
+    _stores_with_pending_writes,
+    flush_pending_writes,
+)
+from commanderbot_lib.store.simple_dict_store import SimpleDictStore
+from tests.helpers import make_store, run
+
+
+class DelayedStore(SimpleDictStore):
+    database_write_delay = 0.05
+
+
+class SlowStore(SimpleDictStore):
+    database_write_delay = 60.0
+
+
+def _read(path) -> dict:
+    return json.loads(path.read_text())
+
+
+def _flush_task(store: SimpleDictStore) -> asyncio.Task:
+    """ Return the background write that the store must have scheduled. """
+    assert store._flush_task is not None
+    return store._flush_task
+
+
+def test_changes_are_coalesced_into_one_write(tmp_path):
+    path = tmp_path / "db.json"
+    path.write_text("{}")
+
+    async def main():
+        store = await make_store(DelayedStore, str(path))
+        for i in range(10):
+            store.set((str(i),), i)
+            await store.dirty((str(i),))
+        # Nothing has been written yet.
+        assert _read(path) == {}
+        assert (store.write_stats.requests, store.write_stats.pending) == (10, 10)
+        await _flush_task(store)
+        assert (store.write_stats.writes, store.write_stats.pending) == (1, 0)
+        assert store.write_stats.last_latency >= 0.05
+        assert store._flush_task is None
+        assert store not in _stores_with_pending_writes
+
+    run(main())
+    assert _read(path) == {str(i): i for i in range(10)}
+
+
+def test_failed_writes_are_tried_again(tmp_path):
+    path = tmp_path / "db.json"
+    path.write_text("{}")
+
+    async def main():
+        store = await make_store(DelayedStore, str(path))
+        write = store._database.write
+
+        async def fail_once(data):
+            store._database.write = write
+            raise OSError("Disk full")
+
+        store._database.write = fail_once
+        store.set(("a",), 1)
+        await store.dirty()
+        await _flush_task(store)
+        assert (store.write_stats.failures, store.write_stats.pending) == (1, 1)
+        # The retry is scheduled right away, keeping the changes that failed.
+        await _flush_task(store)
+        assert (store.write_stats.writes, store.write_stats.pending) == (1, 0)
+
+    run(main())
+    assert _read(path) == {"a": 1}
+
+
+def test_pending_writes_are_flushed_on_shutdown(tmp_path):
+    first = tmp_path / "first.json"
+    second = tmp_path / "second.json"
+    first.write_text("{}")
+    second.write_text("{}")
+
+    async def main():
+        stores = [
+            await make_store(SlowStore, str(first)),
+            await make_store(SlowStore, str(second)),
+        ]
+        for store in stores:
+            store.set(("a",), 1)
+            await store.dirty(("a",))
+        assert _read(first) == _read(second) == {}
+        await flush_pending_writes()
+        for store in stores:
+            assert (store.write_stats.writes, store.write_stats.pending) == (1, 0)
+            _flush_task(store).cancel()
+        # Flushing again has nothing left to write.
+        await flush_pending_writes()
+        assert all(store.write_stats.writes == 1 for store in stores)
+
+    run(main())
+    assert _read(first) == _read(second) == {"a": 1}
+
+
+def test_flush_writes_right_away(tmp_path):
+    path = tmp_path / "db.json"
+    path.write_text("{}")
+
+    async def main():
+        store = await make_store(SlowStore, str(path))
+        store.set(("a",), 1)
+        await store.dirty(("a",))
+        await store.flush()
+        assert _read(path) == {"a": 1}
+        _flush_task(store).cancel()
+
+    run(main())